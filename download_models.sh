@@ -23,40 +23,73 @@ declare -A NETVLAD_MODELS=(
     ["VGG16-NetVLAD-TokyoTM.mat"]="https://cvg-data.inf.ethz.ch/hloc/netvlad/TokyoTM_struct.mat"
 )
 
-# LightGlue 모델 다운로드
-for MODEL_NAME in "${!MODELS[@]}"; do
-    URL="${MODELS[$MODEL_NAME]}"
-    OUTPUT_FILE="$MODELS_DIR/$MODEL_NAME"
-    
-    if [ -f "$OUTPUT_FILE" ]; then
-        echo "✓ $MODEL_NAME already exists"
-    else
-        echo "Downloading $MODEL_NAME..."
-        wget -q --show-progress -O "$OUTPUT_FILE" "$URL"
-        if [ $? -eq 0 ]; then
-            echo "✓ Downloaded $MODEL_NAME"
-        else
-            echo "✗ Failed to download $MODEL_NAME"
+# 다운로드 기록 (sha256 크기 파일명) - 이미지 빌드 시 model_registry가 이 값으로 검증
+# 서버가 알려준 Content-Length와 크기가 맞는 완전한 다운로드만 기록함
+RECORD_FILE="$MODELS_DIR/models.sha256"
+touch "$RECORD_FILE"
+FAILED=0
+
+remote_size() {
+    wget --spider -S "$1" 2>&1 | tr -d '\r' | awk 'tolower($1) == "content-length:" {n = $2} END {print n}'
+}
+
+record_model() {
+    local MODEL_NAME="$1" FILE="$2"
+    awk -v f="$MODEL_NAME" '$3 != f' "$RECORD_FILE" > "$RECORD_FILE.tmp"
+    echo "$(sha256sum "$FILE" | cut -d' ' -f1) $(stat -c %s "$FILE")  $MODEL_NAME" >> "$RECORD_FILE.tmp"
+    mv "$RECORD_FILE.tmp" "$RECORD_FILE"
+}
+
+download_model() {
+    local MODEL_NAME="$1" URL="$2"
+    local OUTPUT_FILE="$MODELS_DIR/$MODEL_NAME"
+    local RECORD EXPECTED_SIZE
+    RECORD=$(awk -v f="$MODEL_NAME" '$3 == f' "$RECORD_FILE")
+
+    if [ -f "$OUTPUT_FILE" ] && [ -n "$RECORD" ]; then
+        if [ "$(sha256sum "$OUTPUT_FILE" | cut -d' ' -f1)" = "${RECORD%% *}" ]; then
+            echo "✓ $MODEL_NAME already exists (sha256 matches download record)"
+            return 0
         fi
+        echo "⚠ $MODEL_NAME does not match its download record, downloading again"
+    fi
+
+    EXPECTED_SIZE=$(remote_size "$URL")
+    if [ -f "$OUTPUT_FILE" ] && [ -z "$RECORD" ] && [ -n "$EXPECTED_SIZE" ] \
+        && [ "$(stat -c %s "$OUTPUT_FILE")" = "$EXPECTED_SIZE" ]; then
+        # 기록 이전에 받아 둔 파일: 서버 크기와 같을 때만 받아들이고 기록
+        record_model "$MODEL_NAME" "$OUTPUT_FILE"
+        echo "✓ $MODEL_NAME already exists (size matches server, recorded)"
+        return 0
     fi
+
+    # .part로 받은 뒤 크기를 확인하고 옮기므로 중단된 다운로드가 완성본으로 남지 않음
+    echo "Downloading $MODEL_NAME..."
+    if ! wget -q --show-progress -O "$OUTPUT_FILE.part" "$URL"; then
+        echo "✗ Failed to download $MODEL_NAME"
+        rm -f "$OUTPUT_FILE.part"
+        FAILED=1
+        return 1
+    fi
+    if [ -n "$EXPECTED_SIZE" ] && [ "$(stat -c %s "$OUTPUT_FILE.part")" != "$EXPECTED_SIZE" ]; then
+        echo "✗ $MODEL_NAME is truncated ($(stat -c %s "$OUTPUT_FILE.part") of $EXPECTED_SIZE bytes)"
+        rm -f "$OUTPUT_FILE.part"
+        FAILED=1
+        return 1
+    fi
+    mv "$OUTPUT_FILE.part" "$OUTPUT_FILE"
+    record_model "$MODEL_NAME" "$OUTPUT_FILE"
+    echo "✓ Downloaded $MODEL_NAME"
+}
+
+# LightGlue 모델 다운로드
+for MODEL_NAME in "${!MODELS[@]}"; do
+    download_model "$MODEL_NAME" "${MODELS[$MODEL_NAME]}"
 done
 
 # NetVLAD 모델 다운로드
 for MODEL_NAME in "${!NETVLAD_MODELS[@]}"; do
-    URL="${NETVLAD_MODELS[$MODEL_NAME]}"
-    OUTPUT_FILE="$MODELS_DIR/$MODEL_NAME"
-    
-    if [ -f "$OUTPUT_FILE" ]; then
-        echo "✓ $MODEL_NAME already exists"
-    else
-        echo "Downloading $MODEL_NAME..."
-        wget -q --show-progress -O "$OUTPUT_FILE" "$URL"
-        if [ $? -eq 0 ]; then
-            echo "✓ Downloaded $MODEL_NAME"
-        else
-            echo "✗ Failed to download $MODEL_NAME"
-        fi
-    fi
+    download_model "$MODEL_NAME" "${NETVLAD_MODELS[$MODEL_NAME]}"
 done
 
 echo ""
@@ -65,6 +98,10 @@ echo "Models directory: $MODELS_DIR"
 echo "Downloaded files:"
 ls -lh "$MODELS_DIR" | grep -E "\.(pth|mat)$"
 echo ""
+if [ "$FAILED" -ne 0 ]; then
+    echo "❌ Some models failed to download - rerun this script before building"
+    exit 1
+fi
 echo "✅ All models downloaded successfully!"
 echo ""
 echo "Now you can build the Docker image with:"
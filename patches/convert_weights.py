@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+사전 학습 가중치 변환 스크립트 (빌드 시 1회 실행)
+.pth 체크포인트와 NetVLAD .mat 파일을 원본 옆의 .safetensors(평탄한 배열 레이아웃)로 변환하여
+런타임에 pickle/MATLAB 파싱 없이 mmap으로 바로 로드되게 함 (offline_model_loader가 우선 사용)
+
+Usage:
+    python convert_weights.py [--force] [--manifest PATH] [--root DIR ...]
+"""
+
+import argparse
+import pickle
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from model_registry import ModelRegistry  # noqa: E402
+from offline_model_loader import _state_dict_arrays, weights_only_error, write_safetensors  # noqa: E402
+
+
+def _is_up_to_date(source, target):
+    return target.exists() and target.stat().st_mtime >= source.stat().st_mtime
+
+
+def torch_arrays(path):
+    """Flat {name: ndarray} of a tensor-only checkpoint (None if it is not one)"""
+    import torch
+
+    try:
+        state_dict = torch.load(path, map_location="cpu", weights_only=True)
+    except pickle.UnpicklingError as e:
+        # 런타임 로더도 같은 제한으로 거부하므로 빌드 로그에 원인을 남김
+        print(f"  ❌ {weights_only_error(path, e)}")
+        return None
+    # 중첩 dict나 bf16처럼 NumPy로 표현할 수 없는 항목이 있으면 원본 그대로 사용
+    return _state_dict_arrays(state_dict)
+
+
+def netvlad_arrays(path):
+    """Flat {name: ndarray} of the parts of a NetVLAD .mat that hloc reads"""
+    import numpy as np
+    from scipy.io import loadmat
+
+    # hloc.extractors.netvlad와 같은 옵션으로 읽어 배열 모양이 동일하게 유지되도록 함
+    net = loadmat(path, struct_as_record=False, squeeze_me=True)["net"]
+    arrays = {"meta.normalization.averageImage": np.asarray(net.meta.normalization.averageImage)}
+    for i, layer in enumerate(net.layers):
+        weights = getattr(layer, "weights", None)
+        if weights is None:
+            continue
+        if isinstance(weights, np.ndarray) and weights.dtype != object:
+            weights = [weights]
+        for j, weight in enumerate(weights):
+            arrays[f"layers.{i}.weights.{j}"] = np.asarray(weight)
+    # 가중치가 없는 마지막 레이어까지 개수가 보존되도록 기록
+    arrays["layers.count"] = np.array(len(net.layers), dtype=np.int64)
+    return arrays
+
+
+def convert_model(entry, path, force=False):
+    """Write <path>.safetensors next to a model file; returns the output path or None"""
+    target = path.with_suffix(".safetensors")
+    if not force and _is_up_to_date(path, target):
+        print(f"  ✓ {entry['name']}: up to date")
+        return target
+
+    if entry.get("kind") == "netvlad":
+        arrays = netvlad_arrays(path)
+    else:
+        arrays = torch_arrays(path)
+    if arrays is None:
+        print(f"  ⚠ {entry['name']}: not a flat tensor checkpoint, kept as {path.suffix}")
+        return None
+
+    write_safetensors(target, arrays, metadata={"source": path.name, "kind": entry.get("kind")})
+    size_mb = target.stat().st_size / 1024**2
+    print(f"  ✓ {entry['name']}: {target.name} ({len(arrays)} arrays, {size_mb:.1f} MB)")
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert pretrained weights to safetensors")
+    parser.add_argument("--force", action="store_true", help="rewrite up-to-date outputs")
+    parser.add_argument("--manifest", type=Path, default=None)
+    parser.add_argument("--root", type=Path, action="append", default=None)
+    args = parser.parse_args()
+
+    print("=== Converting pretrained weights to safetensors ===")
+    registry = ModelRegistry(args.manifest, args.root)
+    success = True
+    for entry in registry.models():
+        if entry.get("kind") not in ("torch", "netvlad"):
+            continue
+        path = registry.find(entry["file"])
+        if path is None:
+            print(f"  ⚠ {entry['name']}: NOT FOUND")
+            continue
+        try:
+            convert_model(entry, path, args.force)
+        except Exception as e:
+            print(f"  ❌ {entry['name']}: {e}")
+            success = False
+
+    if success:
+        print("✅ Weight conversion complete")
+    else:
+        print("❌ Some weights could not be converted (original files are still used)")
+    return success
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -8,24 +8,18 @@ import sys
 import os
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from patch_engine import package_file
+
 
 def fix_hloc_init():
     """hloc/__init__.py의 구문 오류 수정"""
-    init_file = Path('/usr/local/lib/python3.10/dist-packages/hloc/__init__.py')
+    # hloc을 import하지 않고 설치 위치를 찾음 (구문 오류가 있어도 동작)
+    init_file = package_file('hloc', '__init__.py')
     
-    if not init_file.exists():
-        # 대체 경로 시도
-        alt_paths = [
-            Path('/usr/local/lib/python3.10/site-packages/hloc/__init__.py'),
-            Path('/opt/conda/lib/python3.10/site-packages/hloc/__init__.py'),
-        ]
-        for alt_path in alt_paths:
-            if alt_path.exists():
-                init_file = alt_path
-                break
-        else:
-            print(f"ERROR: hloc/__init__.py not found")
-            return False
+    if init_file is None:
+        print(f"ERROR: hloc/__init__.py not found")
+        return False
     
     print(f"Fixing: {init_file}")
     
@@ -89,10 +83,10 @@ def fix_hloc_init():
 
 def fix_hloc_parsers():
     """hloc/utils/parsers.py의 구문 오류 수정"""
-    parsers_file = Path('/usr/local/lib/python3.10/dist-packages/hloc/utils/parsers.py')
+    parsers_file = package_file('hloc', 'utils/parsers.py')
     
-    if not parsers_file.exists():
-        print(f"WARNING: {parsers_file} not found")
+    if parsers_file is None:
+        print(f"WARNING: hloc/utils/parsers.py not found")
         return True  # 파일이 없으면 성공으로 간주
     
     print(f"Fixing: {parsers_file}")
@@ -128,15 +122,15 @@ def fix_hloc_parsers():
 def verify_syntax():
     """수정된 파일들의 Python 구문 검증"""
     files_to_check = [
-        Path('/usr/local/lib/python3.10/dist-packages/hloc/__init__.py'),
-        Path('/usr/local/lib/python3.10/dist-packages/hloc/utils/parsers.py'),
+        package_file('hloc', '__init__.py'),
+        package_file('hloc', 'utils/parsers.py'),
     ]
     
     print("\n=== Verifying Python syntax ===")
     all_valid = True
     
     for py_file in files_to_check:
-        if not py_file.exists():
+        if py_file is None:
             continue
             
         try:
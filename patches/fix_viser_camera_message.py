@@ -2,11 +2,33 @@
 """
 viser CameraMessage 호환성 패치
 nerfstudio와 viser 0.2.7 간의 메시지 타입 불일치 해결
+(런타임 별칭 등록은 import_hooks가 viser를 import하는 프로세스에서만 수행 - sitecustomize 사용 안 함)
 """
 
+import re
+import shutil
+import subprocess
 import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from patch_engine import package_root, site_packages
+from precompile import precompile
+from viser_compat import register_camera_message_alias
+
+# site-packages에 설치되는 런타임 모듈
+RUNTIME_MODULES = [
+    Path(__file__).resolve().parent / 'import_hooks.py',
+    Path(__file__).resolve().parent / 'viser_compat.py',
+    Path(__file__).resolve().parent / 'viewer_coalescer.py',
+    Path(__file__).resolve().parent / 'viewer_resolution.py',
+    Path(__file__).resolve().parent / 'viewer_render_cache.py',
+]
+
+# 인터프리터 시작 시 finder만 설치 (viser는 import하지 않음)
+HOOK_PTH_NAME = 'runtime_import_hooks.pth'
+HOOK_PTH_LINE = 'import import_hooks; import_hooks.install()\n'
+
 
 def patch_viser_messages():
     """viser의 메시지 타입에 CameraMessage 별칭 추가"""
@@ -14,18 +36,10 @@ def patch_viser_messages():
         # viser messages 모듈 찾기
         import viser.infra._messages as messages
         
-        # ViewerCameraMessage를 CameraMessage로도 등록
-        if hasattr(messages, 'ViewerCameraMessage'):
-            # 메시지 레지스트리에 별칭 추가
-            if hasattr(messages.Message, '_subclass_from_type_string'):
-                registry = messages.Message._subclass_from_type_string()
-                if 'ViewerCameraMessage' in registry and 'CameraMessage' not in registry:
-                    registry['CameraMessage'] = registry['ViewerCameraMessage']
-                    print("✓ Added CameraMessage alias to viser message registry")
-                    return True
-                elif 'CameraMessage' in registry:
-                    print("  CameraMessage already registered")
-                    return True
+        # ViewerCameraMessage를 CameraMessage로도 등록 (런타임 훅과 같은 함수)
+        if register_camera_message_alias(messages):
+            print("✓ CameraMessage alias is registered in viser message registry")
+            return True
         
         print("⚠ Could not add CameraMessage alias - ViewerCameraMessage not found")
         return False
@@ -39,10 +53,11 @@ def patch_nerfstudio_imports():
     """nerfstudio의 CameraMessage import를 ViewerCameraMessage로 리다이렉트"""
     try:
         # nerfstudio viewer 모듈들 찾기
-        nerfstudio_path = Path('/usr/local/lib/python3.10/dist-packages/nerfstudio')
+        # nerfstudio를 import하지 않고 (torch 초기화 없이) 설치 위치를 찾음
+        nerfstudio_path = package_root('nerfstudio')
         
-        if not nerfstudio_path.exists():
-            print(f"WARNING: nerfstudio not found at {nerfstudio_path}")
+        if nerfstudio_path is None:
+            print("WARNING: nerfstudio not found")
             return False
         
         # viewer_legacy 디렉토리의 viser/messages.py 수정
@@ -127,45 +142,74 @@ except ImportError:
         return False
 
 
-def create_startup_hook():
-    """시작 시 자동으로 패치를 적용하는 훅 생성"""
+def _remove_legacy_startup_hook(site_dir):
+    """이전 버전이 sitecustomize.py에 추가한 eager import 블록 제거"""
+    sitecustomize_path = site_dir / 'sitecustomize.py'
+    if not sitecustomize_path.exists():
+        return
+    
+    with open(sitecustomize_path, 'r') as f:
+        content = f.read()
+    if 'VISER_COMPAT_PATCH' not in content:
+        return
+    
+    content = re.sub(r'\n?# VISER_COMPAT_PATCH - Auto-patch.*?\nexcept:\n    pass\n', '', content, flags=re.S)
+    if content.strip():
+        with open(sitecustomize_path, 'w') as f:
+            f.write(content)
+    else:
+        sitecustomize_path.unlink()
+    print(f"✓ Removed eager viser import from {sitecustomize_path}")
+
+
+def install_import_hook():
+    """viser가 import될 때만 CameraMessage 별칭을 등록하는 import 훅 설치"""
     try:
-        # sitecustomize.py에 패치 추가
-        sitecustomize_path = Path('/usr/local/lib/python3.10/dist-packages/sitecustomize.py')
+        site_dir = site_packages('viser')
         
-        patch_code = """
-# VISER_COMPAT_PATCH - Auto-patch viser CameraMessage compatibility
-try:
-    import viser.infra._messages as messages
-    if hasattr(messages, 'ViewerCameraMessage'):
-        if hasattr(messages.Message, '_subclass_from_type_string'):
-            registry = messages.Message._subclass_from_type_string()
-            if 'ViewerCameraMessage' in registry and 'CameraMessage' not in registry:
-                registry['CameraMessage'] = registry['ViewerCameraMessage']
-except:
-    pass
-"""
+        installed = []
+        for module in RUNTIME_MODULES:
+            shutil.copy(module, site_dir / module.name)
+            installed.append(site_dir / module.name)
+            print(f"✓ Installed: {site_dir / module.name}")
+        # 모든 프로세스가 시작 시 import하므로 .pyc를 미리 만들어 둠
+        precompile(installed)
         
-        if sitecustomize_path.exists():
-            with open(sitecustomize_path, 'r') as f:
-                content = f.read()
-            
-            if 'VISER_COMPAT_PATCH' not in content:
-                with open(sitecustomize_path, 'a') as f:
-                    f.write(patch_code)
-                print(f"✓ Added startup hook to {sitecustomize_path}")
-        else:
-            with open(sitecustomize_path, 'w') as f:
-                f.write(patch_code)
-            print(f"✓ Created {sitecustomize_path} with startup hook")
+        # .pth의 import 줄은 site 모듈이 시작 시 실행
+        with open(site_dir / HOOK_PTH_NAME, 'w') as f:
+            f.write(HOOK_PTH_LINE)
+        print(f"✓ Installed import hook: {site_dir / HOOK_PTH_NAME}")
         
+        _remove_legacy_startup_hook(site_dir)
         return True
         
     except Exception as e:
-        print(f"WARNING: Could not create startup hook: {e}")
+        print(f"WARNING: Could not install import hook: {e}")
         return False
 
 
+def verify_import_hook():
+    """새 인터프리터에서: 시작 시 viser가 로드되지 않고, import하면 별칭이 등록되는지 확인"""
+    startup = subprocess.run(
+        [sys.executable, '-c', "import sys; print('viser' in sys.modules)"],
+        capture_output=True, text=True)
+    lazy = subprocess.run(
+        [sys.executable, '-c',
+         "import viser.infra._messages as m; "
+         "print('CameraMessage' in m.Message._subclass_from_type_string())"],
+        capture_output=True, text=True)
+    
+    if startup.stdout.strip() == 'False':
+        print("✓ viser is not imported at interpreter startup")
+    else:
+        print("⚠ viser is still imported at interpreter startup")
+    if lazy.stdout.strip() == 'True':
+        print("✅ CameraMessage is registered when viser is imported")
+        return True
+    print(f"❌ CameraMessage is not registered on import: {(lazy.stderr or lazy.stdout).strip()}")
+    return False
+
+
 if __name__ == "__main__":
     print("=== Fixing viser CameraMessage compatibility ===")
     
@@ -177,20 +221,14 @@ if __name__ == "__main__":
     print("\nStep 2: Patching nerfstudio imports...")
     nerfstudio_patched = patch_nerfstudio_imports()
     
-    # 3단계: 시작 훅 생성
-    print("\nStep 3: Creating startup hook...")
-    hook_created = create_startup_hook()
+    # 3단계: import 훅 설치
+    print("\nStep 3: Installing lazy import hook...")
+    hook_created = install_import_hook()
     
     # 검증
     print("\n=== Verifying patch ===")
     try:
-        import viser.infra._messages as messages
-        if hasattr(messages.Message, '_subclass_from_type_string'):
-            registry = messages.Message._subclass_from_type_string()
-            if 'CameraMessage' in registry:
-                print("✅ CameraMessage is now registered in viser")
-            else:
-                print("❌ CameraMessage is still not registered")
+        verify_import_hook()
     except Exception as e:
         print(f"Could not verify: {e}")
     
@@ -5,32 +5,14 @@ hloc parsers.py pycolmap fallback 패치
 """
 
 import sys
-import os
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from patch_engine import Transform, run_transforms
 
-def patch_hloc_parsers():
-    """hloc parsers.py에 pycolmap fallback 패치 적용"""
-    try:
-        import hloc
-        hloc_path = Path(hloc.__file__).parent
-        
-        # parsers.py 파일 패치
-        patch_file = hloc_path / 'utils' / 'parsers.py'
-        if not patch_file.exists():
-            print(f"⚠ hloc parsers.py not found: {patch_file}")
-            return False
-        
-        print(f"Patching hloc parsers.py: {patch_file}")
-        
-        with open(patch_file, 'r') as f:
-            content = f.read()
-        
-        if 'import pycolmap' in content and 'COLMAP_FALLBACK_PATCH' not in content:
-            # pycolmap 0.6.1 Python wrapper용 패치 (COLMAP 3.12.4 C++ 엔진과 링크)
-            patched_content = content.replace(
-                'import pycolmap',
-                '''# COLMAP_FALLBACK_PATCH - pycolmap 0.6.1 with COLMAP 3.12.4
+
+# pycolmap 0.6.1 Python wrapper용 패치 (COLMAP 3.12.4 C++ 엔진과 링크)
+FALLBACK_IMPORT = '''# COLMAP_FALLBACK_PATCH - pycolmap 0.6.1 with COLMAP 3.12.4
 try:
     import pycolmap
     # pycolmap 0.6.1 Python wrapper가 COLMAP 3.12.4 C++ 백엔드 사용
@@ -38,17 +20,19 @@ try:
 except (ImportError, RuntimeError) as e:
     pycolmap = None
     print(f"WARNING: pycolmap import failed ({e}), falling back to COLMAP binary")'''
-            )
-            
-            with open(patch_file, 'w') as f:
-                f.write(patched_content)
-            
-            print("✓ Applied pycolmap fallback patch to hloc parsers.py")
-            return True
-        else:
-            print("✓ hloc parsers.py already patched or no pycolmap import found")
-            return True
-            
+
+TRANSFORMS = [
+    # import pycolmap이 없으면 패치할 필요 없음 (실패로 보지 않음)
+    Transform("hloc parsers pycolmap fallback", "hloc", "utils/parsers.py",
+              marker="COLMAP_FALLBACK_PATCH", replace=[("import pycolmap", FALLBACK_IMPORT)],
+              required=False),
+]
+
+
+def patch_hloc_parsers():
+    """hloc parsers.py에 pycolmap fallback 패치 적용"""
+    try:
+        return run_transforms(TRANSFORMS, "hloc parsers fallback")
     except Exception as e:
         print(f"ERROR: hloc parsers patch failed: {e}")
         return False
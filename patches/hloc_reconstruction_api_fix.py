@@ -6,51 +6,22 @@ pycolmap 0.6.1 Python wrapper의 API 변경사항 수정
 """
 
 import sys
-import os
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from patch_engine import Transform, run_transforms
 
-def patch_hloc_reconstruction():
-    """hloc reconstruction.py의 pycolmap API 호출을 최신 버전에 맞게 수정"""
-    try:
-        # hloc import 없이 직접 경로 추정
-        hloc_path = Path('/usr/local/lib/python3.10/dist-packages/hloc')
-        if not hloc_path.exists():
-            # 대안 경로들 시도
-            for possible_path in [
-                Path('/usr/local/lib/python3.10/site-packages/hloc'),
-                Path('/opt/conda/lib/python3.10/site-packages/hloc'),
-            ]:
-                if possible_path.exists():
-                    hloc_path = possible_path
-                    break
-        
-        if not hloc_path.exists():
-            print(f"⚠ hloc directory not found")
-            return False
-        
-        # reconstruction.py 파일 패치
-        patch_file = hloc_path / 'reconstruction.py'
-        if not patch_file.exists():
-            print(f"⚠ hloc reconstruction.py not found: {patch_file}")
-            return False
-        
-        print(f"Patching hloc reconstruction.py: {patch_file}")
-        
-        with open(patch_file, 'r') as f:
-            content = f.read()
-        
-        if 'PYCOLMAP_API_FIX_PATCH' not in content:
-            # image_names를 image_list로 변경
-            original_call = '''pycolmap.import_images(
+
+# image_names를 image_list로 변경
+ORIGINAL_CALL = '''pycolmap.import_images(
             database_path,
             image_dir,
             camera_mode,
             image_names=image_list or [],
             options=options,
         )'''
-            
-            patched_call = '''# PYCOLMAP_API_FIX_PATCH - pycolmap 0.6.1 API compatibility
+
+PATCHED_CALL = '''# PYCOLMAP_API_FIX_PATCH - pycolmap 0.6.1 API compatibility
         pycolmap.import_images(
             database_path=str(database_path),       # ✅ str로 캐스팅
             image_path=str(image_dir),              # ✅ str로 캐스팅  
@@ -58,24 +29,18 @@ def patch_hloc_reconstruction():
             image_list=list(image_list or []),      # ✅ image_names → image_list 변경
             options=options,
         )'''
-            
-            patched_content = content.replace(original_call, patched_call)
-            
-            if patched_content != content:
-                with open(patch_file, 'w') as f:
-                    f.write(patched_content)
-                
-                print("✓ Applied pycolmap API fix patch to hloc reconstruction.py")
-                print("  → Changed image_names to image_list parameter")
-                print("  → Added str() casting for Path objects")
-                return True
-            else:
-                print("⚠ Could not find the expected pycolmap.import_images call pattern")
-                return False
-        else:
-            print("✓ hloc reconstruction.py already patched")
-            return True
-            
+
+TRANSFORMS = [
+    Transform("hloc reconstruction API fix (image_names → image_list, str() casting)",
+              "hloc", "reconstruction.py", marker="PYCOLMAP_API_FIX_PATCH",
+              replace=[(ORIGINAL_CALL, PATCHED_CALL)]),
+]
+
+
+def patch_hloc_reconstruction():
+    """hloc reconstruction.py의 pycolmap API 호출을 최신 버전에 맞게 수정"""
+    try:
+        return run_transforms(TRANSFORMS, "hloc reconstruction API fix")
     except Exception as e:
         print(f"ERROR: hloc reconstruction API fix failed: {e}")
         return False
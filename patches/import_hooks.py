@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+patch-on-import 훅 (런타임 패치용, site-packages에 설치됨)
+sitecustomize에서 대상 패키지를 미리 import하면 viewer와 무관한 모든 Python 프로세스
+(colmap 래퍼, 패치 스크립트, 데이터 로더 워커)가 시작 비용을 치르므로, sys.meta_path finder가
+대상 모듈이 실제로 import되어 실행된 직후에만 등록된 패치 함수를 호출함
+
+시작 시에는 runtime_import_hooks.pth가 install()만 호출 (표준 라이브러리 sys 외에는 import하지 않음)
+
+새 런타임 패치 추가: RUNTIME_PATCHES에 (모듈 이름, "패치 모듈:함수") 추가 또는
+    from import_hooks import when_imported
+
+    @when_imported("some.module")
+    def _patch(module):
+        ...
+"""
+
+import sys
+
+
+# 대상 모듈이 import될 때 호출할 패치 ("모듈:함수" 문자열은 호출 시점에 import)
+RUNTIME_PATCHES = [
+    ("viser.infra._messages", "viser_compat:register_camera_message_alias"),
+    ("nerfstudio.viewer.render_state_machine", "viewer_coalescer:patch_render_state_machine"),
+    ("nerfstudio.viewer.render_state_machine", "viewer_resolution:patch_render_state_machine"),
+    # 캐시는 마지막에 감싸야 적중 시 스케줄러/병합 측정에 잡히지 않음
+    ("nerfstudio.viewer.render_state_machine", "viewer_render_cache:patch_render_state_machine"),
+]
+
+_hooks = {}  # 모듈 이름 -> 아직 실행하지 않은 훅 목록
+
+
+def _resolve(hook):
+    if callable(hook):
+        return hook
+    module_name, _, attr = hook.partition(":")
+    module = __import__(module_name, fromlist=[attr])
+    return getattr(module, attr)
+
+
+def _run_hooks(module):
+    for hook in _hooks.pop(module.__name__, []):
+        try:
+            _resolve(hook)(module)
+        except Exception as e:
+            # 런타임 패치 실패가 원래 import를 깨뜨리면 안 됨
+            print(f"⚠ [import_hooks] {module.__name__}: {hook} failed: {e}", file=sys.stderr)
+
+
+class _HookedLoader:
+    """Delegating loader that runs post-import hooks after the real exec_module"""
+
+    def __init__(self, loader):
+        self.loader = loader
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        # 모듈에는 원래 loader가 보이도록 되돌림 (importlib.resources, reload 등)
+        module.__loader__ = self.loader
+        if getattr(module, "__spec__", None) is not None:
+            module.__spec__.loader = self.loader
+        self.loader.exec_module(module)
+        _run_hooks(module)
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+class PostImportFinder:
+    """sys.meta_path finder that only wraps the loaders of modules with registered hooks"""
+
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname not in _hooks:
+            return None
+        # 실제 탐색은 나머지 finder에게 맡기고 loader만 감쌈
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _HookedLoader(spec.loader)
+        return spec
+
+
+def register(module_name, hook):
+    """Run hook(module) once module_name is imported (immediately if it already is)
+
+    hook은 callable 또는 "패치 모듈:함수" 문자열
+    """
+    _hooks.setdefault(module_name, []).append(hook)
+    module = sys.modules.get(module_name)
+    if module is not None:
+        _run_hooks(module)
+
+
+def when_imported(module_name):
+    """Decorator form of register()"""
+    def decorator(hook):
+        register(module_name, hook)
+        return hook
+    return decorator
+
+
+def install():
+    """Put the finder first on sys.meta_path and register RUNTIME_PATCHES (idempotent)"""
+    if any(isinstance(finder, PostImportFinder) for finder in sys.meta_path):
+        return
+    sys.meta_path.insert(0, PostImportFinder())
+    for module_name, hook in RUNTIME_PATCHES:
+        register(module_name, hook)
+
+
+def pending():
+    """{module name: [hooks]} that have not run yet (for diagnostics)"""
+    return {name: list(hooks) for name, hooks in _hooks.items()}
@@ -2,138 +2,158 @@
 """
 LightGlue 오프라인 패치 스크립트
 네트워크 연결 없이 사전 다운로드된 모델을 사용하도록 패치
+(체크포인트 로드는 site-packages에 설치되는 offline_model_loader가 담당)
 """
 
+import re
 import sys
 import shutil
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from patch_engine import Transform, package_root, run_transforms
 
-def patch_lightglue():
-    """LightGlue 라이브러리를 오프라인 모드로 패치"""
-    try:
-        import lightglue
-        lightglue_path = Path(lightglue.__file__).parent
-        lightglue_file = lightglue_path / 'lightglue.py'
-        
-        print(f"Patching LightGlue at: {lightglue_file}")
-        
-        # 백업 생성
-        backup_file = lightglue_path / 'lightglue.py.backup'
-        if not backup_file.exists():
-            shutil.copy(lightglue_file, backup_file)
-            print(f"✓ Backup created: {backup_file}")
-        
-        # 파일 내용 읽기
-        with open(lightglue_file, 'r') as f:
-            content = f.read()
-        
-        # 이미 패치되었는지 확인
-        if 'LIGHTGLUE_OFFLINE_PATCH' in content:
-            print("✓ LightGlue already patched")
-            return True
-        
-        # 오프라인 패치 코드
-        patch_code = '''# LIGHTGLUE_OFFLINE_PATCH
+
+# site-packages에 함께 설치되는 런타임 모듈
+LOADER_MODULES = [
+    Path(__file__).resolve().parent / 'offline_model_loader.py',
+    Path(__file__).resolve().parent / 'model_registry.py',
+]
+
+# LightGlue/hloc에 삽입되는 훅 - offline_model_loader가 없으면 기존 방식(torch.load)으로 동작
+OFFLINE_HOOK_TEMPLATE = '''# {marker}
 import torch
 from pathlib import Path
 
-def _offline_load_state_dict_from_url(url, *args, **kwargs):
-    """Offline version that loads pre-downloaded models"""
-    model_name = url.split('/')[-1]
-    cache_dir = Path("/home/user/.cache/torch/hub/checkpoints")
-    
-    # 직접 파일명 매칭
-    if cache_dir.exists():
-        target_file = cache_dir / model_name
-        if target_file.exists():
-            print(f"Loading pre-downloaded model: {target_file}")
-            return torch.load(target_file, map_location=kwargs.get('map_location', 'cpu'))
-    
-    raise FileNotFoundError(f"Pre-downloaded model not found: {model_name}")
+try:
+    from offline_model_loader import load_state_dict_from_url as _offline_load_state_dict_from_url
+except ImportError:
+    def _offline_load_state_dict_from_url(url, *args, **kwargs):
+        """Offline version that loads pre-downloaded models"""
+        model_name = url.split('/')[-1]
+        cache_dir = Path("/home/user/.cache/torch/hub/checkpoints")
+        
+        if cache_dir.exists():
+            target_file = cache_dir / model_name
+            if target_file.exists():
+                print(f"{tag}Loading pre-downloaded model: {{target_file}}")
+                return torch.load(target_file, map_location=kwargs.get('map_location', 'cpu'))
+        
+        raise FileNotFoundError(f"{tag}Pre-downloaded model not found: {{model_name}}")
 
 # torch.hub.load_state_dict_from_url을 오프라인 버전으로 교체
-original_torch_hub_load = torch.hub.load_state_dict_from_url
 torch.hub.load_state_dict_from_url = _offline_load_state_dict_from_url
 
 '''
-        
-        # import 섹션 끝에 패치 코드 삽입
-        import_section_end = content.find('\nclass ')
-        if import_section_end > 0:
-            patched_content = content[:import_section_end] + '\n\n' + patch_code + '\n' + content[import_section_end:]
-        else:
-            patched_content = patch_code + '\n\n' + content
-        
-        # 파일 저장
-        with open(lightglue_file, 'w') as f:
-            f.write(patched_content)
-        
-        print("✓ LightGlue offline patch applied successfully")
-        return True
-        
-    except Exception as e:
-        print(f"ERROR: LightGlue patch failed: {e}")
-        return False
 
+# hloc NetVLAD의 scipy loadmat을 평탄화된 .safetensors 우선 로더로 교체 (모듈 끝에 추가)
+NETVLAD_HOOK = '''
+
+# HLOC_NETVLAD_FLAT_WEIGHTS_PATCH
+try:
+    from offline_model_loader import load_netvlad_mat as _load_netvlad_mat
+    _scipy_loadmat = loadmat
+
+    def loadmat(path, *args, **kwargs):
+        return _load_netvlad_mat(path, _scipy_loadmat, *args, **kwargs)
+except ImportError:
+    pass
+'''
 
-def patch_hloc_lightglue():
-    """hloc의 LightGlue matcher도 패치"""
-    try:
-        import hloc.matchers.lightglue as hloc_lg
-        hloc_lg_file = Path(hloc_lg.__file__)
-        
-        with open(hloc_lg_file, 'r') as f:
-            hloc_content = f.read()
-        
-        if 'HLOC_LIGHTGLUE_OFFLINE_PATCH' in hloc_content:
-            print("✓ hloc LightGlue matcher already patched")
-            return True
-        
-        # hloc용 패치 코드
-        hloc_patch = '''# HLOC_LIGHTGLUE_OFFLINE_PATCH
-import torch
-from pathlib import Path
 
-def _offline_load_state_dict_from_url(url, *args, **kwargs):
-    """Offline version for hloc LightGlue matcher"""
-    model_name = url.split('/')[-1]
-    cache_dir = Path("/home/user/.cache/torch/hub/checkpoints")
+def _strip_legacy_patch(content, marker):
+    """이전 버전 패치 블록(마커 ~ torch.hub 교체 줄)을 제거"""
+    pattern = (rf'# {marker}\n.*?torch\.hub\.load_state_dict_from_url = '
+               rf'_offline_load_state_dict_from_url\n')
+    return re.sub(pattern, '', content, count=1, flags=re.S)
+
+
+def install_offline_loader(site_dir):
+    """offline_model_loader / model_registry 모듈을 site-packages에 설치"""
+    for module in LOADER_MODULES:
+        if not module.exists():
+            print(f"⚠ {module.name} not found: {module}")
+            return False
     
-    if cache_dir.exists():
-        target_file = cache_dir / model_name
-        if target_file.exists():
-            print(f"[HLOC] Loading pre-downloaded model: {target_file}")
-            return torch.load(target_file, map_location=kwargs.get('map_location', 'cpu'))
+    for module in LOADER_MODULES:
+        target = Path(site_dir) / module.name
+        shutil.copy(module, target)
+        print(f"✓ Installed: {target}")
+    return True
+
+
+def _insert_lightglue_hook(content):
+    """LightGlue: 이전 패치 제거 후 import 섹션 끝(첫 class 앞)에 오프라인 훅 삽입"""
+    content = _strip_legacy_patch(content, 'LIGHTGLUE_OFFLINE_PATCH')
     
-    raise FileNotFoundError(f"[HLOC] Pre-downloaded model not found: {model_name}")
+    # 오프라인 패치 코드
+    patch_code = OFFLINE_HOOK_TEMPLATE.format(marker='LIGHTGLUE_OFFLINE_PATCH_V2', tag='')
+    
+    # import 섹션 끝에 패치 코드 삽입
+    import_section_end = content.find('\nclass ')
+    if import_section_end > 0:
+        return content[:import_section_end] + '\n\n' + patch_code + '\n' + content[import_section_end:]
+    return patch_code + '\n\n' + content
 
-torch.hub.load_state_dict_from_url = _offline_load_state_dict_from_url
 
-'''
-        
-        # 파일 앞부분에 패치 삽입
-        hloc_patched = hloc_patch + '\n\n' + hloc_content
-        
-        with open(hloc_lg_file, 'w') as f:
-            f.write(hloc_patched)
-        
-        print("✓ hloc LightGlue matcher patched for offline mode")
-        return True
+def _prepend_hloc_hook(content):
+    """hloc LightGlue matcher: 이전 패치 제거 후 파일 앞부분에 훅 삽입"""
+    content = _strip_legacy_patch(content, 'HLOC_LIGHTGLUE_OFFLINE_PATCH')
+    
+    # hloc용 패치 코드
+    hloc_patch = OFFLINE_HOOK_TEMPLATE.format(marker='HLOC_LIGHTGLUE_OFFLINE_PATCH_V2', tag='[HLOC] ')
+    return hloc_patch + '\n\n' + content
+
+
+def _append_netvlad_hook(content):
+    return content.rstrip('\n') + '\n' + NETVLAD_HOOK
+
+
+TRANSFORMS = [
+    Transform("LightGlue offline hook", "lightglue", "lightglue.py",
+              marker="LIGHTGLUE_OFFLINE_PATCH_V2", func=_insert_lightglue_hook, backup=True),
+    Transform("hloc LightGlue matcher offline hook", "hloc", "matchers/lightglue.py",
+              marker="HLOC_LIGHTGLUE_OFFLINE_PATCH_V2", func=_prepend_hloc_hook),
+    # NetVLAD가 없는 hloc 버전도 있으므로 선택적
+    Transform("hloc NetVLAD flat weights", "hloc", "extractors/netvlad.py",
+              marker="HLOC_NETVLAD_FLAT_WEIGHTS_PATCH", func=_append_netvlad_hook, required=False),
+]
+
+
+def prepare():
+    """LightGlue/hloc이 설치된 site-packages에 offline_model_loader / model_registry 설치"""
+    site_dirs = []
+    for package in ('lightglue', 'hloc'):
+        root = package_root(package)
+        if root is not None and root.parent not in site_dirs:
+            site_dirs.append(root.parent)
+    
+    if not site_dirs:
+        print("⚠ Neither LightGlue nor hloc is installed")
+        return False
+    return all(install_offline_loader(site_dir) for site_dir in site_dirs)
+
+
+def patch_lightglue():
+    """LightGlue 라이브러리 + hloc LightGlue matcher / NetVLAD를 오프라인 모드로 패치"""
+    try:
+        if not prepare():
+            return False
+        return run_transforms(TRANSFORMS, "LightGlue Offline")
         
     except Exception as e:
-        print(f"⚠ hloc LightGlue patch skipped: {e}")
+        print(f"ERROR: LightGlue patch failed: {e}")
         return False
 
 
+def main():
+    return patch_lightglue()
+
+
 if __name__ == "__main__":
     print("=== Applying LightGlue offline patches ===")
     
-    success = True
-    success &= patch_lightglue()
-    success &= patch_hloc_lightglue()
-    
-    if success:
+    if main():
         print("✅ All LightGlue patches applied successfully")
         sys.exit(0)
     else:
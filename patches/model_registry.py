@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+모델 레지스트리
+URL / 논리 이름 / 파일명 -> 경로, 크기, sha256을 담은 JSON manifest를 빌드 시 생성하고
+런타임에는 한 번만 읽어 dict 인덱스로 O(1) 조회 (torch hub, ./models 볼륨 등 여러 검색 루트 지원)
+sha256은 (inode, size, mtime) 키의 sidecar 캐시에 보관하여 바뀐 파일만 다시 해시
+검증 기준은 download_models.sh의 다운로드 기록 > 파일명의 hash prefix(torchvision) > 빌드 시 manifest 순
+(다운로드 기록은 서버 Content-Length와 크기가 맞는 다운로드만 남으므로 빌드 전에 잘린 파일을 잡음.
+ manifest 값은 빌드 당시 디스크 내용이라 빌드 이후의 변경만 감지)
+
+Usage:
+    python model_registry.py --build [--manifest PATH] [--root DIR ...]
+    python model_registry.py --list
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+TORCH_HOME = Path(os.environ.get("TORCH_HOME", "/home/user/.cache/torch"))
+MANIFEST_PATH = Path(os.environ.get("MODEL_MANIFEST", TORCH_HOME / "hub" / "models_manifest.json"))
+HASH_CACHE_PATH = Path(os.environ.get("MODEL_HASH_CACHE", MANIFEST_PATH.with_name("models_hashes.json")))
+# download_models.sh가 models_cache/models.sha256에 남긴 "sha256 크기  파일명" 목록 (Dockerfile이 복사)
+DOWNLOAD_RECORD_PATH = Path(os.environ.get("MODEL_DOWNLOAD_RECORD", MANIFEST_PATH.with_name("models.sha256")))
+MODEL_EXTENSIONS = {".pth", ".pt", ".mat", ".safetensors", ".npz"}
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+HASH_PREFIX_RE = re.compile(r"-([0-9a-f]{8,64})\.[^.]+$")  # torchvision: <이름>-<sha256 앞자리>.pth
+
+# (논리 이름, 파일명, 다운로드 URL, 종류) - download_models.sh와 같은 목록
+MODEL_SPECS = [
+    ("superpoint_lightglue", "superpoint_lightglue.pth",
+     "https://github.com/cvg/LightGlue/releases/download/v0.1_arxiv/superpoint_lightglue.pth", "torch"),
+    ("disk_lightglue", "disk_lightglue.pth",
+     "https://github.com/cvg/LightGlue/releases/download/v0.1_arxiv/disk_lightglue.pth", "torch"),
+    ("aliked_lightglue", "aliked_lightglue.pth",
+     "https://github.com/cvg/LightGlue/releases/download/v0.1_arxiv/aliked_lightglue.pth", "torch"),
+    ("sift_lightglue", "sift_lightglue.pth",
+     "https://github.com/cvg/LightGlue/releases/download/v0.1_arxiv/sift_lightglue.pth", "torch"),
+    ("superpoint", "superpoint_v1.pth",
+     "https://github.com/magicleap/SuperGluePretrainedNetwork/raw/master/models/weights/superpoint_v1.pth", "torch"),
+    ("alexnet", "alexnet-owt-7be5be79.pth",
+     "https://download.pytorch.org/models/alexnet-owt-7be5be79.pth", "torch"),  # ns-train LPIPS
+    ("netvlad_pitts30k", "VGG16-NetVLAD-Pitts30K.mat",
+     "https://cvg-data.inf.ethz.ch/hloc/netvlad/Pitts30K_struct.mat", "netvlad"),
+    ("netvlad_tokyotm", "VGG16-NetVLAD-TokyoTM.mat",
+     "https://cvg-data.inf.ethz.ch/hloc/netvlad/TokyoTM_struct.mat", "netvlad"),
+]
+
+
+def read_download_record(path=None):
+    """{file name: (sha256, size)} recorded by download_models.sh (empty if there is no record)"""
+    record = {}
+    try:
+        with open(path or DOWNLOAD_RECORD_PATH) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) == 3:
+                    record[fields[2]] = (fields[0], int(fields[1]))
+    except (OSError, ValueError):
+        pass
+    return record
+
+
+def default_roots():
+    """Search roots in priority order ($MODEL_SEARCH_PATHS first)"""
+    roots = [Path(p) for p in os.environ.get("MODEL_SEARCH_PATHS", "").split(os.pathsep) if p]
+    roots += [
+        TORCH_HOME / "hub" / "checkpoints",
+        TORCH_HOME / "hub" / "netvlad",
+        Path("/workspace/models"),  # docker-compose ./models 볼륨
+        Path("models"),
+    ]
+    return roots
+
+
+def file_sha256(path):
+    """sha256 with large unbuffered reads into one reused buffer (hashlib releases the GIL)"""
+    digest = hashlib.sha256()
+    buffer = bytearray(HASH_CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            size = f.readinto(buffer)
+            if not size:
+                break
+            digest.update(view[:size])
+    return digest.hexdigest()
+
+
+def file_stamp(path):
+    st = os.stat(path)
+    return [st.st_ino, st.st_size, st.st_mtime_ns]
+
+
+class HashCache:
+    """sha256 sidecar keyed by (inode, size, mtime_ns) so unchanged files are hashed once"""
+
+    def __init__(self, path=None):
+        self.path = Path(path or HASH_CACHE_PATH)
+        self.hashed = 0
+        self.cached = 0
+        self._entries = {}
+        try:
+            with open(self.path) as f:
+                self._entries = json.load(f).get("files", {})
+        except (OSError, ValueError):
+            pass  # 없거나 손상된 캐시는 비어 있는 것으로 취급
+
+    def lookup(self, path):
+        entry = self._entries.get(str(Path(path).resolve()))
+        if entry is not None and entry["stamp"] == file_stamp(path):
+            return entry["sha256"]
+        return None
+
+    def hash_files(self, paths, max_workers=4, use_cache=True):
+        """{resolved path: sha256}, reading only files whose stamp changed (all if not use_cache)"""
+        digests = {}
+        stale = []
+        for path in (Path(p).resolve() for p in paths):
+            digest = self.lookup(path) if use_cache else None
+            if digest is None:
+                stale.append((path, file_stamp(path)))  # 해시 전에 stamp를 잡아 도중 변경을 놓치지 않음
+            else:
+                digests[path] = digest
+        self.cached += len(digests)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for (path, stamp), digest in zip(stale, pool.map(lambda item: file_sha256(item[0]), stale)):
+                digests[path] = digest
+                self._entries[str(path)] = {"stamp": stamp, "sha256": digest}
+        self.hashed += len(stale)
+        return digests
+
+    def save(self):
+        """Write the sidecar atomically; False on a read-only location"""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump({"version": 1, "files": self._entries}, f)
+            os.replace(tmp_path, self.path)
+            return True
+        except OSError:
+            return False
+
+
+def scan_roots(roots):
+    """{file name: path} over all roots; earlier roots win on name clashes"""
+    found = {}
+    for root in roots:
+        if not root.is_dir():
+            continue
+        for entry in os.scandir(root):
+            if entry.is_file() and Path(entry.name).suffix in MODEL_EXTENSIONS:
+                found.setdefault(entry.name, Path(entry.path).resolve())
+    return found
+
+
+class ModelRegistry:
+    """In-memory index over the manifest: url / name / file name / stem -> entry"""
+
+    def __init__(self, manifest_path=None, roots=None):
+        self.manifest_path = Path(manifest_path or MANIFEST_PATH)
+        self.roots = [Path(r) for r in (roots or default_roots())]
+        self.entries = []
+        self._index = {}
+        self._files = None  # 루트 스캔 결과 (manifest에 없을 때만 지연 생성)
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        manifest = {}
+        if self.manifest_path.exists():
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        entries = {entry["file"]: entry for entry in manifest.get("models", [])}
+        # manifest가 없거나 일부 모델이 빠져 있어도 spec으로 조회는 가능하게 함
+        for name, file_name, url, kind in MODEL_SPECS:
+            entries.setdefault(file_name, {"name": name, "file": file_name, "url": url,
+                                           "kind": kind, "path": None})
+        # 다운로드 기록은 manifest가 아니라 별도 파일에서 옴 (manifest를 다시 만들어도 바뀌지 않음)
+        for file_name, (sha256, size) in read_download_record().items():
+            if file_name in entries:
+                entries[file_name]["recorded_sha256"], entries[file_name]["recorded_size"] = sha256, size
+        self.entries = list(entries.values())
+        for entry in self.entries:
+            for key in (entry.get("url"), entry.get("name"), entry["file"], Path(entry["file"]).stem):
+                if key:
+                    self._index.setdefault(key, entry)
+
+    def _scanned_files(self):
+        with self._lock:
+            if self._files is None:
+                self._files = scan_roots(self.roots)
+            return self._files
+
+    def get(self, key):
+        """Manifest entry for a URL, logical name, file name or file stem (None if unknown)"""
+        entry = self._index.get(key)
+        if entry is None and "/" in key:
+            entry = self._index.get(key.rsplit("/", 1)[-1])
+        return entry
+
+    def find(self, key):
+        """Path of a model, or None"""
+        entry = self.get(key)
+        if entry is not None and entry.get("path") and Path(entry["path"]).exists():
+            return Path(entry["path"])
+        file_name = entry["file"] if entry is not None else key.rsplit("/", 1)[-1]
+        return self._scanned_files().get(file_name)
+
+    def resolve(self, key):
+        path = self.find(key)
+        if path is None:
+            raise FileNotFoundError(f"Model not found in registry or search roots: {key}")
+        return path
+
+    def models(self, kind=None):
+        return [entry for entry in self.entries if kind is None or entry.get("kind") == kind]
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Process-wide registry, loaded once"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
+
+
+def reference_digest(entry):
+    """(expected sha256 or prefix, expected size, source) to verify a model against
+
+    source: "download record" (download_models.sh), "file name" (torchvision hash prefix),
+    "manifest" (빌드 시 디스크 내용 - 빌드 이후 변경만 감지) 또는 None
+    """
+    recorded_size = entry.get("recorded_size")
+    if entry.get("recorded_sha256"):
+        return entry["recorded_sha256"], recorded_size, "download record"
+    match = HASH_PREFIX_RE.search(entry["file"])
+    if match:
+        return match.group(1), recorded_size, "file name"
+    if entry.get("sha256"):
+        return entry["sha256"], entry.get("size") if recorded_size is None else recorded_size, "manifest"
+    return None, recorded_size if recorded_size is not None else entry.get("size"), None
+
+
+def check_model(entry, size, digest=None):
+    """(status, message) for a model file of the given size/sha256 (digest None: size only)"""
+    expected, expected_size, source = reference_digest(entry)
+    if expected_size is not None and size != expected_size:
+        return "size_mismatch", f"{size} bytes, expected {expected_size} ({source or 'manifest'})"
+    if digest is not None and expected and not digest.startswith(expected):
+        return "checksum_mismatch", f"sha256 {digest[:12]} does not match {source} {expected[:12]}"
+    if expected is None:
+        return "unverified", "no download record or recorded checksum"
+    return "ok", source
+
+
+def build_manifest(manifest_path=None, roots=None, max_workers=4):
+    """Scan roots, hash every model file and write the manifest atomically
+
+    다운로드 기록/파일명 prefix와 맞지 않는 파일은 manifest에 기록하되 mismatched로 따로 반환
+    """
+    manifest_path = Path(manifest_path or MANIFEST_PATH)
+    roots = [Path(r) for r in (roots or default_roots())]
+    files = scan_roots(roots)
+    specs = {spec[1]: spec for spec in MODEL_SPECS}
+    record = read_download_record()
+
+    # convert_weights.py가 만든 .safetensors는 별도 모델이 아니라 원본 항목에 붙임
+    converted = {}
+    for file_name in list(files):
+        stem, suffix = os.path.splitext(file_name)
+        sources = [n for n in files if n != file_name and os.path.splitext(n)[0] == stem]
+        if suffix == ".safetensors" and sources:
+            converted[sources[0]] = files.pop(file_name)
+
+    names = sorted(files)
+    hash_cache = HashCache()
+    hashes = hash_cache.hash_files([files[n] for n in names], max_workers)
+    hash_cache.save()
+    digests = {name: hashes[files[name]] for name in names}
+
+    models = []
+    mismatched = []
+    for file_name in names:
+        name, _, url, kind = specs.get(file_name, (Path(file_name).stem, file_name, None, "extra"))
+        path = files[file_name]
+        entry = {
+            "name": name, "file": file_name, "url": url, "kind": kind,
+            "path": str(path), "size": path.stat().st_size, "sha256": digests[file_name],
+            "converted": str(converted[file_name]) if file_name in converted else None,
+        }
+        models.append(entry)
+        # 방금 계산한 값 자체가 아니라 다운로드 기록/파일명 prefix와 대조
+        reference = {"file": file_name}
+        if file_name in record:
+            reference["recorded_sha256"], reference["recorded_size"] = record[file_name]
+        status, message = check_model(reference, entry["size"], entry["sha256"])
+        if status in ("size_mismatch", "checksum_mismatch"):
+            mismatched.append((file_name, message))
+
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = manifest_path.with_name(manifest_path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"version": 1, "roots": [str(r) for r in roots], "models": models}, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+    missing = sorted(set(specs) - set(files))
+    return manifest_path, models, missing, mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Model registry manifest")
+    parser.add_argument("--build", action="store_true", help="scan roots and write the manifest")
+    parser.add_argument("--list", action="store_true", help="print registry entries")
+    parser.add_argument("--manifest", type=Path, default=None)
+    parser.add_argument("--root", type=Path, action="append", default=None,
+                        help="search root (repeatable, default: torch hub + ./models)")
+    args = parser.parse_args()
+
+    if args.build:
+        manifest_path, models, missing, mismatched = build_manifest(args.manifest, args.root)
+        bad = dict(mismatched)
+        for entry in models:
+            if entry["file"] not in bad:
+                print(f"  ✓ {entry['name']}: {entry['file']} ({entry['size'] / 1024**2:.1f} MB)")
+        for file_name, message in mismatched:
+            print(f"  ❌ {file_name}: {message}")
+        for file_name in missing:
+            print(f"  ⚠ {file_name}: NOT FOUND")
+        record = read_download_record()
+        unrecorded = [spec[1] for spec in MODEL_SPECS if spec[1] not in missing and spec[1] not in record
+                      and not HASH_PREFIX_RE.search(spec[1])]
+        if unrecorded:
+            print(f"  ⚠ No download record for {', '.join(unrecorded)} (verified against this build only)")
+        print(f"{'❌' if mismatched else '✅'} Manifest written: {manifest_path} ({len(models)} models)")
+        return not mismatched
+
+    registry = ModelRegistry(args.manifest, args.root)
+    for entry in registry.models():
+        path = registry.find(entry["file"])
+        print(f"  {'✓' if path else '❌'} {entry['name']}: {path or 'NOT FOUND'}")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,428 @@
+"""
+오프라인 체크포인트 로더
+torch.hub.load_state_dict_from_url 대체 함수 - 사전 다운로드된 모델을 네트워크 없이 로드
+(path, mtime, map_location) 단위로 state dict를 프로세스 전역에 캐시하고 mmap으로 로드하여
+같은 체크포인트로 matcher를 여러 번 만들 때 다시 읽거나 역직렬화하지 않음
+
+빌드 시 convert_weights.py가 만든 .safetensors 파일이 원본 옆에 있으면 그쪽을 우선 사용
+(pickle 역직렬화 없이 mmap 위에서 텐서를 바로 구성)
+
+OFFLINE_MODEL_SHARED=1이면 가중치를 POSIX 공유 메모리(/dev/shm)에 한 번만 게시하고
+다른 worker 프로세스는 읽기 전용으로 attach - load_state_dict(assign=True)로 파라미터가
+공유 페이지를 그대로 가리키므로 worker당 RSS는 activation 정도만 남음
+
+lightglue_offline.py 패치가 site-packages에 설치하고, 패치된 LightGlue/hloc 모듈이 import
+(체크포인트 위치는 model_registry의 manifest 인덱스로 조회)
+
+Usage:
+    python -m offline_model_loader --shared-list | --shared-clear
+"""
+
+import argparse
+import copy
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import struct
+import sys
+import threading
+import warnings
+from types import SimpleNamespace
+from collections import OrderedDict
+from pathlib import Path
+
+from model_registry import get_registry
+
+
+DEFAULT_CACHE_SIZE = 8
+SHARED_WEIGHTS_DIR = Path(os.environ.get("OFFLINE_MODEL_SHM_DIR", "/dev/shm/offline_models"))
+
+# safetensors dtype 코드 -> NumPy dtype 이름 (bf16은 NumPy에 없으므로 제외)
+SAFETENSORS_DTYPES = {
+    "F64": "float64", "F32": "float32", "F16": "float16", "I64": "int64", "I32": "int32",
+    "I16": "int16", "I8": "int8", "U8": "uint8", "BOOL": "bool",
+}
+_NUMPY_TO_SAFETENSORS = {v: k for k, v in SAFETENSORS_DTYPES.items()}
+
+
+def write_safetensors(path, arrays, metadata=None):
+    """Write {name: ndarray} in the safetensors layout (8-byte header size + JSON + raw data)"""
+    import numpy as np
+
+    header = {}
+    offset = 0
+    blobs = []
+    for name, array in arrays.items():
+        array = np.asarray(array, order="C")
+        dtype = _NUMPY_TO_SAFETENSORS.get(array.dtype.name)
+        if dtype is None:
+            raise TypeError(f"Unsupported dtype for {name}: {array.dtype}")
+        blob = array.astype(array.dtype.newbyteorder("<"), copy=False).tobytes()
+        header[name] = {"dtype": dtype, "shape": list(array.shape),
+                        "data_offsets": [offset, offset + len(blob)]}
+        blobs.append(blob)
+        offset += len(blob)
+    if metadata:
+        header["__metadata__"] = {str(k): str(v) for k, v in metadata.items()}
+
+    header_bytes = json.dumps(header, separators=(",", ":")).encode()
+    header_bytes += b" " * (-len(header_bytes) % 8)  # 데이터 시작을 8바이트 정렬
+    tmp_path = Path(f"{path}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp_path, path)
+
+
+def _read_header(buffer):
+    (header_size,) = struct.unpack_from("<Q", buffer, 0)
+    return json.loads(bytes(buffer[8:8 + header_size])), 8 + header_size
+
+
+def read_safetensors(path, access=mmap.ACCESS_COPY):
+    """{name: ndarray} views over an mmap of a safetensors file (no copy)
+
+    ACCESS_COPY(기본)는 쓰기 가능한 copy-on-write 배열, ACCESS_READ는 읽기 전용 배열
+    """
+    import numpy as np
+
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=access)
+    header, data_start = _read_header(buffer)
+    header.pop("__metadata__", None)
+    arrays = {}
+    for name, info in header.items():
+        begin, end = info["data_offsets"]
+        dtype = np.dtype(SAFETENSORS_DTYPES[info["dtype"]]).newbyteorder("<")
+        arrays[name] = np.frombuffer(buffer, dtype=dtype, count=(end - begin) // dtype.itemsize,
+                                     offset=data_start + begin).reshape(tuple(info["shape"]))
+    return arrays
+
+
+def converted_path(path):
+    """Sibling .safetensors of a checkpoint, if it is at least as new as the original"""
+    path = Path(path)
+    flat = path.with_suffix(".safetensors")
+    if flat.exists() and (not path.exists() or flat.stat().st_mtime >= path.stat().st_mtime):
+        return flat
+    return None
+
+
+def _load_safetensors(path, map_location):
+    import torch
+
+    device = str(map_location or "cpu")
+    try:
+        # safetensors.torch.load_file은 텐서마다 복사본을 만들므로 mmap 위의 NumPy 뷰를 우선 사용
+        arrays = read_safetensors(path)
+    except KeyError:
+        # bf16처럼 NumPy로 표현할 수 없는 dtype이 있으면 safe_open으로 텐서 단위로 로드
+        from safetensors import safe_open
+        with safe_open(str(path), framework="pt", device=device) as f:
+            return {name: f.get_tensor(name) for name in f.keys()}
+    state_dict = {name: torch.from_numpy(array) for name, array in arrays.items()}
+    if device != "cpu":
+        state_dict = {name: tensor.to(device) for name, tensor in state_dict.items()}
+    return state_dict
+
+
+def _state_dict_arrays(state_dict):
+    """Flat {name: ndarray} of a tensor-only state dict (None if it is not one)"""
+    import torch
+
+    if not isinstance(state_dict, dict):
+        return None
+    arrays = {}
+    for name, tensor in state_dict.items():
+        # 중첩 dict나 bf16처럼 NumPy로 표현할 수 없는 항목이 있으면 공유하지 않음
+        if not isinstance(tensor, torch.Tensor) or tensor.dtype == torch.bfloat16:
+            return None
+        arrays[name] = tensor.detach().cpu().contiguous().numpy()
+    return arrays
+
+
+class SharedWeights:
+    """Local registry of checkpoints published once into POSIX shared memory
+
+    항목 하나가 /dev/shm 아래 safetensors 레이아웃 파일 하나 (shm_open 세그먼트와 같은 tmpfs).
+    multiprocessing.shared_memory는 생성한 프로세스가 끝나면 resource tracker가 세그먼트를
+    지우므로, 서로 독립적인 worker끼리 공유하기 위해 파일로 직접 관리함
+    """
+
+    def __init__(self, root=SHARED_WEIGHTS_DIR):
+        self.root = Path(root)
+        self._ranges = []  # attach한 매핑의 (시작 주소, 끝 주소)
+        self._lock = threading.Lock()
+
+    def key(self, path):
+        path = Path(path).resolve()
+        return hashlib.sha1(f"{path}:{path.stat().st_mtime_ns}".encode()).hexdigest()[:20]
+
+    def _segment(self, key):
+        return self.root / f"{key}.safetensors"
+
+    def attach(self, key):
+        """Read-only {name: ndarray} of a published segment, or None"""
+        segment = self._segment(key)
+        if not segment.exists():
+            return None
+        arrays = read_safetensors(segment, access=mmap.ACCESS_READ)
+        with self._lock:
+            for array in arrays.values():
+                start = array.__array_interface__["data"][0]
+                self._ranges.append((start, start + array.nbytes))
+        return arrays
+
+    def get_or_publish(self, path, build):
+        """Attach to the segment of a checkpoint, publishing build() first if nobody has"""
+        key = self.key(path)
+        arrays = self.attach(key)
+        if arrays is not None:
+            return arrays
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / f"{key}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # 잠금을 기다리는 동안 다른 worker가 먼저 게시했을 수 있음
+            arrays = self.attach(key)
+            if arrays is None:
+                data = build()
+                if data is None:
+                    return None
+                write_safetensors(self._segment(key), data, metadata={"source": str(Path(path).resolve())})
+                print(f"Published shared weights: {Path(path).name} -> {self._segment(key)}")
+                arrays = self.attach(key)
+        return arrays
+
+    def owns(self, tensor):
+        """True if a tensor's memory lies inside an attached shared segment"""
+        address = tensor.data_ptr()
+        return any(start <= address < end for start, end in self._ranges)
+
+    def entries(self):
+        """[(segment path, size, source checkpoint)] of published segments"""
+        entries = []
+        for segment in sorted(self.root.glob("*.safetensors")) if self.root.is_dir() else []:
+            with open(segment, "rb") as f:
+                header_size = struct.unpack("<Q", f.read(8))[0]
+                metadata = json.loads(f.read(header_size)).get("__metadata__", {})
+            entries.append((segment, segment.stat().st_size, metadata.get("source")))
+        return entries
+
+    def clear(self):
+        """Unlink all segments (processes already attached keep their mappings)"""
+        removed = 0
+        for segment in list(self.root.glob("*.safetensors")) if self.root.is_dir() else []:
+            segment.unlink()
+            (self.root / f"{segment.stem}.lock").unlink(missing_ok=True)
+            removed += 1
+        return removed
+
+
+SHARED_WEIGHTS = SharedWeights()
+
+
+def shared_weights_enabled():
+    return os.environ.get("OFFLINE_MODEL_SHARED", "0").lower() in ("1", "true", "on")
+
+
+def _shared_load(path):
+    """State dict whose CPU tensors alias a read-only shared segment (None if not shareable)"""
+    import torch
+
+    arrays = SHARED_WEIGHTS.get_or_publish(path, lambda: _state_dict_arrays(_torch_load(path, "cpu")))
+    if arrays is None:
+        return None
+    with warnings.catch_warnings():
+        # 읽기 전용 배열 경고 - 추론에서는 가중치를 in-place로 수정하지 않음
+        warnings.simplefilter("ignore", UserWarning)
+        return {name: torch.from_numpy(array) for name, array in arrays.items()}
+
+
+def _install_shared_load_state_dict():
+    """Make Module.load_state_dict assign (not copy) tensors that live in shared memory"""
+    import torch
+
+    original = torch.nn.Module.load_state_dict
+    if getattr(original, "_offline_shared", False):
+        return
+
+    def load_state_dict(self, state_dict, strict=True, **kwargs):
+        if "assign" not in kwargs and any(
+                isinstance(v, torch.Tensor) and SHARED_WEIGHTS.owns(v) for v in state_dict.values()):
+            try:
+                return original(self, state_dict, strict, assign=True, **kwargs)
+            except TypeError:
+                pass  # torch < 2.1: assign 인자 없음 - 복사로 로드
+        return original(self, state_dict, strict, **kwargs)
+
+    load_state_dict._offline_shared = True
+    torch.nn.Module.load_state_dict = load_state_dict
+
+
+def weights_only_error(path, error):
+    """UnpicklingError explaining that a checkpoint holds objects weights_only=True refuses"""
+    return pickle.UnpicklingError(
+        f"{path}: checkpoint contains objects outside the torch.load(weights_only=True) allowlist "
+        f"(offline loader no longer unpickles arbitrary objects; re-save it as a plain state dict): {error}")
+
+
+def _torch_load(path, map_location):
+    """Load a checkpoint, preferring its converted .safetensors sibling
+
+    .pth는 weights_only=True로만 역직렬화하고, 가능하면 mmap=True로 열어 텐서 저장소가
+    파일 페이지를 그대로 참조하게 함 (필요한 부분만 읽히고 프로세스끼리 page cache 공유)
+    허용 목록 밖의 객체가 든 체크포인트는 파일명과 이유를 담은 UnpicklingError로 실패
+    """
+    flat = converted_path(path)
+    if flat is not None:
+        return _load_safetensors(flat, map_location)
+
+    import torch
+
+    error = None
+    for kwargs in ({"mmap": True, "weights_only": True}, {"weights_only": True}):
+        try:
+            return torch.load(path, map_location=map_location, **kwargs)
+        except TypeError as e:
+            # 구버전 torch: mmap / weights_only 인자 없음
+            error = e
+        except RuntimeError as e:
+            # legacy(비 zipfile) 포맷은 mmap 불가
+            error = e
+        except pickle.UnpicklingError as e:
+            print(f"❌ {path}: rejected by torch.load(weights_only=True)", file=sys.stderr)
+            raise weights_only_error(path, e) from e
+    if isinstance(error, TypeError):
+        return torch.load(path, map_location=map_location)
+    raise error
+
+
+class CheckpointCache:
+    """Bounded LRU of loaded state dicts keyed by (path, mtime_ns, map_location)"""
+
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, path, map_location="cpu"):
+        path = Path(path).resolve()
+        # callable/dict map_location은 키로 비교할 수 없으므로 캐시하지 않음
+        if map_location is not None and not isinstance(map_location, str) \
+                and type(map_location).__name__ != "device":
+            self.misses += 1
+            return _torch_load(path, map_location)
+
+        key = (str(path), path.stat().st_mtime_ns, str(map_location))
+        with self._lock:
+            state_dict = self._entries.get(key)
+            if state_dict is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                # 호출 측이 dict를 수정해도 캐시가 오염되지 않도록 얕은 복사 (텐서는 공유)
+                return copy.copy(state_dict)
+            self.misses += 1
+
+        print(f"Loading pre-downloaded model: {path}")
+        state_dict = None
+        if shared_weights_enabled() and str(map_location) == "cpu":
+            _install_shared_load_state_dict()
+            state_dict = _shared_load(path)
+        if state_dict is None:
+            state_dict = _torch_load(path, map_location)
+        with self._lock:
+            self._entries[key] = state_dict
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return copy.copy(state_dict)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                "max_entries": self.max_entries}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+CHECKPOINT_CACHE = CheckpointCache(
+    int(os.environ.get("OFFLINE_MODEL_CACHE_SIZE", DEFAULT_CACHE_SIZE)))
+
+
+def resolve_checkpoint(url, file_name=None):
+    """Path of a pre-downloaded checkpoint for url (URL first, then file_name)"""
+    registry = get_registry()
+    for key in (url, file_name):
+        path = registry.find(key) if key else None
+        if path is not None:
+            return path
+    raise FileNotFoundError(f"Pre-downloaded model not found: {url.split('/')[-1]}")
+
+
+def load_state_dict_from_url(url, model_dir=None, map_location=None, progress=True,
+                             check_hash=False, file_name=None, **kwargs):
+    """Offline, memoized drop-in for torch.hub.load_state_dict_from_url"""
+    path = resolve_checkpoint(url, file_name)
+    return CHECKPOINT_CACHE.load(path, map_location or "cpu")
+
+
+def cache_stats():
+    """Hit/miss counters of the process-wide checkpoint cache"""
+    return CHECKPOINT_CACHE.stats()
+
+
+def load_netvlad_mat(path, loadmat, *args, **kwargs):
+    """scipy loadmat replacement for hloc NetVLAD that reads the flat-array layout
+
+    convert_weights.py가 만든 .safetensors가 있으면 hloc이 접근하는 구조
+    (mat["net"].layers[i].weights[j], mat["net"].meta.normalization.averageImage)만
+    mmap 배열로 재구성하여 수백 MB .mat 파싱을 건너뜀
+    """
+    flat = converted_path(path)
+    if flat is None:
+        return loadmat(path, *args, **kwargs)
+
+    print(f"Loading NetVLAD flat weights: {flat}")
+    arrays = read_safetensors(flat)
+    layers = {}
+    for name, array in arrays.items():
+        parts = name.split(".")
+        if parts[0] == "layers" and len(parts) == 4:
+            layers.setdefault(int(parts[1]), {})[int(parts[3])] = array
+    num_layers = int(arrays["layers.count"])
+    net = SimpleNamespace(
+        layers=[SimpleNamespace(weights=[layers.get(i, {})[j] for j in sorted(layers.get(i, {}))])
+                for i in range(num_layers)],
+        meta=SimpleNamespace(normalization=SimpleNamespace(
+            averageImage=arrays["meta.normalization.averageImage"])),
+    )
+    return {"net": net}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline model loader shared weights")
+    parser.add_argument("--shared-list", action="store_true", help="list published shared weights")
+    parser.add_argument("--shared-clear", action="store_true", help="unlink all shared weights")
+    args = parser.parse_args()
+
+    if args.shared_clear:
+        print(f"✅ Removed {SHARED_WEIGHTS.clear()} shared weight segments")
+        return True
+    entries = SHARED_WEIGHTS.entries()
+    for segment, size, source in entries:
+        print(f"  ✓ {Path(source or segment).name}: {segment} ({size / 1024**2:.1f} MB)")
+    print(f"{SHARED_WEIGHTS.root}: {len(entries)} segments")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""
+단일 패스 패치 엔진
+각 패치 모듈은 TRANSFORMS 목록(선언적 변환)만 정의하고, 엔진이 대상 파일별로 묶어
+파일마다 한 번 읽고 -> 해당 파일의 모든 변환을 메모리에서 순서대로 적용 -> compile() 한 번 ->
+한 번만 씀 (서로 다른 파일은 스레드 풀에서 병렬 처리)
+
+대상 파일 위치는 importlib.util.find_spec(실패 시 importlib.metadata 파일 목록)으로 찾으므로
+패키지 코드(torch 등)를 실행하지 않음 - package_root / package_file / module_file / site_packages는
+엔진을 쓰지 않는 패치 스크립트와 검증 스크립트도 같이 사용
+
+패치 상태 파일(site-packages/.patch_state/state.json)에 대상별 (inode, size, mtime), 패치 전/후
+sha256, 적용된 변환 버전을 기록 - 재실행 시 바뀐 게 없으면 stat만 하고 끝나므로 컨테이너 시작 시에도
+실행 가능하고, hloc/nerfstudio 업그레이드로 upstream 파일이 바뀐 경우에만 다시 패치함
+"""
+
+import hashlib
+import importlib
+import importlib.util
+import json
+import os
+import re
+import shutil
+import sysconfig
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+APPLIED = "applied"
+ALREADY = "already patched"
+NOT_FOUND = "pattern not found"
+SYNTAX_ERROR = "syntax error (skipped)"
+MISSING = "target not found"
+
+PATCH_STATE_PATH = Path(os.environ.get(
+    "PATCH_STATE_FILE", Path(sysconfig.get_paths()["purelib"]) / ".patch_state" / "state.json"))
+
+
+class Transform:
+    """Declarative edit of files inside an installed package
+
+    package/path로 대상 지정 (path에 glob 패턴 사용 가능), marker가 이미 있으면 건너뜀.
+    replace는 (old, new) 목록, regex는 (pattern, repl[, flags]) 목록, func는 content -> content.
+    required=False면 패턴이 없어도 실패로 보지 않음 (glob 대상은 항상 선택적).
+    변환 내용을 바꾸면 version을 올려야 상태 파일 기준으로 원본부터 다시 적용됨
+    """
+
+    def __init__(self, name, package, path, marker, replace=(), regex=(), func=None,
+                 required=True, exclude=(), backup=False, version=1):
+        self.name = name
+        self.version = version
+        self.package = package
+        self.path = path
+        self.marker = marker
+        self.replace = list(replace)
+        self.regex = list(regex)
+        self.func = func
+        self.required = required and not self.is_glob
+        self.exclude = set(exclude)
+        self.backup = backup
+
+    @property
+    def signature(self):
+        return f"{self.name}@{self.version}"
+
+    @property
+    def is_glob(self):
+        return any(c in self.path for c in "*?[")
+
+    def targets(self, root):
+        if not self.is_glob:
+            target = root / self.path
+            return [target] if target.exists() else []
+        return [p for p in sorted(root.glob(self.path)) if p.name not in self.exclude]
+
+    def apply(self, content):
+        """(new content, status) for one file's content"""
+        if self.marker and self.marker in content:
+            return content, ALREADY
+        patched = content
+        for old, new in self.replace:
+            patched = patched.replace(old, new)
+        for pattern, repl, *flags in self.regex:
+            patched = re.sub(pattern, repl, patched, flags=flags[0] if flags else 0)
+        if self.func is not None:
+            patched = self.func(patched)
+        return patched, (APPLIED if patched != content else NOT_FOUND)
+
+
+_package_roots = {}
+
+
+def _distribution_root(package):
+    """Package directory from installed distribution file lists (importlib.metadata)"""
+    try:
+        from importlib.metadata import distribution, packages_distributions
+        names = packages_distributions().get(package, [])
+    except Exception:
+        return None
+    for name in names:
+        try:
+            files = distribution(name).files or []
+        except Exception:
+            continue
+        for file in files:
+            if file.parts and file.parts[0] == package:
+                return Path(file.locate()).parents[len(file.parts) - 2]
+    return None
+
+
+def package_root(package):
+    """Directory of an installed package without importing it (None if not installed)
+
+    최상위 이름만 find_spec으로 찾음 (점 경로는 부모 패키지 __init__을 실행하므로 사용하지 않음).
+    find_spec이 실패하면 배포판 RECORD 파일 목록(importlib.metadata)으로 찾음
+    """
+    if package not in _package_roots:
+        top, _, rest = package.partition(".")
+        root = None
+        try:
+            spec = importlib.util.find_spec(top)
+        except (ImportError, ValueError):
+            spec = None
+        if spec is not None:
+            if spec.submodule_search_locations:
+                root = Path(list(spec.submodule_search_locations)[0])
+            elif spec.origin:
+                root = Path(spec.origin).parent
+        if root is None:
+            root = _distribution_root(top)
+        if root is not None and rest:
+            root = root.joinpath(*rest.split("."))
+            root = root if root.is_dir() else None
+        _package_roots[package] = root
+    return _package_roots[package]
+
+
+def package_file(package, path):
+    """Path of a file inside an installed package, located without importing it (None if missing)"""
+    root = package_root(package)
+    if root is None or not (root / path).exists():
+        return None
+    return root / path
+
+
+def module_file(module):
+    """Source file of a dotted module name, located without importing it (None if missing)"""
+    top, _, rest = module.partition(".")
+    if not rest:
+        return package_file(top, "__init__.py")
+    relative = Path(*rest.split("."))
+    return package_file(top, relative.with_suffix(".py")) or package_file(top, relative / "__init__.py")
+
+
+def site_packages(package=None):
+    """site-packages directory holding package (or the interpreter's purelib)"""
+    root = package_root(package) if package else None
+    if root is not None:
+        return root.parent
+    return Path(sysconfig.get_paths()["purelib"])
+
+
+def _compiles(content, path):
+    try:
+        compile(content, str(path), "exec")
+        return True
+    except SyntaxError:
+        return False
+
+
+def _write_atomic(path, content):
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _sha256(content):
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def _stamp(path):
+    st = os.stat(path)
+    return [st.st_ino, st.st_size, st.st_mtime_ns]
+
+
+class PatchState:
+    """Per-target record of stat stamp, pre/post-patch sha256 and applied transform versions
+
+    패치 전 원본은 originals/<sha256>에 보관하여 변환 버전이 바뀌면 원본부터 다시 적용
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path or PATCH_STATE_PATH)
+        self.files = {}
+        self._lock = threading.Lock()
+        try:
+            with open(self.path) as f:
+                self.files = json.load(f).get("files", {})
+        except (OSError, ValueError):
+            pass  # 없거나 손상된 상태 파일은 비어 있는 것으로 취급 (마커 검사로 동작)
+
+    def get(self, path):
+        with self._lock:
+            return self.files.get(str(path))
+
+    def set(self, path, entry):
+        with self._lock:
+            self.files[str(path)] = entry
+
+    def _original_path(self, digest):
+        return self.path.parent / "originals" / digest
+
+    def original(self, digest):
+        try:
+            with open(self._original_path(digest)) as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def store_original(self, digest, content):
+        target = self._original_path(digest)
+        if target.exists():
+            return
+        try:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with open(target, "w") as f:
+                f.write(content)
+        except OSError:
+            pass
+
+    def save(self):
+        """Write the state atomically; False on a read-only location"""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            with self._lock, open(tmp_path, "w") as f:
+                json.dump({"version": 1, "files": self.files}, f, indent=1)
+            os.replace(tmp_path, self.path)
+            return True
+        except OSError:
+            return False
+
+
+class PatchEngine:
+    """Collects transforms and applies them file by file in a single pass"""
+
+    def __init__(self, state=None):
+        self.transforms = []  # (patch name, Transform)
+        self.state = state  # PatchState 또는 None (마커 검사만 사용)
+        self.unchanged = 0
+        self.patched_files = []  # 패치가 들어 있는 대상 (바이트코드 사전 컴파일 대상)
+
+    def register(self, patch_name, transforms):
+        self.transforms.extend((patch_name, t) for t in transforms)
+
+    def load(self, module_name, patch_name=None):
+        """Register TRANSFORMS of a patch module, running its prepare() hook first"""
+        module = importlib.import_module(module_name)
+        transforms = getattr(module, "TRANSFORMS", None)
+        if transforms is None:
+            return False
+        if hasattr(module, "prepare") and not module.prepare():
+            print(f"⚠ {patch_name or module_name}: prepare step failed")
+        self.register(patch_name or module_name, transforms)
+        return True
+
+    def plan(self):
+        """({path: [(patch name, transform)]} in registration order, [unresolved])"""
+        files = OrderedDict()
+        missing = []
+        for patch_name, transform in self.transforms:
+            root = package_root(transform.package)
+            targets = transform.targets(root) if root is not None else []
+            if not targets:
+                missing.append((patch_name, transform))
+            for target in targets:
+                files.setdefault(target, []).append((patch_name, transform))
+        return files, missing
+
+    def _recorded(self, entry, transforms):
+        """Statuses recorded for these transforms if the entry already covers all of them"""
+        recorded = entry.get("statuses", {})
+        if all(t.signature in recorded for _, t in transforms):
+            return [[p, t, recorded[t.signature]] for p, t in transforms]
+        return None
+
+    def _apply_file(self, path, transforms):
+        """Read once, apply every transform, compile once, write once
+
+        반환값: (변환별 상태 목록, 메모) - 상태 파일상 바뀐 게 없으면 파일을 읽지도 않음
+        """
+        entry = self.state.get(path) if self.state is not None else None
+        if entry is not None and entry.get("stat") == _stamp(path):
+            statuses = self._recorded(entry, transforms)
+            if statuses is not None:
+                return statuses, "unchanged"
+
+        with open(path, "r") as f:
+            current = f.read()
+        current_sha = _sha256(current)
+
+        base = current
+        pre_sha = None  # 원본(패치 전) 해시 - 이미 기록된 원본이 있으면 덮어쓰지 않음
+        recorded = {}
+        note = None
+        if entry is not None and current_sha == entry.get("post_sha256"):
+            statuses = self._recorded(entry, transforms)
+            if statuses is not None:
+                # 내용은 그대로이고 stat만 바뀜 (touch, 복사 등)
+                entry["stat"] = _stamp(path)
+                self.state.set(path, entry)
+                return statuses, "unchanged"
+            # 새 변환이나 버전이 바뀐 변환: 이전에 적용한 변환을 모두 알고 있으면 원본부터 다시 적용
+            registered = {t.name for _, t in transforms}
+            previous = {sig.rsplit("@", 1)[0] for sig in entry.get("statuses", {})}
+            original = self.state.original(entry.get("pre_sha256", ""))
+            if original is not None and previous <= registered:
+                base, note = original, "re-applied from original (transform versions changed)"
+            else:
+                # 다른 엔진(단독 실행 패치 등)이 일부만 적용: 패치된 내용 위에 덧붙이되 원본 기록은 유지
+                recorded = entry.get("statuses", {})
+                pre_sha = entry.get("pre_sha256")
+        elif entry is not None:
+            note = "upstream file changed, re-patching"
+
+        content = base
+        statuses = []
+        for patch_name, transform in transforms:
+            content, status = transform.apply(content)
+            statuses.append([patch_name, transform, status])
+
+        if content != base and not _compiles(content, path):
+            # 드문 경우에만: 변환마다 compile 하여 구문을 깨는 변환을 빼고 다시 적용
+            content = base
+            for status_entry in statuses:
+                patched, status = status_entry[1].apply(content)
+                if status == APPLIED and not _compiles(patched, path):
+                    status_entry[2] = SYNTAX_ERROR
+                    continue
+                content, status_entry[2] = patched, status
+
+        if content != current:
+            if any(t.backup for _, t, status in statuses if status == APPLIED):
+                backup = path.with_name(path.name + ".backup")
+                if not backup.exists():
+                    shutil.copy(path, backup)
+            _write_atomic(path, content)
+
+        if self.state is not None:
+            base_sha = pre_sha or _sha256(base)
+            if pre_sha is None and content != base:
+                self.state.store_original(base_sha, base)
+            recorded = dict(recorded)
+            recorded.update((t.signature, status) for _, t, status in statuses)
+            self.state.set(path, {"stat": _stamp(path), "pre_sha256": base_sha,
+                                  "post_sha256": _sha256(content), "statuses": recorded})
+        return statuses, note
+
+    def run(self, max_workers=None):
+        """Apply all registered transforms; returns {patch name: success}"""
+        files, missing = self.plan()
+        results = {patch_name: True for patch_name, _ in self.transforms}
+        for patch_name, transform in missing:
+            print(f"  ⚠ {transform.name}: {MISSING} ({transform.package}/{transform.path})")
+            if transform.required:
+                results[patch_name] = False
+
+        paths = list(files)
+        with ThreadPoolExecutor(max_workers=max_workers or min(8, len(paths) or 1)) as pool:
+            outcomes = list(pool.map(lambda p: self._safe_apply(p, files[p]), paths))
+
+        # 병렬 처리 결과는 파일 순서대로 출력
+        self.unchanged = 0
+        self.patched_files = []
+        for path, (outcome, error) in zip(paths, outcomes):
+            if error is not None:
+                print(f"  ❌ {path}: {error}")
+                for patch_name, transform in files[path]:
+                    results[patch_name] = False
+                continue
+            statuses, note = outcome
+            if any(s in (APPLIED, ALREADY) for _, _, s in statuses):
+                self.patched_files.append(path)
+            failed = [(p, t, s) for p, t, s in statuses
+                      if not (s in (APPLIED, ALREADY) or (s == NOT_FOUND and not t.required))]
+            for patch_name, _, _ in failed:
+                results[patch_name] = False
+            if note == "unchanged":
+                # 상태 파일 기준으로 그대로인 파일은 실패한 변환만 출력
+                self.unchanged += 1
+                statuses = failed
+            shown = [(p, t, s) for p, t, s in statuses if not (t.is_glob and s == NOT_FOUND)]
+            if not shown:
+                continue
+            print(f"Patching {path}" + (f" ({note})" if note and note != "unchanged" else ""))
+            for patch_name, transform, status in shown:
+                ok = (patch_name, transform, status) not in failed
+                print(f"  {'✓' if ok else '⚠'} {transform.name}: {status}")
+
+        if self.state is not None:
+            if self.unchanged:
+                print(f"  ✓ {self.unchanged}/{len(paths)} files unchanged since last run ({self.state.path})")
+            if not self.state.save():
+                print(f"  ⚠ Could not write patch state: {self.state.path}")
+        return results
+
+    def _safe_apply(self, path, transforms):
+        try:
+            return self._apply_file(path, transforms), None
+        except Exception as e:
+            return None, e
+
+
+def run_transforms(transforms, patch_name="patch", use_state=True):
+    """Apply one patch module's transforms standalone; True if all required ones succeeded"""
+    engine = PatchEngine(PatchState() if use_state else None)
+    engine.register(patch_name, transforms)
+    return all(engine.run().values())
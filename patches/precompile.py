@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+패치된 모듈 바이트코드 사전 컴파일
+패치가 dist-packages의 .py를 다시 쓰면 새 컨테이너에서 첫 import마다 재컴파일(또는 읽기 전용 FS라
+캐시 실패)하므로, 패치 직후 checked-hash .pyc를 프로세스 풀에서 미리 만들어 둠
+(checked-hash는 mtime 대신 소스 해시로 검증하므로 이미지 레이어/복사 후에도 결과가 결정적)
+
+Usage:
+    python precompile.py [PATH ...] [--package hloc --package nerfstudio ...] [--measure MODULE ...]
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import py_compile
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from patch_engine import package_root
+
+# --all 에서 전체를 미리 컴파일하는 패키지 (CLI 시작 시간에 영향이 큰 것들)
+DEFAULT_PACKAGES = ["hloc", "nerfstudio", "viser"]
+
+
+def is_fresh(path):
+    """True if the cached .pyc is checked-hash and matches the current source"""
+    try:
+        with open(importlib.util.cache_from_source(str(path)), "rb") as f:
+            header = f.read(16)
+        with open(path, "rb") as f:
+            source = f.read()
+    except OSError:
+        return False
+    flags = int.from_bytes(header[4:8], "little")
+    return (len(header) == 16 and header[:4] == importlib.util.MAGIC_NUMBER and flags == 0b11
+            and header[8:16] == importlib.util.source_hash(source))
+
+
+def _compile_one(path):
+    start = time.perf_counter()
+    try:
+        py_compile.compile(str(path), doraise=True,
+                           invalidation_mode=py_compile.PycInvalidationMode.CHECKED_HASH)
+        return str(path), time.perf_counter() - start, None
+    except (py_compile.PyCompileError, OSError) as e:
+        return str(path), 0.0, str(e).strip().splitlines()[-1]
+
+
+def package_sources(packages):
+    """All .py files of installed packages (located without importing them)"""
+    sources = []
+    for package in packages:
+        root = package_root(package)
+        if root is not None:
+            sources.extend(sorted(root.rglob("*.py")))
+    return sources
+
+
+def precompile(paths, max_workers=None, force=False):
+    """Compile stale files in a process pool; returns a summary dict"""
+    paths = list(dict.fromkeys(Path(p) for p in paths))
+    stale = [p for p in paths if force or not is_fresh(p)]
+    compiled = []
+    if stale:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            compiled = list(pool.map(_compile_one, stale, chunksize=16))
+    failed = {path: error for path, _, error in compiled if error is not None}
+    return {
+        "files": len(paths),
+        "compiled": len(compiled) - len(failed),
+        "fresh": len(paths) - len(stale),
+        "failed": failed,
+        # 첫 import가 매번 쓰던 컴파일 시간 = 사전 컴파일로 아끼는 시간
+        "compile_sec": round(sum(seconds for _, seconds, _ in compiled), 4),
+    }
+
+
+def module_name(path):
+    """Dotted module name of a file on sys.path (None if it is not importable)"""
+    path = Path(path).resolve()
+    for entry in sorted((Path(p).resolve() for p in sys.path if p), key=lambda p: -len(p.parts)):
+        try:
+            relative = path.relative_to(entry)
+        except ValueError:
+            continue
+        parts = list(relative.with_suffix("").parts)
+        if parts and parts[-1] == "__init__":
+            parts.pop()
+        return ".".join(parts) if parts else None
+    return None
+
+
+def measure_import(modules, write_bytecode=True):
+    """Seconds to import modules in a fresh interpreter (None if the import fails)"""
+    code = ("import importlib, sys, time\n"
+            "start = time.perf_counter()\n"
+            "for name in sys.argv[1:]:\n"
+            "    importlib.import_module(name)\n"
+            "print(time.perf_counter() - start)\n")
+    env = dict(os.environ)
+    if not write_bytecode:
+        # 측정 자체가 캐시를 만들지 않도록 함
+        env["PYTHONDONTWRITEBYTECODE"] = "1"
+    result = subprocess.run([sys.executable, "-c", code, *modules], capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def precompile_and_report(paths, packages=(), measure=(), max_workers=None, force=False):
+    """Precompile patched files (+ whole packages), printing compile and import-time savings"""
+    print("\n--- Precompiling bytecode (checked-hash) ---")
+    paths = list(paths) + package_sources(packages)
+    before = measure_import(measure, write_bytecode=False) if measure else None
+
+    summary = precompile(paths, max_workers, force)
+    for path, error in summary["failed"].items():
+        print(f"  ⚠ {path}: {error}")
+    print(f"  ✓ {summary['compiled']} compiled, {summary['fresh']} already fresh "
+          f"({summary['compile_sec']:.2f}s of compile time no longer paid on first import)")
+
+    if measure:
+        after = measure_import(measure)
+        summary["import_sec"] = {"modules": list(measure), "before": before, "after": after}
+        if before is not None and after is not None:
+            print(f"  ✓ import {', '.join(measure)}: {before:.2f}s -> {after:.2f}s "
+                  f"(saved {before - after:.2f}s)")
+        else:
+            print(f"  ⚠ Could not import {', '.join(measure)} to measure import time")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompile patched modules to checked-hash .pyc")
+    parser.add_argument("paths", nargs="*", type=Path)
+    parser.add_argument("--package", action="append", default=[], help="precompile a whole package")
+    parser.add_argument("--all", action="store_true", help=f"precompile {', '.join(DEFAULT_PACKAGES)}")
+    parser.add_argument("--measure", nargs="*", default=None, metavar="MODULE",
+                        help="measure import time before/after (default: modules of PATHs)")
+    parser.add_argument("--force", action="store_true", help="recompile fresh files too")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--json", default=None, metavar="PATH", help="write the summary as JSON")
+    args = parser.parse_args()
+
+    packages = args.package + (DEFAULT_PACKAGES if args.all else [])
+    measure = args.measure
+    if measure is not None and not measure:
+        measure = [m for m in (module_name(p) for p in args.paths) if m]
+    summary = precompile_and_report(args.paths, packages, measure or (), args.workers, args.force)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+    return not summary["failed"]
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -7,74 +7,68 @@ C++ 백엔드 문제가 있을 때 COLMAP 바이너리로 완전히 대체
 import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from patch_engine import Transform, run_transforms, site_packages
+
+
+def _wrap_pycolmap_calls(content):
+    """pycolmap import를 try-except로, pycolmap 호출을 _pycolmap_available 조건부로 감쌈"""
+    # import pycolmap 라인을 찾아서 try-except로 감싸기
+    lines = content.split('\n')
+    patched_lines = []
+    
+    for line in lines:
+        if 'import pycolmap' in line and not line.strip().startswith('#'):
+            # pycolmap import를 try-except로 감싸기
+            indent = len(line) - len(line.lstrip())
+            space = ' ' * indent
+            
+            patched_lines.extend([
+                f'{space}# COLMAP_BINARY_FALLBACK_PATCH',
+                f'{space}try:',
+                f'{space}    import pycolmap',
+                f'{space}    _pycolmap_available = True',
+                f'{space}except (ImportError, RuntimeError) as e:',
+                f'{space}    print(f"⚠ pycolmap C++ backend unavailable: {{e}}")',
+                f'{space}    print("Using COLMAP binary fallback mode")',
+                f'{space}    pycolmap = None',
+                f'{space}    _pycolmap_available = False'
+            ])
+        else:
+            patched_lines.append(line)
+    
+    # pycolmap 함수 호출을 조건부로 만들기
+    final_lines = []
+    for line in patched_lines:
+        if 'pycolmap.' in line and '_pycolmap_available' not in line:
+            # pycolmap 함수 호출을 발견하면 조건부로 만들기
+            indent = len(line) - len(line.lstrip())
+            space = ' ' * indent
+            
+            final_lines.extend([
+                f'{space}# COLMAP binary fallback',
+                f'{space}if _pycolmap_available:',
+                f'{space}    {line.strip()}',
+                f'{space}else:',
+                f'{space}    # Use COLMAP binary commands here',
+                f'{space}    raise NotImplementedError("This operation requires COLMAP binary implementation")'
+            ])
+        else:
+            final_lines.append(line)
+    
+    return '\n'.join(final_lines)
+
+
+TRANSFORMS = [
+    Transform("COLMAP binary fallback", "hloc", "reconstruction.py",
+              marker="COLMAP_BINARY_FALLBACK_PATCH", func=_wrap_pycolmap_calls),
+]
+
 
 def patch_hloc_for_binary_colmap():
     """hloc가 COLMAP 바이너리만 사용하도록 패치"""
     try:
-        import hloc.reconstruction as hloc_recon
-        recon_file = Path(hloc_recon.__file__)
-        
-        print(f"Patching hloc for COLMAP binary mode: {recon_file}")
-        
-        # 파일 내용 읽기
-        with open(recon_file, 'r') as f:
-            content = f.read()
-        
-        # 이미 패치되었는지 확인
-        if 'COLMAP_BINARY_FALLBACK_PATCH' in content:
-            print("✓ COLMAP binary fallback patch already applied")
-            return True
-        
-        # import pycolmap 라인을 찾아서 try-except로 감싸기
-        lines = content.split('\n')
-        patched_lines = []
-        
-        for line in lines:
-            if 'import pycolmap' in line and not line.strip().startswith('#'):
-                # pycolmap import를 try-except로 감싸기
-                indent = len(line) - len(line.lstrip())
-                space = ' ' * indent
-                
-                patched_lines.extend([
-                    f'{space}# COLMAP_BINARY_FALLBACK_PATCH',
-                    f'{space}try:',
-                    f'{space}    import pycolmap',
-                    f'{space}    _pycolmap_available = True',
-                    f'{space}except (ImportError, RuntimeError) as e:',
-                    f'{space}    print(f"⚠ pycolmap C++ backend unavailable: {{e}}")',
-                    f'{space}    print("Using COLMAP binary fallback mode")',
-                    f'{space}    pycolmap = None',
-                    f'{space}    _pycolmap_available = False'
-                ])
-            else:
-                patched_lines.append(line)
-        
-        # pycolmap 함수 호출을 조건부로 만들기
-        final_lines = []
-        for line in patched_lines:
-            if 'pycolmap.' in line and '_pycolmap_available' not in line:
-                # pycolmap 함수 호출을 발견하면 조건부로 만들기
-                indent = len(line) - len(line.lstrip())
-                space = ' ' * indent
-                
-                final_lines.extend([
-                    f'{space}# COLMAP binary fallback',
-                    f'{space}if _pycolmap_available:',
-                    f'{space}    {line.strip()}',
-                    f'{space}else:',
-                    f'{space}    # Use COLMAP binary commands here',
-                    f'{space}    raise NotImplementedError("This operation requires COLMAP binary implementation")'
-                ])
-            else:
-                final_lines.append(line)
-        
-        # 파일 저장
-        patched_content = '\n'.join(final_lines)
-        with open(recon_file, 'w') as f:
-            f.write(patched_content)
-        
-        print("✓ COLMAP binary fallback patch applied successfully")
-        return True
+        return run_transforms(TRANSFORMS, "COLMAP binary fallback")
         
     except Exception as e:
         print(f"ERROR: COLMAP binary fallback patch failed: {e}")
@@ -113,7 +107,7 @@ __version__ = "0.0.0-fallback"
             print("✓ pycolmap already available")
         except (ImportError, RuntimeError):
             print("Creating minimal pycolmap compatibility module...")
-            pycolmap_path = Path("/usr/local/lib/python3.10/site-packages/pycolmap")
+            pycolmap_path = site_packages('hloc') / "pycolmap"
             pycolmap_path.mkdir(parents=True, exist_ok=True)
             
             with open(pycolmap_path / "__init__.py", "w") as f:
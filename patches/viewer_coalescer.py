@@ -0,0 +1,291 @@
+"""
+viewer 카메라 업데이트 병합 (런타임 패치, site-packages에 설치됨)
+카메라를 드래그하는 동안 CameraMessage가 렌더링보다 빨리 들어오면 렌더러가 이미 지난 pose를 순서대로
+그리느라 마우스보다 몇 초씩 늦어지므로, 렌더 상태 머신 앞에서 클라이언트별로 가장 최신 카메라 하나만 유지함
+- in-flight 렌더보다 timestamp가 오래된(순서가 뒤바뀐) 메시지는 버림
+- 측정한 렌더 지연(EMA)으로 오래 걸리는 정지 화면 고해상도 렌더는 새 카메라가 오면 중단하고,
+  곧 끝날 렌더는 그대로 두어 다음 렌더가 가능한 빨리 시작되게 함
+
+import_hooks가 nerfstudio.viewer.render_state_machine이 import될 때 patch_render_state_machine을 호출
+VIEWER_COALESCE=0이면 비활성화
+
+Usage (가짜 상태 머신으로 중단 결정 확인):
+    python viewer_coalescer.py
+"""
+
+import os
+import sys
+import threading
+import time
+import weakref
+
+
+LATENCY_ALPHA = 0.3  # 렌더 지연 EMA 가중치
+STALL_FACTOR = 2.0  # EMA의 몇 배를 넘기면 멈춘 렌더로 보고 중단
+MIN_REMAINING_SEC = 0.005  # 예상 남은 시간이 이보다 짧으면 중단하지 않음
+
+
+def coalescing_enabled():
+    return os.environ.get("VIEWER_COALESCE", "1") != "0"
+
+
+class _ClientSlot:
+    def __init__(self):
+        self.pending = None
+        self.pending_ts = None
+        self.pending_moving = False
+        self.latest_ts = None  # 렌더에 들어간 가장 최근 timestamp
+        self.inflight_started = None
+        self.inflight_moving = False
+        self.latency = None
+
+
+class CameraCoalescer:
+    """Latest-camera-per-client slot with stale dropping and render-latency feedback"""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.clients = {}
+        self.counters = {"received": 0, "coalesced": 0, "dropped_stale": 0, "rendered": 0,
+                         "interrupted": 0}
+
+    def _slot(self, client):
+        slot = self.clients.get(client)
+        if slot is None:
+            slot = self.clients[client] = _ClientSlot()
+        return slot
+
+    def offer(self, client, item, timestamp=None, is_moving=False):
+        """Make item the client's pending camera; False if it is older than what is pending/in flight"""
+        timestamp = self.clock() if timestamp is None else timestamp
+        with self.lock:
+            slot = self._slot(client)
+            self.counters["received"] += 1
+            if ((slot.latest_ts is not None and timestamp <= slot.latest_ts)
+                    or (slot.pending_ts is not None and timestamp < slot.pending_ts)):
+                self.counters["dropped_stale"] += 1
+                return False
+            if slot.pending is not None:
+                self.counters["coalesced"] += 1
+            slot.pending, slot.pending_ts, slot.pending_moving = item, timestamp, is_moving
+            return True
+
+    def take(self, client):
+        """Pop the newest pending camera and mark it in flight (None if nothing is pending)"""
+        with self.lock:
+            slot = self._slot(client)
+            item = slot.pending
+            if item is None:
+                return None
+            slot.latest_ts = slot.pending_ts
+            slot.inflight_started = self.clock()
+            slot.inflight_moving = slot.pending_moving
+            slot.pending, slot.pending_ts = None, None
+            return item
+
+    def begin(self, client, is_moving=False):
+        """Mark a render in flight that was not taken from the slot (e.g. a static refinement)"""
+        with self.lock:
+            slot = self._slot(client)
+            if slot.pending is not None:
+                slot.latest_ts = slot.pending_ts
+                is_moving = slot.pending_moving
+                slot.pending, slot.pending_ts = None, None
+            slot.inflight_started = self.clock()
+            slot.inflight_moving = is_moving
+
+    def finish(self, client, completed=True):
+        """Record the in-flight render's latency; returns it in seconds (None if nothing was in flight)
+
+        중단된 렌더(completed=False)는 지연 EMA에 반영하지 않음
+        """
+        with self.lock:
+            slot = self._slot(client)
+            if slot.inflight_started is None:
+                return None
+            latency = self.clock() - slot.inflight_started
+            slot.inflight_started = None
+            if not completed:
+                return None
+            slot.latency = latency if slot.latency is None else (
+                LATENCY_ALPHA * latency + (1 - LATENCY_ALPHA) * slot.latency)
+            self.counters["rendered"] += 1
+            return latency
+
+    def should_interrupt(self, client):
+        """True if the in-flight render should be abandoned for the pending camera
+
+        정지 화면 렌더(고해상도 refine)는 움직이는 카메라가 오면 이미 쓸모없으므로 중단하고,
+        움직이는 렌더는 EMA의 STALL_FACTOR배를 넘겨 멈춘 경우에만 중단 (매번 중단하면 프레임이 안 나옴)
+        """
+        with self.lock:
+            slot = self.clients.get(client)
+            if slot is None or slot.pending is None or slot.inflight_started is None:
+                return False
+            if slot.latency is None:
+                interrupt = not slot.inflight_moving
+            else:
+                elapsed = self.clock() - slot.inflight_started
+                remaining = slot.latency - elapsed
+                stalled = elapsed > STALL_FACTOR * slot.latency
+                interrupt = stalled or (not slot.inflight_moving and remaining > MIN_REMAINING_SEC)
+            if interrupt:
+                self.counters["interrupted"] += 1
+            return interrupt
+
+    def latency(self, client):
+        slot = self.clients.get(client)
+        return None if slot is None else slot.latency
+
+    def forget(self, client):
+        with self.lock:
+            self.clients.pop(client, None)
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats["latency_ms"] = {str(client): round(slot.latency * 1000, 2)
+                                   for client, slot in self.clients.items() if slot.latency is not None}
+        return stats
+
+
+COALESCER = CameraCoalescer()
+
+
+def camera_timestamp(state_machine, camera_state=None):
+    """Client-side timestamp of a camera update (viser camera handle, then CameraMessage field)"""
+    camera = getattr(getattr(state_machine, "client", None), "camera", None)
+    timestamp = getattr(camera, "update_timestamp", None)
+    if timestamp is None:
+        timestamp = getattr(camera_state, "timestamp", None)
+    return timestamp
+
+
+def patch_render_state_machine(module, coalescer=None):
+    """Wrap nerfstudio RenderStateMachine.action / _render_img with the coalescer"""
+    cls = getattr(module, "RenderStateMachine", None)
+    if cls is None or getattr(cls, "_camera_coalescer_patched", False) or not coalescing_enabled():
+        return False
+    coalescer = coalescer or COALESCER
+
+    original_action = cls.action
+    original_render_img = cls._render_img
+
+    def _client(self):
+        # 슬롯은 id(self)로 찾되 상태 머신이 GC되면 지움 (nerfstudio는 연결이 끊기면 상태 머신을 버림)
+        # - 슬롯이 연결마다 쌓이지 않고, 같은 id를 받은 새 상태 머신이 이전 latest_ts/지연을 물려받지 않음
+        client = id(self)
+        if not self.__dict__.get("_camera_coalescer_tracked", False):
+            self._camera_coalescer_tracked = True
+            weakref.finalize(self, coalescer.forget, client)
+        return client
+
+    def action(self, render_action):
+        if render_action.action == "move":
+            client = _client(self)
+            camera_state = getattr(render_action, "camera_state", None)
+            if not coalescer.offer(client, render_action, camera_timestamp(self, camera_state), True):
+                return  # 이미 더 새로운 pose를 렌더 중
+            original_action(self, render_action)
+            # nerfstudio는 "high" 상태면 move마다 interrupt_render_flag를 켜므로 결정을 덮어씀
+            # (곧 끝날 정지 화면 렌더는 끝까지 두고, 멈춘 움직임 렌더는 중단)
+            self.interrupt_render_flag = coalescer.should_interrupt(client)
+            return
+        original_action(self, render_action)
+
+    def _render_img(self, *args, **kwargs):
+        client = _client(self)
+        # 상태 머신은 next_action을 덮어써서 최신 것만 꺼내므로 여기서 in-flight로 표시
+        coalescer.begin(client, getattr(self, "state", None) == "low_move")
+        completed = False
+        try:
+            outputs = original_render_img(self, *args, **kwargs)
+            completed = True
+            return outputs
+        finally:
+            coalescer.finish(client, completed)
+
+    cls.action = action
+    cls._render_img = _render_img
+    cls._camera_coalescer_patched = True
+    return True
+
+
+class _FakeAction:
+    def __init__(self, action):
+        self.action = action
+        self.camera_state = None
+
+
+class _FakeRenderStateMachine:
+    """nerfstudio RenderStateMachine.action의 interrupt 규칙만 흉내 낸 상태 머신"""
+
+    RENDER_SECONDS = {"low_move": 0.05, "high": 1.0}
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.state = "high"
+        self.next_action = None
+        self.interrupt_render_flag = False
+        self.arrivals = []  # 렌더 중 (경과 시간, action)
+
+    def action(self, render_action):
+        self.next_action = render_action
+        if self.state == "high" and render_action.action in ("move", "rerender"):
+            self.interrupt_render_flag = True
+
+    def _render_img(self):
+        start = self.clock.now
+        for elapsed, render_action in self.arrivals:
+            self.clock.now = start + elapsed
+            self.action(render_action)
+        self.arrivals = []
+        self.clock.now = start + self.RENDER_SECONDS[self.state]
+        return "frame"
+
+
+class _ManualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def self_test():
+    """Drive a fake state machine through high -> move with a near-complete and an early render"""
+    clock = _ManualClock()
+    coalescer = CameraCoalescer(clock=clock)
+    module = type(sys)("fake_render_state_machine")
+    module.RenderStateMachine = type("RenderStateMachine", (_FakeRenderStateMachine,), {})
+    if not patch_render_state_machine(module, coalescer):
+        print("⚠ Coalescing disabled (VIEWER_COALESCE=0)")
+        return True
+    machine = module.RenderStateMachine(clock)
+    machine._render_img()  # 정지 화면 렌더 지연 학습
+
+    checks = []
+    for elapsed, expected in ((1.0 - MIN_REMAINING_SEC / 2, False), (0.2, True)):
+        machine.state = "high"
+        machine.interrupt_render_flag = False
+        machine.arrivals = [(elapsed, _FakeAction("move"))]
+        machine._render_img()
+        ok = machine.interrupt_render_flag == expected
+        checks.append(ok)
+        print(f"  {'✓' if ok else '❌'} move {elapsed * 1000:.1f} ms into a 1000 ms high render: "
+              f"interrupt={machine.interrupt_render_flag} (expected {expected})")
+        machine.state = "low_move"  # 들어온 move를 렌더
+        machine._render_img()
+
+    # 연결이 끊겨 상태 머신이 사라지면 슬롯도 사라져야 함
+    client = id(machine)
+    del machine
+    ok = client not in coalescer.clients
+    checks.append(ok)
+    print(f"  {'✓' if ok else '❌'} slot dropped when the state machine is collected")
+    return all(checks)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if self_test() else 1)
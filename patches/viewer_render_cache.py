@@ -0,0 +1,198 @@
+"""
+viewer 렌더 캐시 (런타임 패치, site-packages에 설치됨)
+여러 사람이 같은 장면을 같은 preset 시점에서 보면 동일한 CameraMessage pose마다 전체 렌더가 다시 돌아
+학습과 GPU를 다투므로, 양자화한 카메라 행렬/fov/aspect/해상도/시간(동적 장면) + 체크포인트 step을 키로 하는 LRU 캐시
+- 메모리 예산(VIEWER_RENDER_CACHE_MB, 기본 512, 0이면 비활성화)을 넘으면 오래된 것부터 제거
+- 학습 step이 바뀌거나 GUI 변경으로 rerender가 요청되면 전체 무효화
+- 여러 클라이언트가 동시에 같은 시점을 요청하면 한 번만 렌더하고 나머지는 그 결과를 기다림
+
+import_hooks가 nerfstudio.viewer.render_state_machine이 import될 때 patch_render_state_machine을 호출
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+
+DEFAULT_BUDGET_MB = float(os.environ.get("VIEWER_RENDER_CACHE_MB", "512"))
+POSE_QUANTUM = 1e-3  # 행렬 원소 / fov(rad) / aspect 양자화 단위
+
+
+def _flatten(value):
+    if hasattr(value, "tolist"):
+        value = value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [x for item in value for x in _flatten(item)]
+    return [value]
+
+
+def _quantize(value, quantum):
+    return round(float(value) / quantum)
+
+
+def pose_key(matrix, fov, aspect, width, height, camera_type=None, time=None, quantum=POSE_QUANTUM):
+    """Hashable cache key for a view (poses closer than quantum share a key)
+
+    time은 동적 장면의 CameraState.time (정적 장면은 None)
+    체크포인트 step과 무효화 세대는 RenderCache가 키 앞에 붙임
+    """
+    return (tuple(_quantize(x, quantum) for x in _flatten(matrix)), _quantize(fov, quantum),
+            _quantize(aspect, quantum), int(width), int(height), str(camera_type),
+            None if time is None else _quantize(time, quantum))
+
+
+def output_nbytes(outputs):
+    """Memory held by render outputs (dict/list of tensors or arrays)"""
+    if isinstance(outputs, dict):
+        return sum(output_nbytes(v) for v in outputs.values())
+    if isinstance(outputs, (list, tuple)):
+        return sum(output_nbytes(v) for v in outputs)
+    if hasattr(outputs, "element_size") and hasattr(outputs, "nelement"):
+        return outputs.element_size() * outputs.nelement()
+    return getattr(outputs, "nbytes", 0)
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.outputs = None
+
+
+class RenderCache:
+    """Byte-budgeted LRU of render outputs with single-flight rendering per key"""
+
+    def __init__(self, budget_bytes=int(DEFAULT_BUDGET_MB * 1024**2)):
+        self.budget_bytes = budget_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (outputs, nbytes)
+        self.inflight = {}
+        self.nbytes = 0
+        self.step = None
+        self.generation = 0  # GUI 변경 등으로 올라가면 기존 키는 모두 무효
+        self.counters = {"hits": 0, "misses": 0, "shared": 0, "evictions": 0, "invalidations": 0}
+
+    def _clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+        self.counters["invalidations"] += 1
+
+    def set_step(self, step):
+        """Drop everything when the checkpoint step advances"""
+        with self.lock:
+            if step != self.step:
+                if self.entries:
+                    self._clear()
+                self.step = step
+
+    def invalidate(self):
+        with self.lock:
+            self.generation += 1
+            self._clear()
+
+    def get_or_render(self, key, render):
+        """Cached outputs for key, rendering once even if several callers ask at the same time"""
+        with self.lock:
+            key = (self.generation, self.step) + tuple(key)
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return entry[0]
+            flight = self.inflight.get(key)
+            owner = flight is None
+            if owner:
+                flight = self.inflight[key] = _InFlight()
+                self.counters["misses"] += 1
+
+        if not owner:
+            flight.done.wait()
+            if flight.outputs is not None:
+                with self.lock:
+                    self.counters["shared"] += 1
+                return flight.outputs
+            return render()  # 먼저 시작한 렌더가 중단/실패하면 직접 렌더
+
+        try:
+            flight.outputs = render()
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+                if flight.outputs is not None:
+                    self._store(key, flight.outputs)
+            flight.done.set()
+        return flight.outputs
+
+    def _store(self, key, outputs):
+        nbytes = output_nbytes(outputs)
+        if nbytes > self.budget_bytes or key[0] != self.generation or key[1] != self.step:
+            return  # 예산보다 크거나 렌더 중에 무효화된 결과는 저장하지 않음
+        self.entries[key] = (outputs, nbytes)
+        self.nbytes += nbytes
+        while self.nbytes > self.budget_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.nbytes -= evicted
+            self.counters["evictions"] += 1
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, entries=len(self.entries),
+                        mb=round(self.nbytes / 1024**2, 2), budget_mb=round(self.budget_bytes / 1024**2, 2))
+
+
+RENDER_CACHE = RenderCache()
+
+
+def _camera_key(camera_state, width, height):
+    return pose_key(camera_state.c2w, camera_state.fov, camera_state.aspect, width, height,
+                    camera_type=getattr(camera_state, "camera_type", None),
+                    time=getattr(camera_state, "time", None))
+
+
+def patch_render_state_machine(module):
+    """Serve RenderStateMachine._render_img from the shared cache"""
+    cls = getattr(module, "RenderStateMachine", None)
+    if cls is None or getattr(cls, "_render_cache_patched", False) or RENDER_CACHE.budget_bytes <= 0:
+        return False
+
+    original_action = cls.action
+    original_calculate = cls._calculate_image_res
+    original_render_img = cls._render_img
+
+    def action(self, render_action):
+        # GUI 설정 변경(출력 종류, 배경색, crop 등)은 rerender로 들어오므로 캐시를 비움
+        if render_action.action == "rerender":
+            RENDER_CACHE.invalidate()
+        original_action(self, render_action)
+
+    def _calculate_image_res(self, aspect_ratio):
+        # 캐시 키를 만들 때 이미 계산한 해상도를 렌더에서 그대로 사용 (스케줄러를 두 번 호출하지 않음)
+        resolution = self.__dict__.pop("_render_cache_resolution", None)
+        if resolution is not None:
+            return resolution
+        return original_calculate(self, aspect_ratio)
+
+    def _render_img(self, camera_state, *args, **kwargs):
+        # 적중하면 렌더하지 않으므로 해상도 스케줄러(viewer_resolution)에는 미리 보기로만 물어봄
+        self._resolution_preview = True
+        try:
+            height, width = original_calculate(self, camera_state.aspect)
+            key = _camera_key(camera_state, width, height)
+        except AttributeError:
+            return original_render_img(self, camera_state, *args, **kwargs)
+        finally:
+            self.__dict__.pop("_resolution_preview", None)
+        RENDER_CACHE.set_step(getattr(self.viewer, "step", None))
+
+        def render():
+            self._render_cache_resolution = (height, width)
+            try:
+                return original_render_img(self, camera_state, *args, **kwargs)
+            finally:
+                self.__dict__.pop("_render_cache_resolution", None)
+        return RENDER_CACHE.get_or_render(key, render)
+
+    cls.action = action
+    cls._calculate_image_res = _calculate_image_res
+    cls._render_img = _render_img
+    cls._render_cache_patched = True
+    return True
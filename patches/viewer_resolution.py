@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+viewer 적응형 렌더 해상도 스케줄러 (런타임 패치, site-packages에 설치됨)
+30M Gaussian 장면은 render_width/render_height 그대로면 카메라를 움직일 때 끊기고, 고정된 낮은 해상도는
+흐리므로 프레임별 렌더 시간을 재서 픽셀당 비용(EMA)을 추정하고
+- 움직이는 카메라(is_moving): 목표 프레임 시간에 맞는 해상도 배율로 렌더
+- 멈춘 카메라: 마지막 배율의 REFINE_FACTOR배씩 단계적으로 올려 최대 해상도까지 refine
+결정 내역은 metrics()로 조회 (VIEWER_RESOLUTION_METRICS=파일이면 주기적으로 JSON 기록)
+
+import_hooks가 nerfstudio.viewer.render_state_machine이 import될 때 patch_render_state_machine을 호출
+VIEWER_ADAPTIVE_RES=0이면 비활성화, VIEWER_TARGET_FPS로 목표 프레임 속도 지정 (기본 24)
+
+Usage (CPU stub 렌더러로 시뮬레이션):
+    python viewer_resolution.py [--cost-ms-per-mpix 40] [--overhead-ms 2] [--target-fps 24] [--json PATH]
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+import weakref
+from pathlib import Path
+
+
+DEFAULT_TARGET_FPS = float(os.environ.get("VIEWER_TARGET_FPS", "24"))
+MIN_SCALE = float(os.environ.get("VIEWER_MIN_SCALE", "0.125"))
+REFINE_FACTOR = 2.0  # 멈춘 뒤 refine 단계마다 배율을 몇 배 올릴지
+COST_ALPHA = 0.3  # 픽셀당 비용 EMA 가중치
+METRICS_INTERVAL_SEC = 1.0
+
+
+def adaptive_resolution_enabled():
+    return os.environ.get("VIEWER_ADAPTIVE_RES", "1") != "0"
+
+
+class ResolutionDecision:
+    def __init__(self, width, height, scale, reason):
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.reason = reason  # "moving" | "refine" | "full" | "initial"
+
+    def as_dict(self):
+        return {"width": self.width, "height": self.height, "scale": round(self.scale, 4),
+                "reason": self.reason}
+
+
+class ResolutionScheduler:
+    """Pick per-frame render resolution from measured render time to hit a target frame time"""
+
+    def __init__(self, target_fps=DEFAULT_TARGET_FPS, min_scale=MIN_SCALE, initial_scale=0.25,
+                 metrics_path=None):
+        self.target_sec = 1.0 / target_fps
+        self.min_scale = min_scale
+        self.initial_scale = initial_scale
+        self.metrics_path = Path(metrics_path) if metrics_path else None
+        self.lock = threading.Lock()
+        self.sec_per_pixel = None  # 전 클라이언트 공통 (같은 GPU/모델)
+        self.overhead_sec = 0.0
+        self.clients = {}  # client -> {"scale": 마지막 배율, "decision": 측정 대기 중인 결정}
+        self.counters = {"moving": 0, "refine": 0, "full": 0, "initial": 0,
+                         "frames": 0, "over_target": 0}
+        self.frame_sec_total = 0.0
+        self.last = None
+        self._metrics_written = 0.0
+
+    def _scale_for_target(self, width, height):
+        if self.sec_per_pixel is None:
+            return self.initial_scale
+        budget = max(self.target_sec - self.overhead_sec, 1e-6)
+        pixels = budget / self.sec_per_pixel
+        return math.sqrt(pixels / (width * height))
+
+    def next_resolution(self, client, width, height, is_moving, final=False, commit=True):
+        """Resolution for the client's next frame at full size width x height
+
+        final=True면 refine 단계와 관계없이 최대 해상도 (마지막 정지 화면 렌더)
+        commit=False면 상태/카운터를 바꾸지 않고 결정만 반환 (렌더하게 되면 commit()으로 반영)
+        """
+        with self.lock:
+            state = self.clients.setdefault(client, {"scale": None, "decision": None})
+            if final and not is_moving:
+                scale, reason = 1.0, "full"
+            elif is_moving:
+                scale = self._scale_for_target(width, height)
+                reason = "initial" if self.sec_per_pixel is None else "moving"
+            elif state["scale"] is None or state["scale"] >= 1.0:
+                scale, reason = 1.0, "full"
+            else:
+                # 멈춘 뒤에는 목표 시간과 무관하게 단계적으로 최대 해상도까지 올림
+                scale, reason = state["scale"] * REFINE_FACTOR, "refine"
+            scale = min(1.0, max(self.min_scale, scale))
+            if scale >= 1.0 and reason == "refine":
+                reason = "full"
+            decision = ResolutionDecision(max(1, round(width * scale)), max(1, round(height * scale)),
+                                          scale, reason)
+            if commit:
+                self._commit(state, decision)
+            return decision
+
+    def _commit(self, state, decision):
+        state["scale"] = decision.scale
+        state["decision"] = decision
+        self.counters[decision.reason] += 1
+        self.last = decision
+
+    def commit(self, client, decision):
+        """Apply a decision previewed with commit=False once its frame is actually rendered"""
+        with self.lock:
+            self._commit(self.clients.setdefault(client, {"scale": None, "decision": None}), decision)
+
+    def record(self, client, seconds, width=None, height=None):
+        """Feed back the measured render time of the client's last decision"""
+        with self.lock:
+            state = self.clients.get(client)
+            decision = state["decision"] if state else None
+            if width is None or height is None:
+                if decision is None:
+                    return
+                width, height = decision.width, decision.height
+            per_pixel = max(seconds - self.overhead_sec, 0.0) / (width * height)
+            self.sec_per_pixel = per_pixel if self.sec_per_pixel is None else (
+                COST_ALPHA * per_pixel + (1 - COST_ALPHA) * self.sec_per_pixel)
+            self.counters["frames"] += 1
+            self.frame_sec_total += seconds
+            if decision is not None and decision.reason in ("moving", "initial") and seconds > self.target_sec:
+                self.counters["over_target"] += 1
+        self._maybe_write_metrics()
+
+    def forget(self, client):
+        with self.lock:
+            self.clients.pop(client, None)
+
+    def metrics(self):
+        with self.lock:
+            frames = self.counters["frames"]
+            return {
+                "target_ms": round(self.target_sec * 1000, 2),
+                "decisions": dict(self.counters),
+                "mean_frame_ms": round(self.frame_sec_total / frames * 1000, 2) if frames else None,
+                "ns_per_pixel": round(self.sec_per_pixel * 1e9, 3) if self.sec_per_pixel else None,
+                "last": self.last.as_dict() if self.last else None,
+            }
+
+    def _maybe_write_metrics(self):
+        if self.metrics_path is None or time.monotonic() - self._metrics_written < METRICS_INTERVAL_SEC:
+            return
+        self._metrics_written = time.monotonic()
+        try:
+            tmp_path = self.metrics_path.with_name(self.metrics_path.name + ".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(self.metrics(), f, indent=2)
+            os.replace(tmp_path, self.metrics_path)
+        except OSError:
+            self.metrics_path = None  # 쓸 수 없는 경로면 더 시도하지 않음
+
+
+SCHEDULER = ResolutionScheduler(metrics_path=os.environ.get("VIEWER_RESOLUTION_METRICS"))
+
+
+class StubRenderer:
+    """CPU stand-in for the splat renderer: cost = overhead + cost per megapixel"""
+
+    def __init__(self, cost_ms_per_mpix=40.0, overhead_ms=2.0, busy=False):
+        self.cost_ms_per_mpix = cost_ms_per_mpix
+        self.overhead_ms = overhead_ms
+        self.busy = busy  # True면 sleep 대신 CPU를 실제로 사용
+
+    def cost(self, width, height):
+        return (self.overhead_ms + self.cost_ms_per_mpix * width * height / 1e6) / 1000
+
+    def render(self, width, height):
+        seconds = self.cost(width, height)
+        if self.busy:
+            end = time.perf_counter() + seconds
+            while time.perf_counter() < end:
+                pass
+        else:
+            time.sleep(seconds)
+        return width, height
+
+
+def full_size(max_res, aspect_ratio):
+    """(width, height) whose longer side is max_res"""
+    if aspect_ratio >= 1:
+        return max_res, max(1, round(max_res / aspect_ratio))
+    return max(1, round(max_res * aspect_ratio)), max_res
+
+
+def patch_render_state_machine(module):
+    """Replace nerfstudio RenderStateMachine._calculate_image_res with the scheduler"""
+    cls = getattr(module, "RenderStateMachine", None)
+    if cls is None or getattr(cls, "_adaptive_resolution_patched", False) or not adaptive_resolution_enabled():
+        return False
+
+    original_calculate = cls._calculate_image_res
+    original_render_img = cls._render_img
+
+    def _client(self):
+        # 상태는 id(self)로 찾되 상태 머신이 GC되면 지움 (viewer_coalescer와 같은 방식)
+        # - 같은 id를 받은 새 연결이 이전 클라이언트의 scale에서 refine을 시작하지 않도록
+        client = id(self)
+        if not self.__dict__.get("_adaptive_resolution_tracked", False):
+            self._adaptive_resolution_tracked = True
+            weakref.finalize(self, SCHEDULER.forget, client)
+        return client
+
+    def _calculate_image_res(self, aspect_ratio):
+        try:
+            width, height = full_size(self.viewer.control_panel.max_res, aspect_ratio)
+        except AttributeError:
+            return original_calculate(self, aspect_ratio)
+        # 렌더 캐시가 키를 만들 때는 미리 보기만 하고, 실제로 렌더할 때 _render_img에서 반영
+        # (캐시 적중 시 record 없이 refine 단계/카운터가 진행되지 않도록)
+        preview = self.__dict__.get("_resolution_preview", False)
+        # nerfstudio는 "high" 상태에서 정지 화면을 한 번만 렌더하므로 그때는 항상 최대 해상도
+        decision = SCHEDULER.next_resolution(_client(self), width, height, self.state == "low_move",
+                                             final=self.state == "high", commit=not preview)
+        if preview:
+            self._resolution_pending = decision
+        else:
+            self.__dict__.pop("_resolution_pending", None)
+        return decision.height, decision.width
+
+    def _render_img(self, *args, **kwargs):
+        client = _client(self)
+        pending = self.__dict__.pop("_resolution_pending", None)
+        if pending is not None:
+            SCHEDULER.commit(client, pending)
+        start = time.perf_counter()
+        outputs = original_render_img(self, *args, **kwargs)
+        SCHEDULER.record(client, time.perf_counter() - start)
+        return outputs
+
+    cls._calculate_image_res = _calculate_image_res
+    cls._render_img = _render_img
+    cls._adaptive_resolution_patched = True
+    return True
+
+
+def simulate(renderer, scheduler, width=1920, height=1080, moving_frames=48, static_frames=6):
+    """Drag the camera for moving_frames, then stop; returns per-frame decisions"""
+    frames = []
+    for i in range(moving_frames + static_frames):
+        is_moving = i < moving_frames
+        decision = scheduler.next_resolution("sim", width, height, is_moving)
+        start = time.perf_counter()
+        renderer.render(decision.width, decision.height)
+        seconds = time.perf_counter() - start
+        scheduler.record("sim", seconds)
+        frames.append(dict(decision.as_dict(), moving=is_moving, ms=round(seconds * 1000, 2)))
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the adaptive resolution scheduler on a CPU stub renderer")
+    parser.add_argument("--cost-ms-per-mpix", type=float, default=40.0)
+    parser.add_argument("--overhead-ms", type=float, default=2.0)
+    parser.add_argument("--target-fps", type=float, default=DEFAULT_TARGET_FPS)
+    parser.add_argument("--size", type=int, nargs=2, default=(1920, 1080), metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--moving-frames", type=int, default=48)
+    parser.add_argument("--static-frames", type=int, default=6)
+    parser.add_argument("--busy", action="store_true", help="burn CPU instead of sleeping")
+    parser.add_argument("--json", default=None, metavar="PATH")
+    args = parser.parse_args()
+
+    renderer = StubRenderer(args.cost_ms_per_mpix, args.overhead_ms, args.busy)
+    scheduler = ResolutionScheduler(args.target_fps)
+    frames = simulate(renderer, scheduler, *args.size, args.moving_frames, args.static_frames)
+
+    moving = [f for f in frames if f["moving"]][len(frames) // 8:]  # 초기 수렴 구간 제외
+    hit = sum(f["ms"] <= scheduler.target_sec * 1000 * 1.2 for f in moving)
+    print(f"Target {scheduler.target_sec * 1000:.1f} ms/frame, full-res cost "
+          f"{renderer.cost(*args.size) * 1000:.1f} ms")
+    for f in frames[-(args.static_frames + 3):]:
+        print(f"  {'moving' if f['moving'] else 'static'}: {f['width']}x{f['height']} "
+              f"({f['reason']}, {f['ms']:.1f} ms)")
+    print(f"✓ {hit}/{len(moving)} moving frames within 20% of target")
+
+    report = {"metrics": scheduler.metrics(), "frames": frames}
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    final = frames[-1]
+    return final["width"] == args.size[0] and final["height"] == args.size[1]
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
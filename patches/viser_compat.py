@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+viser 0.2.7 / nerfstudio 메시지 호환 런타임 패치 (site-packages에 설치됨)
+import_hooks가 viser.infra._messages가 import될 때만 호출하므로 viewer를 쓰지 않는 프로세스는 비용이 없음
+"""
+
+
+def register_camera_message_alias(messages):
+    """Register ViewerCameraMessage under the CameraMessage type string nerfstudio sends
+
+    반환값: 레지스트리에 CameraMessage가 있으면 True
+    """
+    if not hasattr(messages, 'ViewerCameraMessage'):
+        return False
+    if not hasattr(messages.Message, '_subclass_from_type_string'):
+        return False
+
+    registry = messages.Message._subclass_from_type_string()
+    if 'ViewerCameraMessage' in registry and 'CameraMessage' not in registry:
+        registry['CameraMessage'] = registry['ViewerCameraMessage']
+    return 'CameraMessage' in registry
@@ -2,18 +2,55 @@
 """
 통합 패치 적용 스크립트
 모든 필요한 패치를 순서대로 적용
+(TRANSFORMS를 정의한 패치는 patch_engine으로 모아서 대상 파일별 단일 패스로 적용)
+패치 상태 파일 덕분에 바뀐 파일이 없으면 stat만 하므로 컨테이너 시작 시 실행해도 가벼움
+
+끝으로 패치된 모듈을 checked-hash .pyc로 병렬 사전 컴파일 (ns-train 등 CLI 시작 시간 단축)
+
+Usage:
+    python apply-patches.py [--force] [--precompile-all] [--measure-imports] [--no-precompile]
+      --force            상태 파일을 무시하고 모든 대상을 다시 검사
+      --precompile-all   hloc / nerfstudio / viser 전체도 사전 컴파일
+      --measure-imports  패치된 모듈의 import 시간을 사전 컴파일 전후로 측정
 """
 
+import argparse
 import sys
 import os
+import time
 from pathlib import Path
 
 # 패치 디렉터리를 Python path에 추가
 patches_dir = Path(__file__).parent.parent / 'patches'
 sys.path.insert(0, str(patches_dir))
 
+from patch_engine import PatchEngine, PatchState
+from precompile import DEFAULT_PACKAGES, module_name, precompile_and_report
+
+
+def _run_legacy_patch(patch_module):
+    """TRANSFORMS가 없는 패치: main() 또는 subprocess로 개별 실행"""
+    # 동적으로 패치 모듈 import
+    patch = __import__(patch_module)
+    
+    # 메인 함수 실행
+    if hasattr(patch, 'main'):
+        return patch.main()
+    
+    # 모듈을 직접 실행
+    import subprocess
+    result = subprocess.run([
+        sys.executable, 
+        str(patches_dir / f"{patch_module}.py")
+    ], capture_output=True, text=True)
+    if result.stdout:
+        print(result.stdout)
+    if result.stderr:
+        print(result.stderr, file=sys.stderr)
+    return result.returncode == 0
+
 
-def apply_all_patches():
+def apply_all_patches(force=False, precompile=True, precompile_all=False, measure_imports=False):
     """모든 패치를 순서대로 적용"""
     print("=== Applying all compatibility patches ===")
     
@@ -30,47 +67,58 @@ def apply_all_patches():
         ("hloc parsers fallback", "hloc_parsers_fallback"),  # 기존 작동하던 핵심 패치  
         ("pycolmap import fallback SAFE", "pycolmap_import_fallback_safe"),  # 안전한 버전 - 중복 패치 방지
         ("hloc reconstruction API fix", "hloc_reconstruction_api_fix"),  # pycolmap 0.6.1 API 호환성
+        ("direct reconstruction fix", "direct_reconstruction_fix"),  # 같은 reconstruction.py - 한 엔진에서 적용
         ("hloc frames.bin safe move", "hloc_frames_bin_fix"),  # frames.bin/rigs.bin 이동 에러 방지
     ]
     
     success_count = 0
     total_count = len(patches)
+    start = time.perf_counter()
     
+    state = PatchState()
+    if force:
+        state.files = {}
+    engine = PatchEngine(state)
+    results = {}
     for patch_name, patch_module in patches:
-        print(f"\n--- Applying {patch_name} patch ---")
         try:
-            # 동적으로 패치 모듈 import
-            patch = __import__(patch_module)
-            
-            # 메인 함수 실행
-            if hasattr(patch, 'main'):
-                success = patch.main()
-            else:
-                # 모듈을 직접 실행
-                import subprocess
-                result = subprocess.run([
-                    sys.executable, 
-                    str(patches_dir / f"{patch_module}.py")
-                ], capture_output=True, text=True)
-                success = result.returncode == 0
-                if result.stdout:
-                    print(result.stdout)
-                if result.stderr:
-                    print(result.stderr, file=sys.stderr)
-            
-            if success:
-                print(f"✅ {patch_name} patch applied successfully")
-                success_count += 1
-            else:
-                print(f"❌ {patch_name} patch failed")
-                
+            if engine.load(patch_module, patch_name):
+                continue
+            # 선언적 변환이 없는 패치는 기존 방식으로 개별 적용
+            print(f"\n--- Applying {patch_name} patch ---")
+            results[patch_name] = _run_legacy_patch(patch_module)
         except Exception as e:
             print(f"ERROR applying {patch_name} patch: {e}")
             import traceback
             traceback.print_exc()
+            results[patch_name] = False
+    
+    # 대상 파일별로 한 번 읽기 -> 모든 변환 적용 -> compile() 한 번 -> 한 번 쓰기 (파일 간 병렬)
+    print(f"\n--- Applying {len(engine.transforms)} transforms in a single pass ---")
+    try:
+        results.update(engine.run())
+    except Exception as e:
+        print(f"ERROR: patch engine failed: {e}")
+        import traceback
+        traceback.print_exc()
+    
+    if precompile and engine.patched_files:
+        try:
+            measure = [m for m in map(module_name, engine.patched_files) if m] if measure_imports else ()
+            precompile_and_report(engine.patched_files, DEFAULT_PACKAGES if precompile_all else (), measure)
+        except Exception as e:
+            # 사전 컴파일 실패는 첫 import 때 컴파일되므로 치명적이지 않음
+            print(f"⚠ Bytecode precompilation failed: {e}")
+    
+    for patch_name, _ in patches:
+        if results.get(patch_name):
+            print(f"✅ {patch_name} patch applied successfully")
+            success_count += 1
+        else:
+            print(f"❌ {patch_name} patch failed")
     
     print(f"\n=== Patch Summary ===")
-    print(f"Successfully applied: {success_count}/{total_count} patches")
+    print(f"Successfully applied: {success_count}/{total_count} patches ({time.perf_counter() - start:.2f}s)")
     
     if success_count == total_count:
         print("✅ All patches applied successfully!")
@@ -86,5 +134,13 @@ def apply_all_patches():
 
 
 if __name__ == "__main__":
-    success = apply_all_patches()
+    parser = argparse.ArgumentParser(description="Apply all compatibility patches")
+    parser.add_argument("--force", action="store_true", help="ignore the patch state file")
+    parser.add_argument("--no-precompile", action="store_true", help="skip bytecode precompilation")
+    parser.add_argument("--precompile-all", action="store_true",
+                        help=f"also precompile all of {', '.join(DEFAULT_PACKAGES)}")
+    parser.add_argument("--measure-imports", action="store_true",
+                        help="measure import time of patched modules before/after precompiling")
+    args = parser.parse_args()
+    success = apply_all_patches(args.force, not args.no_precompile, args.precompile_all, args.measure_imports)
     sys.exit(0 if success else 1)
\ No newline at end of file
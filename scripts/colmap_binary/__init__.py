@@ -0,0 +1,46 @@
+"""
+COLMAP binary mode 도구 모음
+pycolmap C++ 백엔드 없이 COLMAP 바이너리로 동작하는 pycolmap stub의 보조 모듈
+(scripts/setup-colmap-binary-mode.py가 stub과 같은 site-packages에 설치)
+
+하위 모듈(numpy, sqlite3 등)은 이름을 처음 사용할 때 import하므로
+pycolmap stub을 import하는 것만으로는 아무 것도 로드하지 않음
+"""
+
+import importlib
+
+# 공개 이름 -> 정의된 하위 모듈
+_EXPORTS = {
+    "merge_models": "chunked",
+    "run_chunked_reconstruction": "chunked",
+    "COLMAPDatabaseReader": "database",
+    "image_ids_to_pair_id": "database",
+    "pair_id_to_image_ids": "database",
+    "cached_extract": "feature_cache",
+    "FeatureCache": "feature_cache",
+    "import_matches": "match_import",
+    "ModelReader": "model_reader",
+    "read_model": "model_reader",
+    "write_model": "model_writer",
+    "ColmapProgress": "runner",
+    "ProgressPrinter": "runner",
+    "parse_progress_line": "runner",
+    "run_colmap_streaming": "runner",
+    "merge_databases": "sharding",
+    "run_sharded_extraction": "sharding",
+}
+
+__all__ = sorted(_EXPORTS, key=str.lower)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value  # 다음 접근부터는 일반 속성
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,473 @@
+"""
+Chunked parallel reconstruction for long sequential captures
+긴 동영상 프레임 시퀀스를 겹치는 구간(chunk)으로 나누어 mapper를 병렬 실행하고,
+공유 이미지의 대응점으로 NumPy Sim(3)를 추정해 부분 모델을 하나로 정렬/병합한 뒤
+전체 bundle adjustment를 한 번 수행 (단일 incremental mapper의 직렬 실행 대체)
+
+Usage:
+    python -m colmap_binary.chunked --database_path DB --image_path IMAGES --output_path OUT \\
+        [--chunk_size 250] [--overlap 50] [--num_workers N]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from .database import COLMAPDatabaseReader
+from .model_reader import CameraArrays, ImageArrays, ModelReader, Point3DArrays
+from .model_writer import write_model
+from .runner import run_colmap_streaming
+from .sharding import write_image_list
+
+
+DEFAULT_CHUNK_SIZE = 250
+DEFAULT_OVERLAP = 50
+RANSAC_HYPOTHESES = 512
+RANSAC_MAX_SCORING_POINTS = 5000
+# inlier 임계값 = 이 비율 x 대응점 분포의 중앙 반경 (부분 모델마다 스케일이 다르므로 상대값)
+RANSAC_THRESHOLD_RATIO = 0.02
+MIN_CORRESPONDENCES = 10
+# 병합 모델이 chunk들에 등록된 이미지의 이 비율보다 적으면 실패 (정렬 실패로 chunk가 빠진 경우)
+DEFAULT_MIN_COVERAGE = 0.9
+
+
+def split_chunks(image_names, chunk_size, overlap):
+    """Split a sequence into chunks of chunk_size that share overlap images"""
+    if chunk_size <= overlap:
+        raise ValueError(f"chunk_size ({chunk_size}) must be larger than overlap ({overlap})")
+    n = len(image_names)
+    if n <= chunk_size:
+        return [list(image_names)]
+    step = chunk_size - overlap
+    starts = list(range(0, n - overlap, step))
+    # 마지막 chunk가 너무 짧으면 앞 chunk에 흡수
+    if len(starts) > 1 and n - starts[-1] < overlap * 2:
+        starts.pop()
+    return [list(image_names[start:(starts[i + 1] + overlap if i + 1 < len(starts) else n)])
+            for i, start in enumerate(starts)]
+
+
+def qvec_to_rotmat(qvecs):
+    """(..., 4) w,x,y,z quaternions to (..., 3, 3) rotation matrices"""
+    w, x, y, z = np.moveaxis(np.asarray(qvecs, dtype=np.float64), -1, 0)
+    return np.stack([
+        np.stack([1 - 2 * y * y - 2 * z * z, 2 * x * y - 2 * w * z, 2 * z * x + 2 * w * y], -1),
+        np.stack([2 * x * y + 2 * w * z, 1 - 2 * x * x - 2 * z * z, 2 * y * z - 2 * w * x], -1),
+        np.stack([2 * z * x - 2 * w * y, 2 * y * z + 2 * w * x, 1 - 2 * x * x - 2 * y * y], -1),
+    ], -2)
+
+
+def rotmat_to_qvec(R):
+    """Single rotation matrix to a w,x,y,z quaternion (w >= 0)"""
+    K = np.array([
+        [R[0, 0] - R[1, 1] - R[2, 2], 0, 0, 0],
+        [R[1, 0] + R[0, 1], R[1, 1] - R[0, 0] - R[2, 2], 0, 0],
+        [R[2, 0] + R[0, 2], R[2, 1] + R[1, 2], R[2, 2] - R[0, 0] - R[1, 1], 0],
+        [R[2, 1] - R[1, 2], R[0, 2] - R[2, 0], R[1, 0] - R[0, 1], R[0, 0] + R[1, 1] + R[2, 2]],
+    ]) / 3.0
+    eigvals, eigvecs = np.linalg.eigh(K)
+    qvec = eigvecs[[3, 0, 1, 2], np.argmax(eigvals)]
+    return -qvec if qvec[0] < 0 else qvec
+
+
+def qvec_multiply(a, b):
+    """Hamilton product of (..., 4) quaternions, R(a * b) = R(a) @ R(b)"""
+    aw, ax, ay, az = np.moveaxis(a, -1, 0)
+    bw, bx, by, bz = np.moveaxis(b, -1, 0)
+    return np.stack([
+        aw * bw - ax * bx - ay * by - az * bz,
+        aw * bx + ax * bw + ay * bz - az * by,
+        aw * by - ax * bz + ay * bw + az * bx,
+        aw * bz + ax * by - ay * bx + az * bw,
+    ], -1)
+
+
+def camera_centers(qvecs, tvecs):
+    """World-frame camera centers C = -R^T t for all images at once"""
+    R = qvec_to_rotmat(qvecs)
+    return -np.einsum("nji,nj->ni", R, tvecs)
+
+
+def estimate_sim3(src, dst):
+    """Umeyama similarity dst ~ s * R @ src + t, batched over leading dimensions
+
+    src, dst: (..., n, 3). Returns s (...), R (..., 3, 3), t (..., 3).
+    """
+    mu_src = src.mean(-2)
+    mu_dst = dst.mean(-2)
+    xs = src - mu_src[..., None, :]
+    xd = dst - mu_dst[..., None, :]
+    n = src.shape[-2]
+    cov = np.einsum("...ni,...nj->...ij", xd, xs) / n
+    U, S, Vt = np.linalg.svd(cov)
+    d = np.sign(np.linalg.det(U) * np.linalg.det(Vt))
+    d = np.where(d == 0, 1.0, d)
+    D = np.ones(S.shape)
+    D[..., 2] = d
+    R = np.einsum("...ij,...j,...jk->...ik", U, D, Vt)
+    var_src = (xs ** 2).sum((-1, -2)) / n
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s = (S * D).sum(-1) / var_src
+    t = mu_dst - s[..., None] * np.einsum("...ij,...j->...i", R, mu_src)
+    return s, R, t
+
+
+def apply_sim3(s, R, t, points):
+    return s * points @ R.T + t
+
+
+def estimate_sim3_ransac(src, dst, num_hypotheses=RANSAC_HYPOTHESES,
+                         threshold_ratio=RANSAC_THRESHOLD_RATIO, seed=0):
+    """Robust Sim(3): all minimal-sample hypotheses are solved and scored in one batch
+
+    Returns (s, R, t, inlier_mask).
+    """
+    rng = np.random.default_rng(seed)
+    n = len(src)
+    radius = np.median(np.linalg.norm(dst - np.median(dst, 0), axis=1))
+    threshold = threshold_ratio * max(radius, 1e-12)
+
+    samples = rng.integers(0, n, size=(num_hypotheses, 3))
+    s, R, t = estimate_sim3(src[samples], dst[samples])
+    valid = np.isfinite(s) & (s > 0)
+
+    scoring = rng.choice(n, size=min(n, RANSAC_MAX_SCORING_POINTS), replace=False)
+    predicted = (s[:, None, None] * np.einsum("bij,nj->bni", R, src[scoring])) + t[:, None, :]
+    errors = np.linalg.norm(predicted - dst[scoring][None], axis=-1)
+    scores = np.where(valid, (errors < threshold).sum(-1), -1)
+    best = int(np.argmax(scores))
+
+    inliers = np.linalg.norm(apply_sim3(s[best], R[best], t[best], src) - dst, axis=1) < threshold
+    if inliers.sum() >= 3:
+        s_ref, R_ref, t_ref = estimate_sim3(src[inliers], dst[inliers])
+        if np.isfinite(s_ref) and s_ref > 0:
+            return s_ref, R_ref, t_ref, inliers
+    return s[best], R[best], t[best], inliers
+
+
+class _Model:
+    """Mutable array view of one (sub)model used while merging"""
+
+    def __init__(self, cameras, images, points3D):
+        self.cameras = cameras
+        self.images = images
+        self.points3D = points3D
+
+    @classmethod
+    def read(cls, path):
+        reader = ModelReader(path)
+        return cls(reader.cameras, reader.images, reader.points3D)
+
+    def point_rows(self, point_ids):
+        order = np.argsort(self.points3D.ids)
+        return order[np.searchsorted(self.points3D.ids, point_ids, sorter=order)]
+
+
+def _shared_correspondences(ref, model, shared_ids):
+    """3D point and camera center correspondences through shared images"""
+    ref_points, model_points = [], []
+    for image_id in shared_ids:
+        _, ref_p3d = ref.images.points2D(ref.images.index_of(image_id))
+        _, model_p3d = model.images.points2D(model.images.index_of(image_id))
+        both = (ref_p3d >= 0) & (model_p3d >= 0)
+        ref_points.append(ref_p3d[both])
+        model_points.append(model_p3d[both])
+    ref_point_ids = np.concatenate(ref_points) if ref_points else np.empty(0, np.int64)
+    model_point_ids = np.concatenate(model_points) if model_points else np.empty(0, np.int64)
+
+    ref_rows = [ref.images.index_of(i) for i in shared_ids]
+    model_rows = [model.images.index_of(i) for i in shared_ids]
+    ref_centers = camera_centers(ref.images.qvecs[ref_rows], ref.images.tvecs[ref_rows])
+    model_centers = camera_centers(model.images.qvecs[model_rows], model.images.tvecs[model_rows])
+
+    src = np.concatenate([model.points3D.xyz[model.point_rows(model_point_ids)], model_centers])
+    dst = np.concatenate([ref.points3D.xyz[ref.point_rows(ref_point_ids)], ref_centers])
+    return src, dst, ref_point_ids, model_point_ids
+
+
+def _transform_images(images, s, R, t):
+    """Apply world' = s R world + t to camera poses (R' = R_i R^T, t' = s t_i - R' t)"""
+    q_conj = rotmat_to_qvec(R) * np.array([1.0, -1.0, -1.0, -1.0])
+    qvecs = qvec_multiply(images.qvecs, q_conj[None])
+    qvecs /= np.linalg.norm(qvecs, axis=1, keepdims=True)
+    qvecs *= np.where(qvecs[:, :1] < 0, -1.0, 1.0)
+    tvecs = s * images.tvecs - np.einsum("nij,j->ni", qvec_to_rotmat(qvecs), t)
+    return qvecs, tvecs
+
+
+def _concat_offsets(*offsets):
+    """Concatenate CSR offset arrays of consecutive blocks"""
+    parts = [np.zeros(1, np.int64)]
+    shift = 0
+    for part in offsets:
+        parts.append(np.asarray(part[1:], np.int64) + shift)
+        shift += int(part[-1])
+    return np.concatenate(parts)
+
+
+def merge_models(ref, model):
+    """Align model onto ref and merge them; returns (merged, num_inliers) or (None, 0)"""
+    shared_ids = np.intersect1d(ref.images.ids, model.images.ids)
+    if len(shared_ids) == 0:
+        return None, 0
+    src, dst, ref_point_ids, model_point_ids = _shared_correspondences(ref, model, shared_ids)
+    if len(src) < MIN_CORRESPONDENCES:
+        return None, 0
+    s, R, t, inliers = estimate_sim3_ransac(src, dst)
+    num_inliers = int(inliers.sum())
+    if num_inliers < MIN_CORRESPONDENCES:
+        return None, num_inliers
+
+    # --- 3D points: 공유 관측으로 대응된 점은 ref의 점 id로 합치고 나머지는 새 id 부여 ---
+    num_points = len(ref_point_ids)
+    point_inliers = inliers[:num_points]
+    new_ids = np.full(len(model.points3D), -1, dtype=np.int64)
+    model_rows = model.point_rows(model_point_ids[point_inliers])
+    new_ids[model_rows] = ref_point_ids[point_inliers]  # 중복 대응은 마지막 값 유지
+    unmatched = new_ids < 0
+    next_id = int(ref.points3D.ids.max()) + 1 if len(ref.points3D) else 1
+    new_ids[unmatched] = next_id + np.arange(int(unmatched.sum()))
+
+    # 공유 이미지의 관측은 ref 것을 유지하고, model 쪽 관측은 공유되지 않은 이미지 것만 추가
+    model_lengths = model.points3D.track_lengths
+    elem_point_ids = np.repeat(new_ids, model_lengths)
+    keep = ~np.isin(model.points3D.track_image_ids, shared_ids)
+
+    ref_lengths = ref.points3D.track_lengths
+    all_point_ids = np.concatenate([np.repeat(ref.points3D.ids, ref_lengths), elem_point_ids[keep]])
+    all_image_ids = np.concatenate([ref.points3D.track_image_ids,
+                                    model.points3D.track_image_ids[keep]])
+    all_point2D_idxs = np.concatenate([ref.points3D.track_point2D_idxs,
+                                       model.points3D.track_point2D_idxs[keep]])
+
+    new_xyz = apply_sim3(s, R, t, model.points3D.xyz[unmatched])
+    point_ids = np.concatenate([ref.points3D.ids, new_ids[unmatched]])
+    xyz = np.concatenate([ref.points3D.xyz, new_xyz])
+    rgb = np.concatenate([ref.points3D.rgb, model.points3D.rgb[unmatched]])
+    errors = np.concatenate([ref.points3D.errors, model.points3D.errors[unmatched]])
+
+    # track을 점 id 순으로 정렬해 CSR 재구성, 관측이 2개 미만인 점은 제거
+    order = np.argsort(point_ids, kind="stable")
+    point_ids, xyz, rgb, errors = point_ids[order], xyz[order], rgb[order], errors[order]
+    elem_order = np.argsort(all_point_ids, kind="stable")
+    all_point_ids = all_point_ids[elem_order]
+    all_image_ids = all_image_ids[elem_order]
+    all_point2D_idxs = all_point2D_idxs[elem_order]
+    lengths = np.bincount(np.searchsorted(point_ids, all_point_ids), minlength=len(point_ids))
+    valid = lengths >= 2
+    elem_valid = np.repeat(valid, lengths)
+    point_ids, xyz, rgb, errors = point_ids[valid], xyz[valid], rgb[valid], errors[valid]
+    all_point_ids = all_point_ids[elem_valid]
+    all_image_ids = all_image_ids[elem_valid]
+    all_point2D_idxs = all_point2D_idxs[elem_valid]
+    track_offsets = np.concatenate([[0], np.cumsum(lengths[valid])]).astype(np.int64)
+    points3D = Point3DArrays(point_ids, xyz, rgb, errors, all_image_ids, all_point2D_idxs,
+                             track_offsets)
+
+    # --- images: ref 이미지 + 정렬된 model의 새 이미지 ---
+    new_rows = np.flatnonzero(~np.isin(model.images.ids, shared_ids))
+    qvecs, tvecs = _transform_images(model.images, s, R, t)
+    model_offsets = np.asarray(model.images.point2D_offsets, np.int64)
+    starts, ends = model_offsets[new_rows], model_offsets[new_rows + 1]
+    new_point_idx = np.concatenate([np.arange(a, b) for a, b in zip(starts, ends)]) \
+        if len(new_rows) else np.empty(0, np.int64)
+    new_offsets = np.concatenate([[0], np.cumsum(ends - starts)])
+
+    image_ids = np.concatenate([ref.images.ids, model.images.ids[new_rows]])
+    point2D_offsets = _concat_offsets(ref.images.point2D_offsets, new_offsets)
+    xys = np.concatenate([ref.images.xys, model.images.xys[new_point_idx]])
+
+    # 병합된 track으로부터 point3D_ids를 다시 계산 (2D 관측 하나는 점 하나에만 속함)
+    point3D_ids = np.full(len(xys), -1, dtype=np.int64)
+    image_order = np.argsort(image_ids)
+    image_rows = image_order[np.searchsorted(image_ids, all_image_ids, sorter=image_order)]
+    point3D_ids[point2D_offsets[image_rows] + all_point2D_idxs] = all_point_ids
+
+    images = ImageArrays(
+        image_ids,
+        np.concatenate([ref.images.qvecs, qvecs[new_rows]]),
+        np.concatenate([ref.images.tvecs, tvecs[new_rows]]),
+        np.concatenate([ref.images.camera_ids, model.images.camera_ids[new_rows]]),
+        list(ref.images.names) + [model.images.names[i] for i in new_rows],
+        xys, point3D_ids, point2D_offsets,
+    )
+
+    # --- cameras: ref 내부 파라미터 우선 (마지막 BA에서 함께 정제) ---
+    new_cams = np.flatnonzero(~np.isin(model.cameras.ids, ref.cameras.ids))
+    cam_offsets = np.asarray(model.cameras.params_offsets, np.int64)
+    cam_param_idx = np.concatenate(
+        [np.arange(cam_offsets[i], cam_offsets[i + 1]) for i in new_cams]) \
+        if len(new_cams) else np.empty(0, np.int64)
+    cameras = CameraArrays(
+        np.concatenate([ref.cameras.ids, model.cameras.ids[new_cams]]),
+        np.concatenate([ref.cameras.model_ids, model.cameras.model_ids[new_cams]]),
+        np.concatenate([ref.cameras.widths, model.cameras.widths[new_cams]]),
+        np.concatenate([ref.cameras.heights, model.cameras.heights[new_cams]]),
+        np.concatenate([ref.cameras.params, model.cameras.params[cam_param_idx]]),
+        _concat_offsets(ref.cameras.params_offsets,
+                        np.concatenate([[0], np.cumsum(np.diff(cam_offsets)[new_cams])])),
+    )
+    return _Model(cameras, images, points3D), num_inliers
+
+
+def merge_chunk_models(chunk_models):
+    """Merge [(chunk index, _Model)] into connected components, largest first
+
+    chunk는 바로 앞 chunk와만 겹치므로, 정렬에 실패한 모델은 버리지 않고 별도 component로 두었다가
+    병합이 성공할 때마다 남은 component들과 다시 시도 (chunk k가 실패해도 k+1, k+2...는 서로 합쳐짐)
+    반환값: [(_Model, [chunk indices])]
+    """
+    components = []
+    for index, model in chunk_models:
+        current = (model, [index])
+        merged = True
+        while merged:
+            merged = False
+            for i, (component, indices) in enumerate(components):
+                result, num_inliers = merge_models(component, current[0])
+                if result is None:
+                    continue
+                current = (result, sorted(indices + current[1]))
+                del components[i]
+                merged = True
+                print(f"✓ chunks {current[1]}: merged ({num_inliers} inlier correspondences, "
+                      f"{len(result.images)} images total)")
+                break
+        components.append(current)
+    return sorted(components, key=lambda c: len(c[0].images), reverse=True)
+
+
+def _largest_model(models_dir):
+    """Subdirectory of a mapper output with the most registered images"""
+    best, best_count = None, 0
+    for path in sorted(Path(models_dir).iterdir()) if Path(models_dir).exists() else []:
+        if not (path / "images.bin").exists():
+            continue
+        count = len(ModelReader(path).images)
+        if count > best_count:
+            best, best_count = path, count
+    return best
+
+
+def make_run_command(colmap_exe=None):
+    """run_command(cmd, log_path=..., progress_callback=...) for a COLMAP executable"""
+    colmap_exe = colmap_exe or os.environ.get("COLMAP_EXE_PATH", "/usr/local/bin/colmap")
+
+    def run_command(cmd, log_path=None, progress_callback=None):
+        return run_colmap_streaming([colmap_exe] + list(cmd), log_path=log_path,
+                                    progress_callback=progress_callback)
+    return run_command
+
+
+def run_chunked_reconstruction(run_command, database_path, image_path, output_path,
+                               chunk_size=DEFAULT_CHUNK_SIZE, overlap=DEFAULT_OVERLAP,
+                               num_workers=None, mapper_args=(), bundle_adjust=True,
+                               min_coverage=DEFAULT_MIN_COVERAGE):
+    """Reconstruct overlapping chunks in parallel, merge them with Sim(3) and run a global BA
+
+    Final model is written to <output_path>/0 (same layout as mapper output).
+    Raises RuntimeError if the merged model holds fewer than min_coverage of the
+    images registered by any chunk (chunks that could not be aligned are dropped).
+    """
+    output_path = Path(output_path)
+    work_dir = output_path / "chunks"
+    if work_dir.exists():
+        shutil.rmtree(work_dir)
+    (work_dir / "logs").mkdir(parents=True)
+
+    with COLMAPDatabaseReader(database_path) as db:
+        image_names = sorted(db.images())
+    chunks = split_chunks(image_names, chunk_size, overlap)
+    num_workers = num_workers or min(len(chunks), os.cpu_count() or 1)
+    num_threads = max(1, (os.cpu_count() or 1) // num_workers)
+    print(f"Chunked reconstruction: {len(image_names)} images in {len(chunks)} chunks "
+          f"(overlap {overlap}) x {num_workers} workers x {num_threads} threads")
+
+    def _reconstruct(index, names):
+        chunk_dir = work_dir / f"chunk_{index:03d}"
+        chunk_dir.mkdir()
+        list_file = write_image_list(work_dir / f"chunk_{index:03d}.txt", names)
+        cmd = [
+            "mapper",
+            "--database_path", str(database_path),
+            "--image_path", str(image_path),
+            "--output_path", str(chunk_dir),
+            "--image_list_path", str(list_file),
+            "--Mapper.num_threads", str(num_threads),
+            "--Mapper.multiple_models", "0",
+        ] + list(mapper_args)
+        run_command(cmd, log_path=work_dir / "logs" / f"mapper.chunk_{index:03d}.log")
+        return _largest_model(chunk_dir)
+
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        chunk_models = list(pool.map(_reconstruct, range(len(chunks)), chunks))
+
+    models = []
+    for index, model_path in enumerate(chunk_models):
+        if model_path is None:
+            print(f"⚠ chunk {index}: no model reconstructed, skipping")
+            continue
+        models.append((index, _Model.read(model_path)))
+    if not models:
+        raise RuntimeError("Chunked reconstruction failed: no chunk produced a model")
+    registered = np.unique(np.concatenate([model.images.ids for _, model in models]))
+
+    components = merge_chunk_models(models)
+    merged, merged_chunks = components[0]
+    coverage = len(merged.images) / len(registered)
+    if len(components) > 1 or len(merged_chunks) < len(chunks):
+        dropped = sorted(set(range(len(chunks))) - set(merged_chunks))
+        print(f"⚠⚠ chunks {dropped} could not be aligned with the merged model and were DROPPED: "
+              f"{len(merged.images)}/{len(registered)} registered images kept ({coverage * 100:.1f}%)")
+    if coverage < min_coverage:
+        raise RuntimeError(
+            f"Chunked reconstruction covers only {coverage * 100:.1f}% of the registered images "
+            f"(minimum {min_coverage * 100:.0f}%); increase --overlap or reconstruct without chunking")
+
+    merged_dir = work_dir / "merged"
+    write_model(merged_dir, merged.cameras, merged.images, merged.points3D)
+    final_dir = output_path / "0"
+    if final_dir.exists():
+        shutil.rmtree(final_dir)
+    if bundle_adjust:
+        final_dir.mkdir(parents=True)
+        run_command([
+            "bundle_adjuster",
+            "--input_path", str(merged_dir),
+            "--output_path", str(final_dir),
+        ], log_path=work_dir / "logs" / "bundle_adjuster.log")
+    else:
+        shutil.copytree(merged_dir, final_dir)
+    print(f"✅ Merged model: {len(merged.images)}/{len(image_names)} images, "
+          f"{len(merged.points3D)} points -> {final_dir}")
+    return final_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunked parallel COLMAP reconstruction")
+    parser.add_argument("--database_path", type=Path, required=True)
+    parser.add_argument("--image_path", type=Path, required=True)
+    parser.add_argument("--output_path", type=Path, required=True)
+    parser.add_argument("--chunk_size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--overlap", type=int, default=DEFAULT_OVERLAP)
+    parser.add_argument("--num_workers", type=int, default=None)
+    parser.add_argument("--skip_ba", action="store_true", help="skip the final global BA")
+    parser.add_argument("--min_coverage", type=float, default=DEFAULT_MIN_COVERAGE,
+                        help="fail if the merged model keeps less than this fraction of registered images")
+    args = parser.parse_args()
+
+    run_chunked_reconstruction(
+        make_run_command(), args.database_path, args.image_path, args.output_path,
+        chunk_size=args.chunk_size, overlap=args.overlap, num_workers=args.num_workers,
+        bundle_adjust=not args.skip_ba, min_coverage=args.min_coverage,
+    )
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
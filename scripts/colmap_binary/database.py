@@ -0,0 +1,219 @@
+"""
+COLMAP database.db reader (pure NumPy)
+pycolmap C++ 백엔드 없이 keypoints/descriptors/matches/two_view_geometries blob을
+np.frombuffer로 복사 없이 NumPy 배열로 변환 (배치/지연/스트리밍 접근 지원)
+"""
+
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+
+
+MAX_IMAGE_ID = 2**31 - 1  # COLMAP kMaxNumImages
+DEFAULT_BATCH_SIZE = 512
+SQLITE_MAX_VARIABLES = 900  # IN (...) 파라미터 개수 제한보다 작게 유지
+
+
+def image_ids_to_pair_id(image_id1, image_id2):
+    """COLMAP pair_id for one or many image id pairs (smaller id first)"""
+    image_id1 = np.asarray(image_id1, dtype=np.int64)
+    image_id2 = np.asarray(image_id2, dtype=np.int64)
+    lo = np.minimum(image_id1, image_id2)
+    hi = np.maximum(image_id1, image_id2)
+    return lo * MAX_IMAGE_ID + hi
+
+
+def pair_id_to_image_ids(pair_id):
+    """Inverse of image_ids_to_pair_id, vectorized over arrays of pair ids"""
+    pair_id = np.asarray(pair_id, dtype=np.int64)
+    return pair_id // MAX_IMAGE_ID, pair_id % MAX_IMAGE_ID
+
+
+def blob_to_array(blob, dtype, rows, cols):
+    """View a sqlite blob as a (rows, cols) array without copying
+
+    반환 배열은 sqlite가 돌려준 bytes를 그대로 참조하므로 읽기 전용
+    """
+    if blob is None or rows == 0:
+        return np.empty((0, cols), dtype=dtype)
+    return np.frombuffer(blob, dtype=dtype).reshape(rows, cols)
+
+
+class BlobTable:
+    """Lazy, batched and streaming access to one (key, rows, cols, data) table
+
+    - table[key]: 한 행만 조회
+    - table.batch(keys): 여러 행을 IN 쿼리로 한 번에 조회
+    - table.items(batch_size): fetchmany 기반 스트리밍 (전체를 메모리에 올리지 않음)
+    """
+
+    def __init__(self, connection, table, key_column, dtype):
+        self.connection = connection
+        self.table = table
+        self.key_column = key_column
+        self.dtype = np.dtype(dtype)
+
+    def _select(self, where=""):
+        return (f"SELECT {self.key_column}, rows, cols, data FROM {self.table} {where}")
+
+    def _row_to_array(self, row):
+        key, rows, cols, data = row
+        return key, blob_to_array(data, self.dtype, rows, cols)
+
+    def __getitem__(self, key):
+        row = self.connection.execute(
+            self._select(f"WHERE {self.key_column} = ?"), (int(key),)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return self._row_to_array(row)[1]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return self.connection.execute(
+            f"SELECT 1 FROM {self.table} WHERE {self.key_column} = ?", (int(key),)
+        ).fetchone() is not None
+
+    def __len__(self):
+        return self.connection.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def keys(self):
+        return np.array([row[0] for row in self.connection.execute(
+            f"SELECT {self.key_column} FROM {self.table} ORDER BY {self.key_column}")],
+            dtype=np.int64)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def batch(self, keys):
+        """Fetch several rows at once, returned as {key: array}"""
+        keys = [int(k) for k in keys]
+        result = {}
+        for start in range(0, len(keys), SQLITE_MAX_VARIABLES):
+            chunk = keys[start:start + SQLITE_MAX_VARIABLES]
+            placeholders = ",".join("?" * len(chunk))
+            cursor = self.connection.execute(
+                self._select(f"WHERE {self.key_column} IN ({placeholders})"), chunk)
+            result.update(self._row_to_array(row) for row in cursor)
+        return result
+
+    def items(self, batch_size=DEFAULT_BATCH_SIZE):
+        """Stream (key, array) over the whole table"""
+        cursor = self.connection.execute(self._select(f"ORDER BY {self.key_column}"))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield self._row_to_array(row)
+
+    def counts(self):
+        """Number of rows per entry as (keys, counts) arrays, without reading blobs"""
+        rows = self.connection.execute(
+            f"SELECT {self.key_column}, rows FROM {self.table} ORDER BY {self.key_column}"
+        ).fetchall()
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        keys, counts = np.array(rows, dtype=np.int64).T
+        return keys, counts
+
+
+class COLMAPDatabaseReader:
+    """Read-only NumPy view of a COLMAP database.db"""
+
+    def __init__(self, database_path):
+        self.database_path = Path(database_path)
+        if not self.database_path.exists():
+            raise FileNotFoundError(f"COLMAP database not found: {self.database_path}")
+        # 읽기 전용으로 열어 실행 중인 COLMAP 작업과 충돌하지 않도록 함
+        self.connection = sqlite3.connect(
+            f"file:{self.database_path}?mode=ro", uri=True, check_same_thread=False)
+
+        self.keypoints = BlobTable(self.connection, "keypoints", "image_id", np.float32)
+        self.descriptors = BlobTable(self.connection, "descriptors", "image_id", np.uint8)
+        self.matches = BlobTable(self.connection, "matches", "pair_id", np.uint32)
+        self.two_view_geometries = BlobTable(
+            self.connection, "two_view_geometries", "pair_id", np.uint32)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def images(self):
+        """{name: (image_id, camera_id)}"""
+        return {
+            name: (image_id, camera_id)
+            for image_id, name, camera_id in self.connection.execute(
+                "SELECT image_id, name, camera_id FROM images ORDER BY image_id")
+        }
+
+    def cameras(self):
+        """{camera_id: dict(model, width, height, params)}"""
+        cameras = {}
+        for camera_id, model, width, height, params, prior in self.connection.execute(
+                "SELECT camera_id, model, width, height, params, prior_focal_length FROM cameras"):
+            cameras[camera_id] = {
+                "model": model,
+                "width": width,
+                "height": height,
+                "params": np.frombuffer(params, dtype=np.float64) if params else np.empty(0),
+                "prior_focal_length": bool(prior),
+            }
+        return cameras
+
+    def matches_between(self, image_id1, image_id2):
+        """Matches oriented as (idx in image_id1, idx in image_id2)"""
+        pair_id = int(image_ids_to_pair_id(image_id1, image_id2))
+        matches = self.matches.get(pair_id)
+        if matches is None:
+            return np.empty((0, 2), dtype=np.uint32)
+        # COLMAP은 작은 image_id가 먼저 오도록 저장
+        return matches[:, ::-1] if image_id1 > image_id2 else matches
+
+    def two_view_geometry(self, pair_id):
+        """Full two_view_geometries row: inlier matches, config and F/E/H/qvec/tvec"""
+        row = self.connection.execute(
+            "SELECT rows, cols, data, config, F, E, H, qvec, tvec "
+            "FROM two_view_geometries WHERE pair_id = ?", (int(pair_id),)).fetchone()
+        if row is None:
+            raise KeyError(pair_id)
+        rows, cols, data, config, F, E, H, qvec, tvec = row
+
+        def _mat(blob, shape):
+            return np.frombuffer(blob, dtype=np.float64).reshape(shape) if blob else None
+
+        return {
+            "inlier_matches": blob_to_array(data, np.uint32, rows, cols),
+            "config": config,
+            "F": _mat(F, (3, 3)),
+            "E": _mat(E, (3, 3)),
+            "H": _mat(H, (3, 3)),
+            "qvec": _mat(qvec, (4,)),
+            "tvec": _mat(tvec, (3,)),
+        }
+
+    def iter_matches(self, min_num_matches=0, batch_size=DEFAULT_BATCH_SIZE, verified=False):
+        """Stream (image_id1, image_id2, matches) over all (optionally verified) pairs"""
+        table = self.two_view_geometries if verified else self.matches
+        for pair_id, matches in table.items(batch_size):
+            if len(matches) < min_num_matches:
+                continue
+            image_id1, image_id2 = pair_id_to_image_ids(pair_id)
+            yield int(image_id1), int(image_id2), matches
+
+    def match_graph(self, verified=False):
+        """All pairs with their match counts as (image_id1, image_id2, count) arrays"""
+        table = self.two_view_geometries if verified else self.matches
+        pair_ids, counts = table.counts()
+        image_id1, image_id2 = pair_id_to_image_ids(pair_ids)
+        return image_id1, image_id2, counts
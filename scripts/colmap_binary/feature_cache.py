@@ -0,0 +1,342 @@
+"""
+Content-addressed cache for hloc local features
+이미지 내용 해시 + extractor 설정 + 가중치 해시 + 전처리(resize) 설정을 키로
+특징점 결과를 HLOC_CACHE 아래에 보관하여 같은 촬영본을 다시 처리할 때 네트워크 추론을 건너뜀.
+크기 상한을 넘으면 가장 오래 사용되지 않은 항목부터 삭제 (LRU).
+가중치 파일을 찾을 수 없는 extractor는 캐시하지 않음 (가중치가 바뀌어도 키가 그대로이므로).
+
+Usage:
+    python -m colmap_binary.feature_cache [--evict | --clear]
+"""
+
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .incremental import file_sha1
+
+
+DEFAULT_CACHE_ROOT = "/home/user/.cache/hloc"
+DEFAULT_MAX_GB = 20.0
+ENTRY_GROUP = "features"
+
+CREATE_TABLES = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS entries_last_access ON entries(last_access);
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path TEXT PRIMARY KEY NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha1 TEXT NOT NULL);
+"""
+
+
+def cache_enabled():
+    return os.environ.get("HLOC_FEATURE_CACHE", "1").lower() not in ("0", "false", "off")
+
+
+def _hub_dir():
+    return Path(os.environ.get("TORCH_HOME", "/home/user/.cache/torch")) / "hub"
+
+
+def _third_party_dirs():
+    """hloc 저장소의 third_party, /opt/third_party 및 sys.path (SuperGlue 등은 PYTHONPATH로 추가됨)"""
+    dirs = []
+    spec = importlib.util.find_spec("hloc")  # 최상위 패키지는 실행하지 않고 위치만 찾음
+    if spec is not None and spec.submodule_search_locations:
+        dirs.append(Path(list(spec.submodule_search_locations)[0]).parent / "third_party")
+    dirs.append(Path("/opt/third_party"))
+    dirs.extend(Path(p) for p in sys.path if p)
+    return dirs
+
+
+def _third_party_file(*relatives):
+    for directory in _third_party_dirs():
+        for relative in relatives:
+            path = directory / relative
+            if path.is_file():
+                return path
+    return None
+
+
+DISK_CHECKPOINTS = {"depth": "depth-save.pth", "epipolar": "epi-save.pth"}  # kornia DISK.from_pretrained
+
+# hloc extractor 이름 -> model conf로 실제 로드되는 가중치 파일 목록 (못 찾으면 None)
+EXTRACTOR_WEIGHTS = {
+    "superpoint": lambda model: [_third_party_file(
+        "SuperGluePretrainedNetwork/models/weights/superpoint_v1.pth", "models/weights/superpoint_v1.pth")],
+    "netvlad": lambda model: [
+        _hub_dir() / "netvlad" / f"{model.get('model_name', 'VGG16-NetVLAD-Pitts30K')}.mat"],
+    "disk": lambda model: [_hub_dir() / "checkpoints" / DISK_CHECKPOINTS.get(model.get("weights", "depth"), "")],
+    "aliked": lambda model: [_hub_dir() / "checkpoints" / f"{model.get('model_name', 'aliked-n16')}.pth"],
+    "r2d2": lambda model: [_third_party_file(f"r2d2/models/{model.get('model_name', 'r2d2_WASF_N16.pt')}")],
+    "d2net": lambda model: [_third_party_file(f"d2net/models/{model.get('checkpoint_name', 'd2_tf.pt')}")],
+    "dog": lambda model: [],  # 학습된 가중치 없음
+    "sift": lambda model: [],
+}
+
+
+def extractor_weight_files(model):
+    """Weight files an hloc extractor conf loads; None if unknown or not found on disk"""
+    resolve = EXTRACTOR_WEIGHTS.get(model["name"])
+    if resolve is None:
+        return None
+    files = resolve(model)
+    if any(path is None or not Path(path).is_file() for path in files):
+        return None
+    return sorted(Path(path) for path in files)
+
+
+class FeatureCache:
+    """LRU-bounded store of per-image feature groups, one small h5 file per entry"""
+
+    def __init__(self, root=None, max_bytes=None):
+        root = root or os.environ.get("HLOC_CACHE", DEFAULT_CACHE_ROOT)
+        self.root = Path(root) / "features"
+        self.root.mkdir(parents=True, exist_ok=True)
+        if max_bytes is None:
+            max_gb = float(os.environ.get("HLOC_FEATURE_CACHE_MAX_GB", DEFAULT_MAX_GB))
+            max_bytes = int(max_gb * 1024**3)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        # 여러 ns-process-data 프로세스가 동시에 접근할 수 있으므로 timeout을 넉넉히
+        self.connection = sqlite3.connect(str(self.root / "index.db"), timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(CREATE_TABLES)
+        self._weights_hashes = {}
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _entry_path(self, key):
+        return self.root / key[:2] / f"{key}.h5"
+
+    def file_hashes(self, paths, max_workers=8):
+        """sha1 per path, re-hashing only files whose size/mtime changed"""
+        paths = [str(Path(p).resolve()) for p in paths]
+        recorded = {}
+        for start in range(0, len(paths), 900):
+            chunk = paths[start:start + 900]
+            recorded.update(
+                (path, (size, mtime_ns, sha1)) for path, size, mtime_ns, sha1 in
+                self.connection.execute(
+                    "SELECT path, size, mtime_ns, sha1 FROM file_hashes "
+                    f"WHERE path IN ({','.join('?' * len(chunk))})", chunk))
+
+        hashes = {}
+        stale = []
+        for path in paths:
+            st = os.stat(path)
+            row = recorded.get(path)
+            if row is not None and row[:2] == (st.st_size, st.st_mtime_ns):
+                hashes[path] = row[2]
+            else:
+                stale.append((path, st.st_size, st.st_mtime_ns))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            digests = list(pool.map(lambda item: file_sha1(item[0]), stale))
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, sha1) VALUES (?, ?, ?, ?)",
+                [(path, size, mtime_ns, digest) for (path, size, mtime_ns), digest in zip(stale, digests)])
+        hashes.update((item[0], digest) for item, digest in zip(stale, digests))
+        return hashes
+
+    def weights_hash(self, model):
+        """Combined sha1 of the weight files an extractor conf loads; None if they cannot be found"""
+        cache_key = json.dumps(model, sort_keys=True, default=str)
+        if cache_key not in self._weights_hashes:
+            files = extractor_weight_files(model)
+            digest = None
+            if files is not None:
+                hashes = self.file_hashes(files) if files else {}
+                digest = hashlib.sha1()
+                for path in files:
+                    digest.update(f"{path.name}:{hashes[str(path.resolve())]}\n".encode())
+                digest = digest.hexdigest()
+            self._weights_hashes[cache_key] = digest
+        return self._weights_hashes[cache_key]
+
+    def keys_for(self, image_dir, names, conf, as_half):
+        """Cache key for every image name under a given extractor configuration
+
+        가중치 파일을 찾지 못하면 None (캐시하면 가중치 갱신 후에도 예전 결과가 재사용됨)
+        """
+        weights = self.weights_hash(conf["model"])
+        if weights is None:
+            return None
+        image_dir = Path(image_dir)
+        image_hashes = self.file_hashes([image_dir / name for name in names])
+        config = json.dumps({
+            "model": conf["model"],
+            "weights": weights,
+            "preprocessing": conf.get("preprocessing", {}),
+            "as_half": bool(as_half),
+        }, sort_keys=True, default=str)
+        return {
+            name: hashlib.sha256(
+                f"{image_hashes[str((image_dir / name).resolve())]}\n{config}".encode()).hexdigest()
+            for name in names
+        }
+
+    def get(self, key, fd, name):
+        """Copy a cached entry into the open h5 file fd as group `name`"""
+        import h5py
+
+        path = self._entry_path(key)
+        if not path.exists():
+            self.misses += 1
+            return False
+        try:
+            with h5py.File(str(path), "r") as entry:
+                if name in fd:
+                    del fd[name]
+                entry.copy(entry[ENTRY_GROUP], fd, name=name)
+        except OSError:
+            # 손상된 항목(중단된 쓰기 등)은 버리고 다시 추출
+            self._remove(key)
+            self.misses += 1
+            return False
+        with self.connection:
+            self.connection.execute(
+                "UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        self.hits += 1
+        return True
+
+    def put(self, key, fd, name):
+        """Store group `name` of the open h5 file fd under key"""
+        import h5py
+
+        path = self._entry_path(key)
+        path.parent.mkdir(exist_ok=True)
+        fd_tmp, tmp_path = tempfile.mkstemp(suffix=".h5.tmp", dir=path.parent)
+        os.close(fd_tmp)
+        try:
+            with h5py.File(tmp_path, "w") as entry:
+                fd.copy(fd[name], entry, name=ENTRY_GROUP)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries (key, size, last_access) VALUES (?, ?, ?)",
+                (key, path.stat().st_size, time.time()))
+
+    def _remove(self, key):
+        try:
+            self._entry_path(key).unlink()
+        except FileNotFoundError:
+            pass
+        with self.connection:
+            self.connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def total_bytes(self):
+        return self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits max_bytes"""
+        excess = self.total_bytes() - self.max_bytes
+        removed = 0
+        if excess <= 0:
+            return removed
+        for key, size in self.connection.execute(
+                "SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            if excess <= 0:
+                break
+            self._remove(key)
+            excess -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        for key, in self.connection.execute("SELECT key FROM entries").fetchall():
+            self._remove(key)
+
+
+def cached_extract(extract_main, dataset_cls, conf, image_dir, export_dir=None, as_half=True,
+                   image_list=None, feature_path=None, overwrite=False):
+    """Wrap hloc.extract_features.main with the feature cache
+
+    캐시에 있는 이미지는 feature_path로 복사하고, 나머지만 원래 main으로 추출한 뒤 캐시에 저장
+    """
+    if not cache_enabled():
+        return extract_main(conf, image_dir, export_dir, as_half, image_list, feature_path, overwrite)
+
+    import h5py
+
+    if feature_path is None:
+        feature_path = Path(export_dir, conf["output"] + ".h5")
+    feature_path = Path(feature_path)
+    feature_path.parent.mkdir(exist_ok=True, parents=True)
+    names = list(dataset_cls(image_dir, conf["preprocessing"], image_list).names)
+
+    with FeatureCache() as cache:
+        keys = cache.keys_for(image_dir, names, conf, as_half)
+        if keys is None:
+            print(f"⚠ Feature cache: weight files for extractor '{conf['model']['name']}' not found, "
+                  f"extracting without cache")
+            return extract_main(conf, image_dir, export_dir, as_half, image_list, feature_path, overwrite)
+        misses = []
+        with h5py.File(str(feature_path), "a", libver="latest") as fd:
+            for name in names:
+                if not overwrite and name in fd:
+                    continue  # hloc도 이미 있는 항목은 건너뜀
+                if not cache.get(keys[name], fd, name):
+                    misses.append(name)
+
+        print(f"Feature cache: {cache.hits} hits, {len(misses)} to extract")
+        if misses:
+            extract_main(conf, image_dir, export_dir, as_half, misses, feature_path, overwrite)
+            with h5py.File(str(feature_path), "r") as fd:
+                for name in misses:
+                    if name in fd:
+                        cache.put(keys[name], fd, name)
+            evicted = cache.evict()
+            if evicted:
+                print(f"Feature cache: evicted {evicted} least recently used entries")
+    return feature_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="hloc feature cache maintenance")
+    parser.add_argument("--root", default=None, help="cache root (default: $HLOC_CACHE)")
+    parser.add_argument("--clear", action="store_true", help="remove all cached features")
+    parser.add_argument("--evict", action="store_true", help="apply the size bound now")
+    args = parser.parse_args()
+
+    with FeatureCache(args.root) as cache:
+        if args.clear:
+            cache.clear()
+            print("✅ Feature cache cleared")
+        elif args.evict:
+            print(f"✅ Evicted {cache.evict()} entries")
+        count = cache.connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        print(f"{cache.root}: {count} entries, {cache.total_bytes() / 1024**2:.1f} MB "
+              f"(limit {cache.max_bytes / 1024**3:.1f} GB)")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,223 @@
+"""
+Incremental image import
+database.db에 이미 같은 이름/같은 내용으로 등록된 이미지는 건너뛰고
+새로 추가되었거나 내용이 바뀐 이미지만 feature_extractor로 가져오도록 계획
+"""
+
+import hashlib
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+
+MAX_IMAGE_ID = 2**31 - 1  # COLMAP pair_id = image_id1 * MAX_IMAGE_ID + image_id2
+HASH_CHUNK_SIZE = 1024 * 1024
+CAMERA_SENSOR_TYPE = 0  # COLMAP SensorType::CAMERA (frame_data.data_id가 image_id인 항목)
+
+# COLMAP 스키마에는 해시 컬럼이 없으므로 같은 db 안에 별도 테이블로 보관
+# (COLMAP 자체는 모르는 테이블을 무시함)
+CREATE_HASH_TABLE = """
+CREATE TABLE IF NOT EXISTS image_hashes (
+    name TEXT PRIMARY KEY NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha1 TEXT NOT NULL)
+"""
+
+
+def file_sha1(path):
+    """sha1 of a file's content, read in 1 MB chunks"""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImportPlan:
+    """Result of comparing requested images against the database"""
+
+    def __init__(self):
+        self.to_import = []   # 새 이미지 + 내용이 바뀐 이미지 (요청 순서 유지)
+        self.unchanged = []   # 이름/해시가 같아 건너뛴 이미지
+        self.changed = []     # 이름은 같지만 내용이 바뀌어 다시 가져올 이미지
+        self.stale_ids = []   # changed 이미지의 기존 image_id (replacing_images에서 삭제)
+        self.hashes = {}      # name -> (size, mtime_ns, sha1), db에 기록될 전체 목록
+
+    def __repr__(self):
+        return (f"ImportPlan(import={len(self.to_import)}, unchanged={len(self.unchanged)}, "
+                f"changed={len(self.changed)})")
+
+
+def _read_hash_rows(connection):
+    connection.execute(CREATE_HASH_TABLE)
+    return {
+        name: (size, mtime_ns, sha1)
+        for name, size, mtime_ns, sha1 in connection.execute(
+            "SELECT name, size, mtime_ns, sha1 FROM image_hashes")
+    }
+
+
+def _read_image_ids(connection):
+    try:
+        return dict(connection.execute("SELECT name, image_id FROM images"))
+    except sqlite3.OperationalError:
+        return {}
+
+
+def _columns(connection, table):
+    return {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+
+
+def _frame_ids(connection, ids):
+    try:
+        return {row[0] for image_id in ids for row in connection.execute(
+            "SELECT frame_id FROM frame_data WHERE data_id = ? AND sensor_type = ?",
+            (image_id[0], CAMERA_SENSOR_TYPE))}
+    except sqlite3.OperationalError:
+        return set()
+
+
+def delete_images(connection, image_ids):
+    """Remove images and all their per-image/per-pair/per-frame rows from a COLMAP database
+
+    COLMAP 3.12부터는 이미지마다 frames/frame_data 행과 (있으면) pose_priors 행이 함께 생기므로
+    이미지 행만 지우면 frame_data가 없는 image_id를 가리키게 됨
+    """
+    ids = [(int(i),) for i in image_ids]
+    if not ids:
+        return
+    frame_ids = _frame_ids(connection, ids)
+    statements = [
+        "DELETE FROM images WHERE image_id = ?",
+        "DELETE FROM keypoints WHERE image_id = ?",
+        "DELETE FROM descriptors WHERE image_id = ?",
+        f"DELETE FROM matches WHERE pair_id / {MAX_IMAGE_ID} = ?1 OR pair_id % {MAX_IMAGE_ID} = ?1",
+        f"DELETE FROM two_view_geometries WHERE pair_id / {MAX_IMAGE_ID} = ?1 "
+        f"OR pair_id % {MAX_IMAGE_ID} = ?1",
+        f"DELETE FROM frame_data WHERE data_id = ? AND sensor_type = {CAMERA_SENSOR_TYPE}",
+    ]
+    try:
+        # pose_priors는 3.12에서 image_id, 이후 버전에서 corr_data_id/corr_sensor_type으로 연결됨
+        prior_columns = _columns(connection, "pose_priors")
+    except sqlite3.OperationalError:
+        prior_columns = set()
+    if "image_id" in prior_columns:
+        statements.append("DELETE FROM pose_priors WHERE image_id = ?")
+    elif "corr_data_id" in prior_columns:
+        statements.append("DELETE FROM pose_priors WHERE corr_data_id = ? "
+                          f"AND corr_sensor_type = {CAMERA_SENSOR_TYPE}")
+    for statement in statements:
+        try:
+            connection.executemany(statement, ids)
+        except sqlite3.OperationalError:
+            # 아직 생성되지 않은 테이블은 무시
+            pass
+    # 데이터가 하나도 남지 않은 frame 제거 (다른 sensor 데이터가 남은 frame은 유지)
+    connection.executemany(
+        "DELETE FROM frames WHERE frame_id = ? "
+        "AND NOT EXISTS (SELECT 1 FROM frame_data WHERE frame_data.frame_id = frames.frame_id)",
+        [(frame_id,) for frame_id in frame_ids])
+
+
+@contextmanager
+def replacing_images(database_path, image_ids):
+    """Delete image_ids for re-import, restoring the database if the body raises
+
+    feature_extractor는 이미 등록된 이름을 건너뛰므로 기존 행은 추출 전에 지워야 하지만,
+    추출은 별도 COLMAP 프로세스라 같은 트랜잭션에 묶을 수 없음. 대신 삭제 전 상태를
+    sqlite backup으로 떠 두고 추출이 실패하면 되돌림.
+    """
+    if not image_ids:
+        yield
+        return
+    database_path = Path(database_path)
+    backup_path = Path(f"{database_path}.before_reimport")
+    connection = sqlite3.connect(str(database_path))
+    try:
+        backup = sqlite3.connect(str(backup_path))
+        try:
+            connection.backup(backup)
+        finally:
+            backup.close()
+        with connection:
+            delete_images(connection, image_ids)
+    finally:
+        connection.close()
+    try:
+        yield
+    except BaseException:
+        os.replace(backup_path, database_path)
+        print(f"⚠ Re-import failed, restored {database_path.name} (stale rows kept)")
+        raise
+    backup_path.unlink(missing_ok=True)
+
+
+def plan_incremental_import(database_path, image_path, image_names, max_workers=8):
+    """Decide which images need importing (read-only; see replacing_images for changed ones)
+
+    size/mtime이 기록과 같으면 해시를 다시 계산하지 않으므로
+    변경이 없는 재실행은 stat 비용만 듦.
+    해시 기록이 없는 기존 이미지는 그대로 두고 현재 해시를 기록하며,
+    기록된 해시와 내용이 다를 때만 plan.stale_ids에 넣음.
+    """
+    image_path = Path(image_path)
+    plan = ImportPlan()
+
+    connection = sqlite3.connect(str(database_path))
+    try:
+        recorded = _read_hash_rows(connection)
+        image_ids = _read_image_ids(connection)
+        plan.hashes.update({name: row for name, row in recorded.items() if name in image_ids})
+
+        stats = {}
+        needs_hash = []
+        for name in image_names:
+            st = os.stat(image_path / name)
+            stats[name] = (st.st_size, st.st_mtime_ns)
+            row = recorded.get(name)
+            if name in image_ids and row is not None and row[:2] == stats[name]:
+                plan.unchanged.append(name)
+            else:
+                needs_hash.append(name)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            digests = dict(zip(needs_hash, pool.map(lambda n: file_sha1(image_path / n), needs_hash)))
+
+        for name in needs_hash:
+            size, mtime_ns = stats[name]
+            digest = digests[name]
+            row = recorded.get(name)
+            plan.hashes[name] = (size, mtime_ns, digest)
+            if name not in image_ids:
+                plan.to_import.append(name)
+            elif row is None:
+                # 이 기록 이전에 만들어졌거나 hloc/COLMAP이 직접 만든 db: 현재 내용을 기준으로 기록만 함
+                plan.unchanged.append(name)
+            elif row[2] == digest:
+                # 내용은 그대로이고 mtime만 바뀐 경우 (touch, 복사 등)
+                plan.unchanged.append(name)
+            else:
+                plan.changed.append(name)
+                plan.to_import.append(name)
+                plan.stale_ids.append(image_ids[name])
+    finally:
+        connection.close()
+    return plan
+
+
+def record_hashes(database_path, hashes):
+    """Store name -> (size, mtime_ns, sha1) rows after a successful import"""
+    connection = sqlite3.connect(str(database_path))
+    try:
+        with connection:
+            connection.execute(CREATE_HASH_TABLE)
+            connection.executemany(
+                "INSERT OR REPLACE INTO image_hashes (name, size, mtime_ns, sha1) "
+                "VALUES (?, ?, ?, ?)",
+                [(name, *row) for name, row in hashes.items()],
+            )
+    finally:
+        connection.close()
@@ -0,0 +1,218 @@
+"""
+Bulk import of hloc pairs/matches into a COLMAP database.db
+hloc triangulation.import_matches는 쌍마다 h5 파일을 다시 열고 INSERT를 한 건씩 실행하므로
+대규모 장면(수십만 쌍)에서 수 분이 걸림. 여기서는 h5를 한 번만 열고 pair_id 순으로 스트리밍하며
+WAL 저널 + 큰 트랜잭션 안에서 executemany로 기록하고, 보조 인덱스는 적재 후에 다시 생성.
+
+Usage:
+    python -m colmap_binary.match_import <database.db> <pairs.txt> <matches.h5> [--skip-geometric-verification]
+"""
+
+import argparse
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .database import image_ids_to_pair_id
+
+
+DEFAULT_BATCH_SIZE = 2000          # executemany 한 번에 넘길 행 수
+DEFAULT_TRANSACTION_SIZE = 100000  # 커밋 간격 (WAL 파일 크기 상한)
+MATCH_TABLES = ("matches", "two_view_geometries")
+
+INSERT_MATCHES = "INSERT OR REPLACE INTO matches (pair_id, rows, cols, data) VALUES (?, ?, ?, ?)"
+INSERT_TWO_VIEW_GEOMETRY = (
+    "INSERT OR REPLACE INTO two_view_geometries "
+    "(pair_id, rows, cols, data, config, F, E, H, qvec, tvec) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+# skip_geometric_verification일 때 hloc이 기록하는 기본 two-view geometry (config=2, CALIBRATED)
+_EYE_BLOB = np.eye(3, dtype=np.float64).tobytes()
+_QVEC_BLOB = np.array([1.0, 0.0, 0.0, 0.0]).tobytes()
+_TVEC_BLOB = np.zeros(3).tobytes()
+
+
+def names_to_pair(name0, name1, separator="/"):
+    """hloc pair key ("_" separator = hloc names_to_pair_old)"""
+    return separator.join((name0.replace("/", "-"), name1.replace("/", "-")))
+
+
+def find_pair(hfile, name0, name1):
+    """Return (key, reverse) for a pair stored in either order / key format"""
+    for separator in ("/", "_"):
+        pair = names_to_pair(name0, name1, separator)
+        if pair in hfile:
+            return pair, False
+        pair = names_to_pair(name1, name0, separator)
+        if pair in hfile:
+            return pair, True
+    raise ValueError(f"Could not find pair {(name0, name1)} in matches file {hfile.filename}")
+
+
+def read_pair_matches(hfile, name0, name1):
+    """(N, 2) matches oriented as (idx in name0, idx in name1) and their scores"""
+    pair, reverse = find_pair(hfile, name0, name1)
+    group = hfile[pair]
+    matches0 = group["matches0"][()]
+    scores0 = group["matching_scores0"][()]
+    idx = np.flatnonzero(matches0 != -1)
+    matches = np.stack([idx, matches0[idx]], -1)
+    if reverse:
+        matches = matches[:, ::-1]
+    return matches, scores0[idx]
+
+
+def read_pairs(pairs_path):
+    with open(pairs_path, "r") as f:
+        return [tuple(line.split()[:2]) for line in f if line.strip()]
+
+
+def plan_pairs(image_ids, pairs):
+    """Deduplicate pairs (either order) and sort them by COLMAP pair_id
+
+    pair_id 순서로 적재하면 matches 테이블(rowid = pair_id)에 항상 뒤쪽으로 추가되어
+    B-tree 페이지 분할이 최소화됨
+    """
+    if not pairs:
+        return []
+    ids = np.array([(image_ids[n0], image_ids[n1]) for n0, n1 in pairs], dtype=np.int64)
+    pair_ids = image_ids_to_pair_id(ids[:, 0], ids[:, 1])
+    _, first = np.unique(pair_ids, return_index=True)  # 정렬 + 첫 등장만 유지
+    return [(int(pair_ids[i]), pairs[i][0], pairs[i][1], int(ids[i, 0]), int(ids[i, 1]))
+            for i in first]
+
+
+def _deferred_indexes(connection):
+    """CREATE INDEX statements of secondary indexes on the match tables"""
+    placeholders = ",".join("?" * len(MATCH_TABLES))
+    return connection.execute(
+        f"SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL "
+        f"AND tbl_name IN ({placeholders})", MATCH_TABLES).fetchall()
+
+
+def _restore_indexes(connection, indexes):
+    for name, sql in indexes:
+        exists = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).fetchone()
+        if exists is None:
+            connection.execute(sql)
+
+
+def _configure_bulk_load(connection):
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("PRAGMA temp_store=MEMORY")
+    connection.execute("PRAGMA cache_size=-262144")  # 256 MB
+
+
+def _finish_bulk_load(connection):
+    # COLMAP 바이너리가 기대하는 기본 rollback 저널로 되돌려 -wal/-shm 파일을 남기지 않음
+    connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    connection.execute("PRAGMA journal_mode=DELETE")
+
+
+def import_matches(image_ids, database_path, pairs_path, matches_path,
+                   min_match_score=None, skip_geometric_verification=False,
+                   batch_size=DEFAULT_BATCH_SIZE, transaction_size=DEFAULT_TRANSACTION_SIZE):
+    """Drop-in replacement for hloc.triangulation.import_matches
+
+    Returns a dict with the number of imported pairs, matches and skipped duplicates.
+    """
+    import h5py
+
+    start = time.time()
+    pairs = read_pairs(pairs_path)
+    planned = plan_pairs(image_ids, pairs)
+
+    connection = sqlite3.connect(str(database_path), isolation_level=None)
+    indexes = []
+    stats = {"pairs": 0, "matches": 0, "duplicates": len(pairs) - len(planned)}
+    try:
+        _configure_bulk_load(connection)
+        indexes = _deferred_indexes(connection)
+        for name, _ in indexes:
+            connection.execute(f'DROP INDEX "{name}"')
+
+        match_rows = []
+        geometry_rows = []
+        pending = 0
+
+        def flush():
+            connection.executemany(INSERT_MATCHES, match_rows)
+            if geometry_rows:
+                connection.executemany(INSERT_TWO_VIEW_GEOMETRY, geometry_rows)
+            match_rows.clear()
+            geometry_rows.clear()
+
+        connection.execute("BEGIN")
+        with h5py.File(str(matches_path), "r", libver="latest") as hfile:
+            for pair_id, name0, name1, id0, id1 in planned:
+                matches, scores = read_pair_matches(hfile, name0, name1)
+                if min_match_score:
+                    matches = matches[scores > min_match_score]
+                # COLMAP은 작은 image_id 쪽을 첫 번째 열로 저장
+                if id0 > id1:
+                    matches = matches[:, ::-1]
+                matches = np.ascontiguousarray(matches, dtype=np.uint32)
+                blob = matches.tobytes()
+
+                match_rows.append((pair_id, matches.shape[0], 2, blob))
+                if skip_geometric_verification:
+                    geometry_rows.append((pair_id, matches.shape[0], 2, blob, 2,
+                                          _EYE_BLOB, _EYE_BLOB, _EYE_BLOB, _QVEC_BLOB, _TVEC_BLOB))
+                stats["pairs"] += 1
+                stats["matches"] += matches.shape[0]
+                pending += 1
+
+                if len(match_rows) >= batch_size:
+                    flush()
+                if pending >= transaction_size:
+                    connection.execute("COMMIT")
+                    connection.execute("BEGIN")
+                    pending = 0
+        flush()
+        connection.execute("COMMIT")
+
+        _restore_indexes(connection, indexes)
+        _finish_bulk_load(connection)
+    except Exception:
+        if connection.in_transaction:
+            connection.execute("ROLLBACK")
+        _restore_indexes(connection, indexes)
+        raise
+    finally:
+        connection.close()
+
+    stats["seconds"] = time.time() - start
+    print(f"✓ Imported {stats['matches']} matches for {stats['pairs']} pairs "
+          f"in {stats['seconds']:.1f}s ({stats['duplicates']} duplicate pairs skipped)")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import hloc matches into a COLMAP database")
+    parser.add_argument("database", type=Path)
+    parser.add_argument("pairs", type=Path)
+    parser.add_argument("matches", type=Path)
+    parser.add_argument("--min-match-score", type=float, default=None)
+    parser.add_argument("--skip-geometric-verification", action="store_true")
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(str(args.database))
+    try:
+        image_ids = dict(connection.execute("SELECT name, image_id FROM images"))
+    finally:
+        connection.close()
+
+    import_matches(image_ids, args.database, args.pairs, args.matches,
+                   min_match_score=args.min_match_score,
+                   skip_geometric_verification=args.skip_geometric_verification)
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,467 @@
+"""
+Memory-mapped COLMAP binary model reader
+cameras.bin / images.bin / points3D.bin을 mmap으로 열어 고정 크기 레코드는
+구조화 dtype으로, 가변 길이 track/points2D는 CSR(offset 배열)로 한 번에 변환
+(hloc read_write_model의 필드별 struct.unpack + 포인트별 Python 객체 생성 대체)
+"""
+
+import collections
+import mmap
+import struct
+from pathlib import Path
+
+import numpy as np
+
+
+# model_id -> (model_name, num_params)
+CAMERA_MODELS = {
+    0: ("SIMPLE_PINHOLE", 3),
+    1: ("PINHOLE", 4),
+    2: ("SIMPLE_RADIAL", 4),
+    3: ("RADIAL", 5),
+    4: ("OPENCV", 8),
+    5: ("OPENCV_FISHEYE", 8),
+    6: ("FULL_OPENCV", 12),
+    7: ("FOV", 5),
+    8: ("SIMPLE_RADIAL_FISHEYE", 4),
+    9: ("RADIAL_FISHEYE", 5),
+    10: ("THIN_PRISM_FISHEYE", 12),
+    11: ("RAD_TAN_THIN_PRISM_FISHEYE", 16),
+}
+CAMERA_MODEL_IDS = {name: model_id for model_id, (name, _) in CAMERA_MODELS.items()}
+
+# points3D.bin 레코드 헤더: id, xyz, rgb, error, track_length (packed, 51 bytes)
+POINT3D_HEADER_DTYPE = np.dtype([
+    ("id", "<u8"), ("xyz", "<f8", 3), ("rgb", "u1", 3), ("error", "<f8"), ("track_length", "<u8"),
+])
+# images.bin 레코드 헤더 앞부분: image_id, qvec, tvec, camera_id (64 bytes, 뒤에 name\0)
+IMAGE_HEADER_DTYPE = np.dtype([
+    ("id", "<i4"), ("qvec", "<f8", 4), ("tvec", "<f8", 3), ("camera_id", "<i4"),
+])
+POINT2D_DTYPE = np.dtype([("xy", "<f8", 2), ("point3D_id", "<i8")])
+TRACK_ELEM_DTYPE = np.dtype([("image_id", "<i4"), ("point2D_idx", "<i4")])
+# frames.bin (COLMAP 3.12+): frame_id, rig_id, rig_from_world, num_data_ids (68 bytes)
+FRAME_HEADER_DTYPE = np.dtype([
+    ("id", "<u4"), ("rig_id", "<u4"), ("qvec", "<f8", 4), ("tvec", "<f8", 3), ("num_data_ids", "<u4"),
+])
+DATA_ID_DTYPE = np.dtype([("sensor_type", "<i4"), ("sensor_id", "<u4"), ("data_id", "<u8")])
+
+_UINT64 = struct.Struct("<Q")
+
+
+def _gather_records(buffer, starts, itemsize):
+    """Copy fixed-size records at arbitrary byte offsets into one (N, itemsize) array
+
+    sliding_window_view는 복사 없는 뷰이므로 인덱스 배열은 레코드 수만큼만 필요
+    """
+    if len(starts) == 0:
+        return np.empty((0, itemsize), dtype=np.uint8)
+    windows = np.lib.stride_tricks.sliding_window_view(buffer, itemsize)
+    return windows[np.asarray(starts, dtype=np.int64)]
+
+
+def _gather_runs(buffer, starts, lengths, itemsize):
+    """Concatenate variable-length runs of fixed-size items (CSR data) in one gather"""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    total = int(offsets[-1])
+    if total == 0:
+        return np.empty((0, itemsize), dtype=np.uint8), offsets
+    # 원소 k의 시작 바이트 = run 시작 + (k - run offset) * itemsize
+    positions = np.repeat(np.asarray(starts, dtype=np.int64) - offsets[:-1] * itemsize, lengths)
+    positions += np.arange(total, dtype=np.int64) * itemsize
+    return _gather_records(buffer, positions, itemsize), offsets
+
+
+class _MappedFile:
+    """Read-only mmap of a file exposed both as mmap and as a uint8 array"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        size = self.path.stat().st_size
+        self.mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.array = np.frombuffer(self.mmap, dtype=np.uint8)
+
+    def close(self):
+        # numpy 뷰를 먼저 해제해야 mmap을 닫을 수 있음
+        self.array = None
+        if isinstance(self.mmap, mmap.mmap):
+            self.mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CameraArrays:
+    """Cameras as arrays; params stored CSR-style (params_offsets into params)"""
+
+    def __init__(self, ids, model_ids, widths, heights, params, params_offsets):
+        self.ids = ids
+        self.model_ids = model_ids
+        self.widths = widths
+        self.heights = heights
+        self.params = params
+        self.params_offsets = params_offsets
+
+    def __len__(self):
+        return len(self.ids)
+
+    def camera_params(self, i):
+        return self.params[self.params_offsets[i]:self.params_offsets[i + 1]]
+
+
+class ImageArrays:
+    """Registered images as arrays; 2D points stored CSR-style per image"""
+
+    def __init__(self, ids, qvecs, tvecs, camera_ids, names, xys, point3D_ids, point2D_offsets):
+        self.ids = ids
+        self.qvecs = qvecs
+        self.tvecs = tvecs
+        self.camera_ids = camera_ids
+        self.names = names
+        self.xys = xys
+        self.point3D_ids = point3D_ids
+        self.point2D_offsets = point2D_offsets
+        self._index = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def index_of(self, image_id):
+        """Row index of an image_id"""
+        if self._index is None:
+            self._index = {int(image_id): i for i, image_id in enumerate(self.ids)}
+        return self._index[int(image_id)]
+
+    def points2D(self, i):
+        """(xys, point3D_ids) views of image at row i"""
+        start, end = self.point2D_offsets[i], self.point2D_offsets[i + 1]
+        return self.xys[start:end], self.point3D_ids[start:end]
+
+
+class Point3DArrays:
+    """3D points as arrays; tracks stored CSR-style per point"""
+
+    def __init__(self, ids, xyz, rgb, errors, track_image_ids, track_point2D_idxs, track_offsets):
+        self.ids = ids
+        self.xyz = xyz
+        self.rgb = rgb
+        self.errors = errors
+        self.track_image_ids = track_image_ids
+        self.track_point2D_idxs = track_point2D_idxs
+        self.track_offsets = track_offsets
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def track_lengths(self):
+        return np.diff(self.track_offsets)
+
+    def track(self, i):
+        """(image_ids, point2D_idxs) views of point at row i"""
+        start, end = self.track_offsets[i], self.track_offsets[i + 1]
+        return self.track_image_ids[start:end], self.track_point2D_idxs[start:end]
+
+
+def read_cameras_binary(path):
+    with _MappedFile(path) as f:
+        buffer = f.mmap
+        (num_cameras,) = _UINT64.unpack_from(buffer, 0)
+        ids, model_ids, widths, heights, params = [], [], [], [], []
+        offsets = [0]
+        pos = 8
+        # 카메라 수는 적으므로 레코드 단위로 순회
+        for _ in range(num_cameras):
+            camera_id, model_id, width, height = struct.unpack_from("<iiQQ", buffer, pos)
+            pos += 24
+            num_params = CAMERA_MODELS[model_id][1]
+            params.append(np.frombuffer(buffer, dtype="<f8", count=num_params, offset=pos).copy())
+            pos += 8 * num_params
+            ids.append(camera_id)
+            model_ids.append(model_id)
+            widths.append(width)
+            heights.append(height)
+            offsets.append(offsets[-1] + num_params)
+
+    return CameraArrays(
+        ids=np.array(ids, dtype=np.int64),
+        model_ids=np.array(model_ids, dtype=np.int64),
+        widths=np.array(widths, dtype=np.int64),
+        heights=np.array(heights, dtype=np.int64),
+        params=np.concatenate(params) if params else np.empty(0, dtype=np.float64),
+        params_offsets=np.array(offsets, dtype=np.int64),
+    )
+
+
+def read_images_binary(path):
+    with _MappedFile(path) as f:
+        buffer = f.mmap
+        (num_images,) = _UINT64.unpack_from(buffer, 0)
+
+        # 1) 가변 길이 name 때문에 레코드 시작 위치만 순차 스캔
+        header_starts, names, point_starts, point_counts = [], [], [], []
+        find = buffer.find
+        pos = 8
+        header_size = IMAGE_HEADER_DTYPE.itemsize
+        for _ in range(num_images):
+            header_starts.append(pos)
+            name_end = find(b"\x00", pos + header_size)
+            names.append(bytes(buffer[pos + header_size:name_end]).decode("utf-8"))
+            (num_points2D,) = _UINT64.unpack_from(buffer, name_end + 1)
+            point_starts.append(name_end + 9)
+            point_counts.append(num_points2D)
+            pos = name_end + 9 + num_points2D * POINT2D_DTYPE.itemsize
+
+        # 2) 헤더/2D 포인트는 한 번의 gather로 벡터화
+        headers = _gather_records(f.array, header_starts, header_size).view(IMAGE_HEADER_DTYPE)[:, 0]
+        points, offsets = _gather_runs(f.array, point_starts, point_counts, POINT2D_DTYPE.itemsize)
+        points = points.view(POINT2D_DTYPE)[:, 0] if len(points) else np.empty(0, POINT2D_DTYPE)
+
+    return ImageArrays(
+        ids=headers["id"].astype(np.int64),
+        qvecs=np.ascontiguousarray(headers["qvec"]),
+        tvecs=np.ascontiguousarray(headers["tvec"]),
+        camera_ids=headers["camera_id"].astype(np.int64),
+        names=names,
+        xys=np.ascontiguousarray(points["xy"]),
+        point3D_ids=np.ascontiguousarray(points["point3D_id"]),
+        point2D_offsets=offsets,
+    )
+
+
+def read_points3D_binary(path):
+    with _MappedFile(path) as f:
+        buffer = f.mmap
+        (num_points,) = _UINT64.unpack_from(buffer, 0)
+
+        # 1) track 길이가 다음 레코드 위치를 결정하므로 시작 위치만 순차 스캔
+        header_size = POINT3D_HEADER_DTYPE.itemsize
+        length_offset = POINT3D_HEADER_DTYPE.fields["track_length"][1]
+        track_elem_size = TRACK_ELEM_DTYPE.itemsize
+        unpack = _UINT64.unpack_from
+        starts = [0] * num_points
+        pos = 8
+        for i in range(num_points):
+            starts[i] = pos
+            pos += header_size + track_elem_size * unpack(buffer, pos + length_offset)[0]
+
+        # 2) 헤더와 track은 gather로 한 번에 변환
+        starts = np.array(starts, dtype=np.int64)
+        headers = _gather_records(f.array, starts, header_size).view(POINT3D_HEADER_DTYPE)[:, 0]
+        tracks, offsets = _gather_runs(f.array, starts + header_size,
+                                       headers["track_length"].astype(np.int64), track_elem_size)
+        tracks = tracks.view(TRACK_ELEM_DTYPE)[:, 0] if len(tracks) else np.empty(0, TRACK_ELEM_DTYPE)
+
+    return Point3DArrays(
+        ids=headers["id"].astype(np.int64),
+        xyz=np.ascontiguousarray(headers["xyz"]),
+        rgb=np.ascontiguousarray(headers["rgb"]),
+        errors=np.ascontiguousarray(headers["error"]),
+        track_image_ids=np.ascontiguousarray(tracks["image_id"]),
+        track_point2D_idxs=np.ascontiguousarray(tracks["point2D_idx"]),
+        track_offsets=offsets,
+    )
+
+
+class FrameArrays:
+    """Frames (COLMAP 3.12+) as arrays; data ids stored CSR-style per frame"""
+
+    def __init__(self, ids, rig_ids, qvecs, tvecs, data_ids, data_offsets):
+        self.ids = ids
+        self.rig_ids = rig_ids
+        self.qvecs = qvecs
+        self.tvecs = tvecs
+        self.data_ids = data_ids  # DATA_ID_DTYPE structured array
+        self.data_offsets = data_offsets
+
+    def __len__(self):
+        return len(self.ids)
+
+    def frame_data_ids(self, i):
+        return self.data_ids[self.data_offsets[i]:self.data_offsets[i + 1]]
+
+
+def read_frames_binary(path):
+    with _MappedFile(path) as f:
+        buffer = f.mmap
+        (num_frames,) = _UINT64.unpack_from(buffer, 0)
+
+        header_size = FRAME_HEADER_DTYPE.itemsize
+        count_offset = FRAME_HEADER_DTYPE.fields["num_data_ids"][1]
+        unpack = struct.Struct("<I").unpack_from
+        starts = [0] * num_frames
+        pos = 8
+        for i in range(num_frames):
+            starts[i] = pos
+            pos += header_size + DATA_ID_DTYPE.itemsize * unpack(buffer, pos + count_offset)[0]
+
+        starts = np.array(starts, dtype=np.int64)
+        headers = _gather_records(f.array, starts, header_size).view(FRAME_HEADER_DTYPE)[:, 0]
+        data, offsets = _gather_runs(f.array, starts + header_size,
+                                     headers["num_data_ids"].astype(np.int64), DATA_ID_DTYPE.itemsize)
+        data = data.view(DATA_ID_DTYPE)[:, 0] if len(data) else np.empty(0, DATA_ID_DTYPE)
+
+    return FrameArrays(
+        ids=headers["id"].astype(np.int64),
+        rig_ids=headers["rig_id"].astype(np.int64),
+        qvecs=np.ascontiguousarray(headers["qvec"]),
+        tvecs=np.ascontiguousarray(headers["tvec"]),
+        data_ids=data,
+        data_offsets=offsets,
+    )
+
+
+def read_rigs_binary(path):
+    """rigs.bin (COLMAP 3.12+) as a list of dicts (rig 수는 적으므로 레코드 단위로 파싱)
+
+    {"id", "ref_sensor": (type, id) or None,
+     "sensors": [((type, id), (qvec, tvec) or None), ...]}
+    """
+    rigs = []
+    with open(path, "rb") as f:
+        buffer = f.read()
+    (num_rigs,) = _UINT64.unpack_from(buffer, 0)
+    pos = 8
+    for _ in range(num_rigs):
+        rig_id, num_sensors = struct.unpack_from("<II", buffer, pos)
+        pos += 8
+        rig = {"id": rig_id, "ref_sensor": None, "sensors": []}
+        if num_sensors > 0:
+            rig["ref_sensor"] = struct.unpack_from("<iI", buffer, pos)
+            pos += 8
+        for _ in range(num_sensors - 1 if num_sensors > 0 else 0):
+            sensor = struct.unpack_from("<iI", buffer, pos)
+            (has_pose,) = struct.unpack_from("<B", buffer, pos + 8)
+            pos += 9
+            pose = None
+            if has_pose:
+                values = struct.unpack_from("<7d", buffer, pos)
+                pose = (np.array(values[:4]), np.array(values[4:]))
+                pos += 56
+            rig["sensors"].append((sensor, pose))
+        rigs.append(rig)
+    return rigs
+
+
+class ModelReader:
+    """Lazy per-table access to a binary COLMAP model directory
+
+    각 테이블은 처음 접근할 때만 읽음 (예: 카메라만 필요하면 points3D.bin은 읽지 않음)
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._cameras = None
+        self._images = None
+        self._points3D = None
+        self._frames = None
+        self._rigs = None
+
+    @property
+    def cameras(self):
+        if self._cameras is None:
+            self._cameras = read_cameras_binary(self.path / "cameras.bin")
+        return self._cameras
+
+    @property
+    def images(self):
+        if self._images is None:
+            self._images = read_images_binary(self.path / "images.bin")
+        return self._images
+
+    @property
+    def points3D(self):
+        if self._points3D is None:
+            self._points3D = read_points3D_binary(self.path / "points3D.bin")
+        return self._points3D
+
+    @property
+    def frames(self):
+        """FrameArrays, or None for pre-3.12 models without frames.bin"""
+        if self._frames is None and (self.path / "frames.bin").exists():
+            self._frames = read_frames_binary(self.path / "frames.bin")
+        return self._frames
+
+    @property
+    def rigs(self):
+        """List of rig dicts, or None for pre-3.12 models without rigs.bin"""
+        if self._rigs is None and (self.path / "rigs.bin").exists():
+            self._rigs = read_rigs_binary(self.path / "rigs.bin")
+        return self._rigs
+
+
+# hloc.utils.read_write_model과 같은 namedtuple (hloc이 없을 때를 위한 대체 정의)
+try:
+    from hloc.utils.read_write_model import Camera, Image, Point3D
+except Exception:
+    Camera = collections.namedtuple("Camera", ["id", "model", "width", "height", "params"])
+    Image = collections.namedtuple(
+        "Image", ["id", "qvec", "tvec", "camera_id", "name", "xys", "point3D_ids"])
+    Point3D = collections.namedtuple(
+        "Point3D", ["id", "xyz", "rgb", "error", "image_ids", "point2D_idxs"])
+
+
+def cameras_to_dict(cameras):
+    return {
+        int(cameras.ids[i]): Camera(
+            id=int(cameras.ids[i]),
+            model=CAMERA_MODELS[int(cameras.model_ids[i])][0],
+            width=int(cameras.widths[i]),
+            height=int(cameras.heights[i]),
+            params=cameras.camera_params(i),
+        )
+        for i in range(len(cameras))
+    }
+
+
+def images_to_dict(images):
+    result = {}
+    for i in range(len(images)):
+        xys, point3D_ids = images.points2D(i)
+        result[int(images.ids[i])] = Image(
+            id=int(images.ids[i]),
+            qvec=images.qvecs[i],
+            tvec=images.tvecs[i],
+            camera_id=int(images.camera_ids[i]),
+            name=images.names[i],
+            xys=xys,
+            point3D_ids=point3D_ids,
+        )
+    return result
+
+
+def points3D_to_dict(points3D):
+    result = {}
+    for i in range(len(points3D)):
+        image_ids, point2D_idxs = points3D.track(i)
+        result[int(points3D.ids[i])] = Point3D(
+            id=int(points3D.ids[i]),
+            xyz=points3D.xyz[i],
+            rgb=points3D.rgb[i],
+            error=float(points3D.errors[i]),
+            image_ids=image_ids,
+            point2D_idxs=point2D_idxs,
+        )
+    return result
+
+
+def read_model(path, ext=".bin"):
+    """Drop-in for hloc.utils.read_write_model.read_model (binary models only)
+
+    배열 기반으로 읽은 뒤 기존 호출부가 기대하는 dict 형태로 변환
+    """
+    if ext != ".bin":
+        raise ValueError(f"Only binary models are supported, got ext={ext!r}")
+    reader = ModelReader(path)
+    return (
+        cameras_to_dict(reader.cameras),
+        images_to_dict(reader.images),
+        points3D_to_dict(reader.points3D),
+    )
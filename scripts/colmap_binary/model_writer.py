@@ -0,0 +1,262 @@
+"""
+Vectorized COLMAP binary model writer
+배열 기반 cameras/images/points3D(+ COLMAP 3.12 frames/rigs)를 bulk tobytes로 기록하고
+임시 디렉터리에 쓰고 fsync한 뒤 파일별 os.replace로 교체 (hloc write_model의 객체별 struct.pack 대체)
+
+Usage:
+    python -m colmap_binary.model_writer --verify <model_dir>
+"""
+
+import argparse
+import filecmp
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from .model_reader import (
+    DATA_ID_DTYPE,
+    FRAME_HEADER_DTYPE,
+    IMAGE_HEADER_DTYPE,
+    POINT2D_DTYPE,
+    POINT3D_HEADER_DTYPE,
+    TRACK_ELEM_DTYPE,
+    ModelReader,
+)
+
+
+CAMERA_HEADER_DTYPE = np.dtype([
+    ("id", "<i4"), ("model_id", "<i4"), ("width", "<u8"), ("height", "<u8"),
+])
+MODEL_FILES = ("cameras.bin", "images.bin", "points3D.bin", "frames.bin", "rigs.bin")
+# 한 번에 interleave할 레코드 수 (마스크/출력 버퍼 메모리 상한)
+DEFAULT_CHUNK_RECORDS = 1 << 20
+
+_UINT64 = struct.Struct("<Q")
+
+
+def _as_bytes(array):
+    return np.ascontiguousarray(array).view(np.uint8).reshape(-1)
+
+
+def _interleave(heads, head_lengths, items, item_lengths):
+    """Build head_0 items_0 head_1 items_1 ... from two flat byte streams
+
+    레코드별 루프 대신 boolean 마스크 한 번으로 두 스트림을 교차 배치
+    """
+    n = len(head_lengths)
+    lengths = np.empty(2 * n, dtype=np.int64)
+    lengths[0::2] = head_lengths
+    lengths[1::2] = item_lengths
+    mask = np.repeat(np.tile(np.array([True, False]), n), lengths)
+    out = np.empty(mask.size, dtype=np.uint8)
+    out[mask] = heads
+    out[~mask] = items
+    return out
+
+
+def _write_fixed_head_records(f, heads, items, offsets, chunk_records=DEFAULT_CHUNK_RECORDS):
+    """Write records made of one fixed-size head and a CSR run of fixed-size items"""
+    head_size = heads.dtype.itemsize
+    item_size = items.dtype.itemsize
+    f.write(_UINT64.pack(len(heads)))
+    for start in range(0, len(heads), chunk_records):
+        end = min(start + chunk_records, len(heads))
+        lo, hi = offsets[start], offsets[end]
+        counts = np.diff(offsets[start:end + 1])
+        chunk = _interleave(
+            _as_bytes(heads[start:end]), np.full(end - start, head_size, dtype=np.int64),
+            _as_bytes(items[lo:hi]), counts * item_size,
+        )
+        f.write(chunk.data)
+
+
+def write_cameras_binary(cameras, path):
+    heads = np.empty(len(cameras), dtype=CAMERA_HEADER_DTYPE)
+    heads["id"] = cameras.ids
+    heads["model_id"] = cameras.model_ids
+    heads["width"] = cameras.widths
+    heads["height"] = cameras.heights
+    params = np.asarray(cameras.params, dtype="<f8")
+    with open(path, "wb") as f:
+        _write_fixed_head_records(f, heads, params, np.asarray(cameras.params_offsets))
+
+
+def write_images_binary(images, path):
+    n = len(images)
+    fixed = np.empty(n, dtype=IMAGE_HEADER_DTYPE)
+    fixed["id"] = images.ids
+    fixed["qvec"] = images.qvecs
+    fixed["tvec"] = images.tvecs
+    fixed["camera_id"] = images.camera_ids
+    offsets = np.asarray(images.point2D_offsets, dtype=np.int64)
+    counts = np.diff(offsets)
+
+    # 이미지 헤더는 name 때문에 가변 길이 - 이미지 수만큼만 조립
+    fixed_bytes = _as_bytes(fixed).reshape(n, -1) if n else np.empty((0, 0), np.uint8)
+    heads = [
+        fixed_bytes[i].tobytes() + name.encode("utf-8") + b"\x00" + _UINT64.pack(int(counts[i]))
+        for i, name in enumerate(images.names)
+    ]
+    head_lengths = np.array([len(h) for h in heads], dtype=np.int64)
+
+    points = np.empty(int(offsets[-1]) if n else 0, dtype=POINT2D_DTYPE)
+    points["xy"] = images.xys
+    points["point3D_id"] = images.point3D_ids
+
+    with open(path, "wb") as f:
+        f.write(_UINT64.pack(n))
+        if n:
+            out = _interleave(np.frombuffer(b"".join(heads), dtype=np.uint8), head_lengths,
+                              _as_bytes(points), counts * POINT2D_DTYPE.itemsize)
+            f.write(out.data)
+
+
+def write_points3D_binary(points3D, path, chunk_records=DEFAULT_CHUNK_RECORDS):
+    offsets = np.asarray(points3D.track_offsets, dtype=np.int64)
+    heads = np.empty(len(points3D), dtype=POINT3D_HEADER_DTYPE)
+    heads["id"] = points3D.ids
+    heads["xyz"] = points3D.xyz
+    heads["rgb"] = points3D.rgb
+    heads["error"] = points3D.errors
+    heads["track_length"] = np.diff(offsets)
+
+    tracks = np.empty(int(offsets[-1]), dtype=TRACK_ELEM_DTYPE)
+    tracks["image_id"] = points3D.track_image_ids
+    tracks["point2D_idx"] = points3D.track_point2D_idxs
+
+    with open(path, "wb") as f:
+        _write_fixed_head_records(f, heads, tracks, offsets, chunk_records)
+
+
+def write_frames_binary(frames, path):
+    offsets = np.asarray(frames.data_offsets, dtype=np.int64)
+    heads = np.empty(len(frames), dtype=FRAME_HEADER_DTYPE)
+    heads["id"] = frames.ids
+    heads["rig_id"] = frames.rig_ids
+    heads["qvec"] = frames.qvecs
+    heads["tvec"] = frames.tvecs
+    heads["num_data_ids"] = np.diff(offsets)
+    data = np.asarray(frames.data_ids, dtype=DATA_ID_DTYPE)
+    with open(path, "wb") as f:
+        _write_fixed_head_records(f, heads, data, offsets)
+
+
+def write_rigs_binary(rigs, path):
+    """rigs.bin from the list of dicts returned by read_rigs_binary"""
+    parts = [_UINT64.pack(len(rigs))]
+    for rig in rigs:
+        num_sensors = 0 if rig["ref_sensor"] is None else 1 + len(rig["sensors"])
+        parts.append(struct.pack("<II", rig["id"], num_sensors))
+        if rig["ref_sensor"] is None:
+            continue
+        parts.append(struct.pack("<iI", *rig["ref_sensor"]))
+        for sensor, pose in rig["sensors"]:
+            parts.append(struct.pack("<iIB", sensor[0], sensor[1], pose is not None))
+            if pose is not None:
+                parts.append(struct.pack("<7d", *pose[0], *pose[1]))
+    with open(path, "wb") as f:
+        f.write(b"".join(parts))
+
+
+def _fsync_dir_files(directory):
+    for path in Path(directory).iterdir():
+        if path.is_file():
+            with open(path, "rb") as f:
+                os.fsync(f.fileno())
+
+
+def _fsync_dir(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _swap_into_place(tmp_dir, path):
+    """Move the model files of tmp_dir into path, one os.replace per file
+
+    대상 디렉터리가 없으면 디렉터리째 rename. 있으면 모델 파일만 하나씩 원자적으로 교체하고
+    (frames/rigs는 마지막), 모델 파일 외의 항목(database.db 등)은 건드리지 않음.
+    대상 디렉터리는 항상 존재하고 각 파일은 이전 또는 새 내용 중 하나만 보임.
+    """
+    path = Path(path)
+    tmp_dir = Path(tmp_dir)
+    if not path.exists():
+        os.rename(tmp_dir, path)
+        _fsync_dir(path.parent)
+        return
+
+    written = [name for name in MODEL_FILES if (tmp_dir / name).exists()]
+    for name in written:
+        os.replace(tmp_dir / name, path / name)
+    # 이번에 쓰지 않은 이전 모델 파일(예: frames/rigs 없는 모델로 덮어쓸 때)은 제거
+    for name in MODEL_FILES:
+        if name not in written and (path / name).exists():
+            os.unlink(path / name)
+    _fsync_dir(path)
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def write_model(path, cameras, images, points3D, frames=None, rigs=None):
+    """Write a binary model: temp directory + fsync first, then replace each file in place"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=f".{path.name}.tmp-", dir=path.parent))
+    try:
+        write_cameras_binary(cameras, tmp_dir / "cameras.bin")
+        write_images_binary(images, tmp_dir / "images.bin")
+        write_points3D_binary(points3D, tmp_dir / "points3D.bin")
+        if frames is not None:
+            write_frames_binary(frames, tmp_dir / "frames.bin")
+        if rigs is not None:
+            write_rigs_binary(rigs, tmp_dir / "rigs.bin")
+        _fsync_dir_files(tmp_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    _swap_into_place(tmp_dir, path)
+    return path
+
+
+def write_model_from_reader(reader, path):
+    """Re-write everything a ModelReader exposes (frames/rigs included when present)"""
+    return write_model(path, reader.cameras, reader.images, reader.points3D,
+                       frames=reader.frames, rigs=reader.rigs)
+
+
+def verify_roundtrip(model_dir):
+    """Read and re-write model_dir, returning {file: identical} for every model file"""
+    model_dir = Path(model_dir)
+    with tempfile.TemporaryDirectory() as tmp:
+        out_dir = Path(tmp) / "model"
+        write_model_from_reader(ModelReader(model_dir), out_dir)
+        return {
+            name: filecmp.cmp(model_dir / name, out_dir / name, shallow=False)
+            for name in MODEL_FILES if (model_dir / name).exists()
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized COLMAP binary model writer")
+    parser.add_argument("--verify", type=Path, required=True,
+                        help="model directory to round-trip (read + write + byte compare)")
+    args = parser.parse_args()
+
+    results = verify_roundtrip(args.verify)
+    for name, identical in results.items():
+        print(f"  {'✓' if identical else '❌'} {name}")
+    if all(results.values()):
+        print("✅ Byte-identical round-trip")
+        return True
+    print("❌ Round-trip differs")
+    return False
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
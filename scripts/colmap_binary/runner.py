@@ -0,0 +1,237 @@
+"""
+Streaming COLMAP binary runner
+COLMAP 로그를 한 줄씩 읽어 디스크로 회전 저장하고 진행률/ETA를 파싱
+(mapper, feature_extractor 등 장시간 작업에서도 메모리 사용량이 일정하게 유지됨)
+"""
+
+import collections
+import json
+import logging
+import logging.handlers
+import os
+import re
+import subprocess
+import time
+from pathlib import Path
+
+
+# COLMAP 진행률 로그 패턴
+PROGRESS_PATTERNS = [
+    # feature_extractor: "Processed file [12/5000]"
+    ("extraction", re.compile(r"Processed file \[(\d+)/(\d+)\]")),
+    # sequential/spatial/vocab_tree matcher: "Matching image [12/5000]"
+    ("matching", re.compile(r"Matching image \[(\d+)/(\d+)\]")),
+    # exhaustive_matcher: "Matching block [1/10, 2/10]"
+    ("matching", re.compile(r"Matching block \[(\d+)/(\d+), (\d+)/(\d+)\]")),
+    # mapper: "Registering image #123 (45)" - 괄호 안은 등록된 이미지 수
+    ("registration", re.compile(r"Registering image #(\d+) \((\d+)\)")),
+]
+
+DEFAULT_TAIL_LINES = 200
+DEFAULT_LOG_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_LOG_BACKUPS = 3
+PROGRESS_FILE_INTERVAL = 1.0
+
+
+class ColmapProgress:
+    """Progress state parsed from a running COLMAP command"""
+
+    def __init__(self, command, total=None):
+        self.command = command
+        self.stage = None
+        self.current = 0
+        self.total = total
+        self.total_hint = total
+        self.image_id = None
+        self.started_at = time.monotonic()
+        self.updated_at = self.started_at
+        self.rate = 0.0  # items / sec (EMA)
+        self._last_current = 0
+        self._last_time = self.started_at
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started_at
+
+    @property
+    def fraction(self):
+        if not self.total:
+            return None
+        return min(1.0, self.current / self.total)
+
+    @property
+    def eta(self):
+        """Seconds remaining, or None when total/rate are unknown"""
+        if not self.total or self.rate <= 0:
+            return None
+        return max(0.0, (self.total - self.current) / self.rate)
+
+    def update(self, stage, current, total=None, image_id=None):
+        now = time.monotonic()
+        if stage != self.stage:
+            # 새 단계 시작 시 처리율 초기화
+            self.stage = stage
+            self.total = self.total_hint
+            self.rate = 0.0
+            self._last_current = 0
+            self._last_time = now
+        if total:
+            self.total = total
+        self.current = current
+        self.image_id = image_id
+
+        dt = now - self._last_time
+        if dt > 0 and current > self._last_current:
+            instant = (current - self._last_current) / dt
+            # 지수 이동 평균으로 처리율 평활화
+            self.rate = instant if self.rate == 0.0 else 0.8 * self.rate + 0.2 * instant
+            self._last_current = current
+            self._last_time = now
+        self.updated_at = now
+
+    def as_dict(self):
+        return {
+            "command": self.command,
+            "stage": self.stage,
+            "current": self.current,
+            "total": self.total,
+            "fraction": self.fraction,
+            "image_id": self.image_id,
+            "elapsed": round(self.elapsed, 3),
+            "rate": round(self.rate, 3),
+            "eta": None if self.eta is None else round(self.eta, 1),
+        }
+
+    def __repr__(self):
+        return f"ColmapProgress({self.as_dict()})"
+
+
+class ProgressPrinter:
+    """Default progress callback: prints a one-line summary at most every ``interval`` seconds"""
+
+    def __init__(self, interval=10.0):
+        self.interval = interval
+        self._last_print = 0.0
+
+    def __call__(self, progress):
+        now = time.monotonic()
+        if now - self._last_print < self.interval:
+            return
+        self._last_print = now
+
+        total = f"/{progress.total}" if progress.total else ""
+        line = f"  [{progress.command}:{progress.stage}] {progress.current}{total}"
+        if progress.fraction is not None:
+            line += f" ({progress.fraction * 100:.1f}%)"
+        line += f" {progress.rate:.2f} it/s"
+        if progress.eta is not None:
+            line += f" ETA {progress.eta / 60:.1f} min"
+        print(line, flush=True)
+
+
+def parse_progress_line(line):
+    """Parse a COLMAP log line into (stage, current, total, image_id) or None"""
+    for stage, pattern in PROGRESS_PATTERNS:
+        match = pattern.search(line)
+        if not match:
+            continue
+        groups = [int(g) for g in match.groups()]
+        if stage == "registration":
+            image_id, num_registered = groups
+            return stage, num_registered, None, image_id
+        if len(groups) == 4:
+            # 블록 인덱스를 선형 진행률로 변환
+            i, n_i, j, n_j = groups
+            return stage, (i - 1) * n_j + j, n_i * n_j, None
+        return stage, groups[0], groups[1], None
+    return None
+
+
+def _open_rotating_log(log_path, max_bytes, backup_count):
+    """Create a rotating file handler that writes raw COLMAP lines"""
+    log_path = Path(log_path)
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+
+    handler = logging.handlers.RotatingFileHandler(
+        log_path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    return handler
+
+
+def _write_progress_file(progress_file, progress, returncode=None):
+    """Atomically publish progress JSON for external schedulers"""
+    data = progress.as_dict()
+    data["returncode"] = returncode
+    tmp_file = f"{progress_file}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_file, progress_file)
+
+
+def run_colmap_streaming(cmd, log_path=None, progress_callback=None, total=None,
+                         progress_file=None, check=True, env=None,
+                         tail_lines=DEFAULT_TAIL_LINES,
+                         log_max_bytes=DEFAULT_LOG_MAX_BYTES,
+                         log_backup_count=DEFAULT_LOG_BACKUPS):
+    """Run a COLMAP command while streaming its output line by line
+
+    stdout/stderr are merged and never fully buffered: every line goes to the
+    rotating log (if any), only the last ``tail_lines`` are kept in memory.
+    ``progress_callback(progress)`` is called whenever a progress line is parsed.
+
+    Returns a ``subprocess.CompletedProcess`` whose ``stdout`` holds the log tail.
+    """
+    shell = isinstance(cmd, str)
+    args = cmd.split() if shell else [str(c) for c in cmd]
+    # [colmap_bin, subcommand, ...] 형태에서 서브커맨드 이름 추출
+    command_name = args[1] if len(args) > 1 else args[0]
+    progress = ColmapProgress(command_name, total=total)
+    progress_file = progress_file or os.environ.get("COLMAP_PROGRESS_FILE")
+
+    tail = collections.deque(maxlen=tail_lines)
+    handler = None
+    if log_path is not None:
+        handler = _open_rotating_log(log_path, log_max_bytes, log_backup_count)
+
+    last_publish = 0.0
+    proc = None
+    try:
+        proc = subprocess.Popen(
+            cmd, shell=shell, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            text=True, bufsize=1, errors="replace", env=env,
+        )
+        with proc.stdout:
+            for line in proc.stdout:
+                line = line.rstrip("\n")
+                tail.append(line)
+                if handler is not None:
+                    # emit()이 maxBytes 초과 시 로그 파일을 회전
+                    handler.emit(logging.makeLogRecord({"msg": line}))
+
+                parsed = parse_progress_line(line)
+                if parsed is None:
+                    continue
+                stage, current, stage_total, image_id = parsed
+                progress.update(stage, current, stage_total, image_id)
+                if progress_callback is not None:
+                    progress_callback(progress)
+                if progress_file and time.monotonic() - last_publish >= PROGRESS_FILE_INTERVAL:
+                    _write_progress_file(progress_file, progress)
+                    last_publish = time.monotonic()
+        returncode = proc.wait()
+    finally:
+        # 콜백/로그/진행 파일 쓰기에서 예외가 나면 COLMAP 자식 프로세스가 남지 않도록 정리
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        if handler is not None:
+            handler.close()
+
+    if progress_file:
+        _write_progress_file(progress_file, progress, returncode)
+
+    result = subprocess.CompletedProcess(cmd, returncode, stdout="\n".join(tail), stderr="")
+    if check and returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd, output=result.stdout)
+    return result
@@ -0,0 +1,261 @@
+"""
+Sharded parallel feature extraction
+이미지 목록을 N개의 shard로 나누어 feature_extractor를 병렬 실행한 뒤
+database_merger로 하나의 database.db로 병합 (카메라/이미지 ID 일관성 유지)
+"""
+
+import os
+import shutil
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .runner import ColmapProgress
+
+
+CAMERA_SENSOR_TYPE = 0  # COLMAP SensorType::CAMERA
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp", ".ppm", ".pgm"}
+
+
+def list_images(image_path):
+    """List images under image_path as COLMAP-style relative posix names (sorted)"""
+    image_path = Path(image_path)
+    names = [
+        p.relative_to(image_path).as_posix()
+        for p in image_path.rglob("*")
+        if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS
+    ]
+    return sorted(names)
+
+
+def split_shards(image_names, num_shards):
+    """Split image names into contiguous, balanced shards
+
+    연속 구간으로 나누어야 병합 후 image_id 순서가 이름 순서와 일치함
+    """
+    num_shards = max(1, min(num_shards, len(image_names)))
+    base, extra = divmod(len(image_names), num_shards)
+    shards = []
+    start = 0
+    for i in range(num_shards):
+        end = start + base + (1 if i < extra else 0)
+        shards.append(image_names[start:end])
+        start = end
+    return shards
+
+
+def write_image_list(path, image_names):
+    """Write an image list file for --ImageReader.image_list_path"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        for name in image_names:
+            f.write(f"{name}\n")
+    return path
+
+
+def existing_image_names(database_path):
+    """Image names already in the images table (empty if the db or table does not exist)"""
+    if not Path(database_path).exists():
+        return set()
+    connection = sqlite3.connect(str(database_path))
+    try:
+        return {row[0] for row in connection.execute("SELECT name FROM images")}
+    except sqlite3.OperationalError:
+        return set()
+    finally:
+        connection.close()
+
+
+def _has_table(connection, table):
+    return connection.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+
+def unify_cameras(database_path, image_names):
+    """Point the images added by a sharded run at one camera (single_camera mode)
+
+    각 shard는 자기 카메라를 따로 만들기 때문에 single_camera 모드에서도 병합 후
+    shard 수만큼 카메라가 생김. 이번에 추가된 이미지만 첫 번째 shard의 카메라로 통일하고
+    기존 이미지의 카메라는 건드리지 않음.
+    COLMAP 3.12부터는 카메라마다 rig, 이미지마다 frame/frame_data가 있으므로 새 이미지의 frame도
+    유지할 카메라의 rig로 옮기고, 쓰이지 않게 된 카메라와 그 rig를 삭제.
+    (그 외 모드에서는 COLMAP이 원래 이미지별로 카메라를 만들므로 그대로 둠)
+    """
+    connection = sqlite3.connect(str(database_path))
+    try:
+        names = set(image_names)
+        added = [(image_id, camera_id) for image_id, name, camera_id in connection.execute(
+            "SELECT image_id, name, camera_id FROM images ORDER BY image_id") if name in names]
+        if not added:
+            return 0
+        keep = added[0][1]
+        merged = {camera_id for _, camera_id in added} - {keep}
+        if not merged:
+            return 0
+        image_ids = [(image_id,) for image_id, _ in added]
+        removed = 0
+        with connection:
+            connection.executemany(f"UPDATE images SET camera_id = {int(keep)} WHERE image_id = ?", image_ids)
+            if _has_table(connection, "frame_data"):
+                connection.executemany(
+                    f"UPDATE frame_data SET sensor_id = {int(keep)} "
+                    f"WHERE data_id = ? AND sensor_type = {CAMERA_SENSOR_TYPE}", image_ids)
+                keep_rig = connection.execute(
+                    "SELECT rig_id FROM rigs WHERE ref_sensor_id = ? AND ref_sensor_type = ?",
+                    (keep, CAMERA_SENSOR_TYPE)).fetchone()
+                if keep_rig is not None:
+                    connection.executemany(
+                        f"UPDATE frames SET rig_id = {int(keep_rig[0])} WHERE frame_id IN "
+                        f"(SELECT frame_id FROM frame_data WHERE data_id = ? "
+                        f"AND sensor_type = {CAMERA_SENSOR_TYPE})", image_ids)
+            for camera_id in sorted(merged):
+                # 기존 이미지가 아직 쓰는 카메라는 남김
+                if connection.execute("SELECT 1 FROM images WHERE camera_id = ?", (camera_id,)).fetchone():
+                    continue
+                if _has_table(connection, "rigs"):
+                    rig_ids = [row[0] for row in connection.execute(
+                        "SELECT rig_id FROM rigs WHERE ref_sensor_id = ? AND ref_sensor_type = ? "
+                        "AND rig_id NOT IN (SELECT rig_id FROM frames)",
+                        (camera_id, CAMERA_SENSOR_TYPE))]
+                    connection.executemany("DELETE FROM rig_sensors WHERE rig_id = ?", [(r,) for r in rig_ids])
+                    connection.executemany("DELETE FROM rigs WHERE rig_id = ?", [(r,) for r in rig_ids])
+                    connection.execute("DELETE FROM rig_sensors WHERE sensor_id = ? AND sensor_type = ?",
+                                       (camera_id, CAMERA_SENSOR_TYPE))
+                connection.execute("DELETE FROM cameras WHERE camera_id = ?", (camera_id,))
+                removed += 1
+        return removed
+    finally:
+        connection.close()
+
+
+class _ShardProgress:
+    """Aggregate per-shard progress into one overall ColmapProgress"""
+
+    def __init__(self, total, callback):
+        self.progress = ColmapProgress("feature_extractor", total=total)
+        self.callback = callback
+        self._current = {}
+        self._lock = threading.Lock()
+
+    def for_shard(self, shard_index):
+        def _callback(shard_progress):
+            with self._lock:
+                self._current[shard_index] = shard_progress.current
+                self.progress.update("extraction", sum(self._current.values()))
+                if self.callback is not None:
+                    self.callback(self.progress)
+        return _callback
+
+
+def _merge_pair(run_command, db1, db2, merged, log_dir):
+    run_command(
+        [
+            "database_merger",
+            "--database_path1", str(db1),
+            "--database_path2", str(db2),
+            "--merged_database_path", str(merged),
+        ],
+        log_path=Path(log_dir) / f"database_merger.{Path(merged).stem}.log",
+    )
+    return merged
+
+
+def merge_databases(run_command, database_paths, output_path, work_dir, max_workers=None):
+    """Merge databases in order with a parallel pairwise tree reduction
+
+    순서를 유지하며 (0,1), (2,3), ... 단위로 병합하므로 ID는 입력 순서대로 부여됨
+    """
+    work_dir = Path(work_dir)
+    level = 0
+    current = [Path(p) for p in database_paths]
+    while len(current) > 1:
+        pairs = [current[i:i + 2] for i in range(0, len(current), 2)]
+        with ThreadPoolExecutor(max_workers=max_workers or len(pairs)) as pool:
+            futures = []
+            for i, pair in enumerate(pairs):
+                if len(pair) == 1:
+                    futures.append(None)
+                    continue
+                merged = work_dir / f"merge_l{level}_{i}.db"
+                if merged.exists():
+                    merged.unlink()
+                futures.append(pool.submit(_merge_pair, run_command, pair[0], pair[1],
+                                           merged, work_dir / "logs"))
+            current = [pair[0] if future is None else future.result()
+                       for pair, future in zip(pairs, futures)]
+        level += 1
+
+    tmp_output = Path(f"{output_path}.merging")
+    shutil.copyfile(current[0], tmp_output)
+    os.replace(tmp_output, output_path)
+    return Path(output_path)
+
+
+def run_sharded_extraction(run_command, database_path, image_path, extra_args,
+                           num_shards, image_names=None, num_threads=None,
+                           single_camera=False, progress_callback=None, keep_shards=False):
+    """Run feature_extractor in ``num_shards`` parallel processes and merge the results
+
+    run_command(cmd, log_path=..., progress_callback=...) runs a COLMAP subcommand
+    (pycolmap stub의 _run_colmap_command). extra_args are the feature_extractor
+    arguments other than database/image paths.
+    """
+    database_path = Path(database_path)
+    if image_names is None:
+        image_names = list_images(image_path)
+    # feature_extractor와 동일하게 이미 등록된 이미지는 건너뜀 (병합 시 name 중복 방지)
+    existing_names = existing_image_names(database_path)
+    image_names = [name for name in image_names if name not in existing_names]
+    if not image_names:
+        print("Sharded extraction: all images already in database, nothing to do")
+        return database_path
+    shards = split_shards(image_names, num_shards)
+    if num_threads is None:
+        # shard 당 스레드 수를 제한하여 코어 과다 할당 방지
+        num_threads = max(1, (os.cpu_count() or 1) // len(shards))
+
+    work_dir = database_path.parent / f"{database_path.stem}_shards"
+    if work_dir.exists():
+        shutil.rmtree(work_dir)
+    (work_dir / "logs").mkdir(parents=True)
+
+    print(f"Sharded extraction: {len(image_names)} images in {len(shards)} shards "
+          f"x {num_threads} threads")
+
+    aggregate = _ShardProgress(len(image_names), progress_callback)
+
+    def _extract(index, names):
+        shard_db = work_dir / f"shard_{index:03d}.db"
+        list_file = write_image_list(work_dir / f"shard_{index:03d}.txt", names)
+        cmd = [
+            "feature_extractor",
+            "--database_path", str(shard_db),
+            "--image_path", str(image_path),
+            "--ImageReader.image_list_path", str(list_file),
+            "--SiftExtraction.num_threads", str(num_threads),
+        ] + list(extra_args)
+        run_command(cmd, log_path=work_dir / "logs" / f"feature_extractor.shard_{index:03d}.log",
+                    progress_callback=aggregate.for_shard(index))
+        return shard_db
+
+    with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+        shard_dbs = list(pool.map(_extract, range(len(shards)), shards))
+
+    # 기존 database에 이미지가 있으면 병합 대상 맨 앞에 둔다 (기존 ID 유지)
+    inputs = shard_dbs
+    if existing_names:
+        existing = work_dir / "existing.db"
+        shutil.copyfile(database_path, existing)
+        inputs = [existing] + shard_dbs
+
+    merge_databases(run_command, inputs, database_path, work_dir)
+    if single_camera:
+        removed = unify_cameras(database_path, image_names)
+        if removed:
+            print(f"Merged {removed} duplicated shard cameras")
+
+    if not keep_shards:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return database_path
@@ -9,6 +9,10 @@ import os
 import shutil
 from pathlib import Path
 
+# 패키지 위치는 import 없이 patch_engine의 resolver로 찾음
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'patches'))
+from patch_engine import package_root, site_packages
+
 
 def create_pycolmap_stub():
     """최소한의 pycolmap 호환성 모듈 생성"""
@@ -32,14 +36,15 @@ def create_pycolmap_stub():
                 
         except ImportError:
             print("pycolmap not found, creating minimal version")
-            pycolmap_path = Path("/usr/local/lib/python3.10/site-packages/pycolmap")
+            pycolmap_path = site_packages('hloc') / "pycolmap"
         
         # 호환성 stub 내용
-        stub_content = '''"""
+        stub_content = r'''"""
 pycolmap compatibility stub for COLMAP binary mode
 This module provides minimal compatibility when pycolmap C++ backend fails
 """
 
+import importlib
 import os
 import subprocess
 from enum import Enum
@@ -47,6 +52,16 @@ from pathlib import Path
 
 __version__ = "3.12.4-stub"
 
+def _helper(name):
+    """colmap_binary.<name>, or None when the helper package is not installed
+    
+    (없으면 로그 스트리밍/증분 import/shard 없이 subprocess.run으로 동작)
+    """
+    try:
+        return importlib.import_module(f"colmap_binary.{name}")
+    except ImportError:
+        return None
+
 # Camera models enum
 class CameraMode(Enum):
     AUTO = 0
@@ -68,6 +83,9 @@ class SiftExtractionOptions:
         self.max_num_features = 8192
         self.first_octave = -1
         self.num_octaves = 4
+        # >1이면 이미지 목록을 나누어 feature_extractor를 병렬 실행 후 병합
+        self.num_shards = int(os.environ.get('COLMAP_EXTRACTION_SHARDS', '1'))
+        self.num_threads = -1  # shard 당 스레드 수 (-1: cpu_count / num_shards)
 
 class SiftMatchingOptions:
     def __init__(self):
@@ -76,25 +94,185 @@ class SiftMatchingOptions:
         self.cross_check = True
         self.max_error = 4.0
 
+# Pairing strategies: each options class selects a COLMAP matcher and maps
+# its attributes to --<prefix>.<name> flags (bool -> 1/0, None -> omitted)
+class _PairingOptions:
+    matcher = None
+    prefix = None
+    required = ()
+    
+    def to_args(self):
+        for name in self.required:
+            if getattr(self, name) is None:
+                raise ValueError(f"{type(self).__name__}.{name} is required for {self.matcher}")
+        args = []
+        for name, value in vars(self).items():
+            if value is None:
+                continue
+            if isinstance(value, bool):
+                value = int(value)
+            flag = f"--{self.prefix}.{name}" if self.prefix else f"--{name}"
+            args.extend([flag, str(value)])
+        return args
+
+class ExhaustiveMatchingOptions(_PairingOptions):
+    """All pairs, O(N^2) - only for small scenes"""
+    matcher = "exhaustive_matcher"
+    prefix = "ExhaustiveMatching"
+    
+    def __init__(self):
+        self.block_size = 50
+
+class SequentialMatchingOptions(_PairingOptions):
+    """Video frames: each image is matched with its next `overlap` images"""
+    matcher = "sequential_matcher"
+    prefix = "SequentialMatching"
+    
+    def __init__(self):
+        self.overlap = 10
+        self.quadratic_overlap = True  # also match i+2, i+4, i+8, ...
+        self.loop_detection = False  # requires vocab_tree_path
+        self.loop_detection_period = 10
+        self.loop_detection_num_images = 50
+        self.vocab_tree_path = None
+    
+    def to_args(self):
+        # COLMAP은 vocab tree 없이 loop detection을 켜면 매칭 도중에야 실패하므로 미리 거부
+        if self.loop_detection and self.vocab_tree_path is None:
+            raise ValueError("SequentialMatchingOptions.loop_detection requires vocab_tree_path")
+        return super().to_args()
+
+class SpatialMatchingOptions(_PairingOptions):
+    """Nearest neighbors by GPS/EXIF location priors"""
+    matcher = "spatial_matcher"
+    prefix = "SpatialMatching"
+    
+    def __init__(self):
+        # is_gps는 COLMAP 3.11에서 제거됨 (좌표계는 DB에 저장된 pose prior에서 결정)
+        self.ignore_z = True
+        self.max_num_neighbors = 50
+        self.max_distance = 100.0
+
+class VocabTreeMatchingOptions(_PairingOptions):
+    """Image retrieval with a visual vocabulary tree"""
+    matcher = "vocab_tree_matcher"
+    prefix = "VocabTreeMatching"
+    required = ("vocab_tree_path",)
+    
+    def __init__(self):
+        self.vocab_tree_path = os.environ.get('COLMAP_VOCAB_TREE_PATH')
+        self.num_images = 100
+        self.num_nearest_neighbors = 5
+
+class ImagePairsMatchingOptions(_PairingOptions):
+    """Explicit pairs file ("name1 name2" per line, e.g. hloc pairs-*.txt)"""
+    matcher = "matches_importer"
+    prefix = None
+    required = ("match_list_path",)
+    
+    def __init__(self, match_list_path=None):
+        self.match_list_path = match_list_path
+        self.match_type = "pairs"
+
+# Progress reporting (global hook so schedulers can observe hloc-driven runs)
+_progress_callback = None  # 첫 실행 시 colmap_binary.runner.ProgressPrinter
+
+def set_progress_callback(callback):
+    """Register a callback(progress) called for every parsed COLMAP progress line"""
+    global _progress_callback
+    _progress_callback = callback
+
+def _default_progress_callback():
+    global _progress_callback
+    if _progress_callback is None:
+        runner = _helper("runner")
+        if runner is not None:
+            _progress_callback = runner.ProgressPrinter()
+    return _progress_callback
+
+def _write_image_list(path, image_names):
+    """Write an image list file for --ImageReader.image_list_path"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        for name in image_names:
+            f.write(f"{name}\n")
+    return path
+
+def _default_log_path(cmd):
+    """Log file for a command: $COLMAP_LOG_DIR or <database dir>/logs"""
+    if not isinstance(cmd, list) or not cmd:
+        return None
+    log_dir = os.environ.get('COLMAP_LOG_DIR')
+    if log_dir is None and "--database_path" in cmd:
+        database_path = cmd[cmd.index("--database_path") + 1]
+        log_dir = Path(database_path).parent / "logs"
+    if log_dir is None:
+        return None
+    return Path(log_dir) / f"{cmd[0]}.log"
+
 # COLMAP binary wrapper functions
-def _run_colmap_command(cmd, check=True):
-    """Run COLMAP binary command"""
+def _run_colmap_command(cmd, check=True, log_path=None, progress_callback=None, total=None):
+    """Run COLMAP binary command, streaming its log instead of buffering it"""
     colmap_bin = os.environ.get('COLMAP_EXE_PATH', '/usr/local/bin/colmap')
     if not os.path.exists(colmap_bin):
         raise RuntimeError(f"COLMAP binary not found at {colmap_bin}")
     
     full_cmd = [colmap_bin] + cmd if isinstance(cmd, list) else f"{colmap_bin} {cmd}"
+    if log_path is None:
+        log_path = _default_log_path(cmd)
     
+    runner = _helper("runner")
     try:
-        result = subprocess.run(full_cmd, shell=isinstance(full_cmd, str), 
-                              capture_output=True, text=True, check=check)
-        return result
+        if runner is None:
+            return subprocess.run(full_cmd, shell=isinstance(full_cmd, str),
+                                  capture_output=True, text=True, check=check)
+        return runner.run_colmap_streaming(
+            full_cmd, log_path=log_path, total=total, check=check,
+            progress_callback=progress_callback or _default_progress_callback(),
+        )
     except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"COLMAP command failed: {e}")
+        raise RuntimeError(f"COLMAP command failed: {e}\n{e.output}")
+
+def _run_feature_extractor(database_path, image_path, args, num_shards=1, num_threads=-1,
+                           single_camera=False, image_names=None, progress_callback=None):
+    """Run feature_extractor once, or sharded across processes when num_shards > 1
+    
+    image_names (optional) restricts extraction to a staged image list
+    """
+    sharding = _helper("sharding")
+    if num_shards <= 1 or sharding is None:
+        cmd = [
+            "feature_extractor",
+            "--database_path", str(database_path),
+            "--image_path", str(image_path),
+        ] + args
+        if image_names is not None:
+            database_path = Path(database_path)
+            list_file = _write_image_list(
+                database_path.parent / f"{database_path.stem}.image_list.txt", image_names)
+            cmd.extend(["--ImageReader.image_list_path", str(list_file)])
+        if num_threads > 0:
+            cmd.extend(["--SiftExtraction.num_threads", str(num_threads)])
+        return _run_colmap_command(cmd, progress_callback=progress_callback,
+                                   total=len(image_names) if image_names is not None else None)
+    
+    return sharding.run_sharded_extraction(
+        _run_colmap_command, database_path, image_path, args,
+        num_shards=num_shards,
+        image_names=image_names,
+        num_threads=num_threads if num_threads > 0 else None,
+        single_camera=single_camera,
+        progress_callback=progress_callback or _default_progress_callback(),
+    )
 
 def import_images(database_path, image_path, camera_mode=CameraMode.AUTO, 
-                 image_list=None, options=None):
-    """Import images using COLMAP binary"""
+                 image_list=None, options=None, progress_callback=None):
+    """Import images using COLMAP binary
+    
+    Only the images in image_list (all images when empty) are imported, and
+    images whose name and content hash are already in the database are skipped.
+    """
     if image_list is None:
         image_list = []
     if options is None:
@@ -102,50 +280,97 @@ def import_images(database_path, image_path, camera_mode=CameraMode.AUTO,
     
     print(f"Importing images via COLMAP binary: {database_path} <- {image_path}")
     
-    cmd = [
-        "feature_extractor",
-        "--database_path", str(database_path),
-        "--image_path", str(image_path),
-        "--ImageReader.camera_model", options.camera_model,
-    ]
+    image_names = [str(name) for name in image_list] or None
+    plan = None
+    incremental, sharding = _helper("incremental"), _helper("sharding")
+    if incremental is not None and sharding is not None:
+        image_names = image_names or sharding.list_images(image_path)
+        plan = incremental.plan_incremental_import(database_path, image_path, image_names)
+        print(f"  {len(plan.to_import)} to import ({len(plan.changed)} changed), "
+              f"{len(plan.unchanged)} already in database")
+        if not plan.to_import:
+            # 처음 기록되는 기존 이미지/mtime만 바뀐 이미지의 해시는 가져올 것이 없어도 저장
+            incremental.record_hashes(database_path, plan.hashes)
+            return None
+        image_names = plan.to_import
     
-    if camera_mode == CameraMode.SINGLE:
-        cmd.extend(["--ImageReader.single_camera", "1"])
+    args = ["--ImageReader.camera_model", options.camera_model]
     
-    return _run_colmap_command(cmd)
+    single_camera = camera_mode == CameraMode.SINGLE
+    if single_camera:
+        args.extend(["--ImageReader.single_camera", "1"])
+    
+    num_shards = int(os.environ.get('COLMAP_EXTRACTION_SHARDS', '1'))
+    if plan is None:
+        return _run_feature_extractor(database_path, image_path, args,
+                                      num_shards=num_shards, single_camera=single_camera,
+                                      image_names=image_names,
+                                      progress_callback=progress_callback)
+    # 내용이 바뀐 이미지의 기존 행은 추출 직전에 지우고, 추출이 실패하면 db를 되돌림
+    with incremental.replacing_images(database_path, plan.stale_ids):
+        result = _run_feature_extractor(database_path, image_path, args,
+                                        num_shards=num_shards, single_camera=single_camera,
+                                        image_names=image_names,
+                                        progress_callback=progress_callback)
+    # sharded 병합은 COLMAP 테이블만 복사하므로 기록은 항상 추출 이후에 저장
+    incremental.record_hashes(database_path, plan.hashes)
+    return result
 
-def extract_features(database_path, image_path, options=None):
+def extract_features(database_path, image_path, options=None, progress_callback=None):
     """Extract features using COLMAP binary"""
     if options is None:
         options = SiftExtractionOptions()
     
     print(f"Extracting features via COLMAP binary")
     
-    cmd = [
-        "feature_extractor",
-        "--database_path", str(database_path),
-        "--image_path", str(image_path),
+    args = [
         "--SiftExtraction.max_image_size", str(options.max_image_size),
         "--SiftExtraction.max_num_features", str(options.max_num_features),
     ]
     
-    return _run_colmap_command(cmd)
+    return _run_feature_extractor(database_path, image_path, args,
+                                  num_shards=options.num_shards,
+                                  num_threads=options.num_threads,
+                                  progress_callback=progress_callback)
 
-def match_features(database_path, options=None):
-    """Match features using COLMAP binary"""
+def match_features(database_path, options=None, pairing_options=None, progress_callback=None):
+    """Match features using COLMAP binary
+    
+    pairing_options selects the matcher (ExhaustiveMatchingOptions by default,
+    SequentialMatchingOptions / SpatialMatchingOptions / VocabTreeMatchingOptions /
+    ImagePairsMatchingOptions otherwise)
+    """
     if options is None:
         options = SiftMatchingOptions()
+    if pairing_options is None:
+        pairing_options = ExhaustiveMatchingOptions()
     
-    print(f"Matching features via COLMAP binary")
+    print(f"Matching features via COLMAP binary ({pairing_options.matcher})")
     
     cmd = [
-        "exhaustive_matcher",
+        pairing_options.matcher,
         "--database_path", str(database_path),
         "--SiftMatching.max_ratio", str(options.max_ratio),
         "--SiftMatching.max_distance", str(options.max_distance),
-    ]
+    ] + pairing_options.to_args()
     
-    return _run_colmap_command(cmd)
+    return _run_colmap_command(cmd, progress_callback=progress_callback)
+
+# pycolmap-style matcher entry points
+def match_exhaustive(database_path, sift_options=None, matching_options=None):
+    return match_features(database_path, sift_options, matching_options or ExhaustiveMatchingOptions())
+
+def match_sequential(database_path, sift_options=None, matching_options=None):
+    return match_features(database_path, sift_options, matching_options or SequentialMatchingOptions())
+
+def match_spatial(database_path, sift_options=None, matching_options=None):
+    return match_features(database_path, sift_options, matching_options or SpatialMatchingOptions())
+
+def match_vocabtree(database_path, sift_options=None, matching_options=None):
+    return match_features(database_path, sift_options, matching_options or VocabTreeMatchingOptions())
+
+def match_pairs(database_path, match_list_path, sift_options=None):
+    return match_features(database_path, sift_options, ImagePairsMatchingOptions(match_list_path))
 
 # C++ backend stub (always fails gracefully)
 class _CoreStub:
@@ -180,6 +405,97 @@ print("🔧 pycolmap running in COLMAP binary compatibility mode")
         return False
 
 
+def install_colmap_binary_package():
+    """stub이 사용하는 colmap_binary 보조 패키지를 site-packages에 설치"""
+    print("Installing colmap_binary helper package...")
+    
+    src_dir = Path(__file__).resolve().parent / "colmap_binary"
+    if not src_dir.exists():
+        print(f"❌ colmap_binary package not found: {src_dir}")
+        print("  pycolmap stub will run COLMAP via plain subprocess (no log streaming / incremental import)")
+        return False
+    
+    try:
+        # pycolmap stub과 같은 site-packages에 설치
+        site_dir = site_packages('pycolmap')
+        
+        dst_dir = site_dir / "colmap_binary"
+        if dst_dir.exists():
+            shutil.rmtree(dst_dir)
+        shutil.copytree(src_dir, dst_dir, ignore=shutil.ignore_patterns("__pycache__", "*.pyc"))
+        
+        print(f"✅ colmap_binary installed at: {dst_dir}")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Failed to install colmap_binary: {e}")
+        print("  pycolmap stub will run COLMAP via plain subprocess (no log streaming / incremental import)")
+        return False
+
+
+# hloc 모듈 끝에 덧붙이는 훅: (모듈 파일, 마커, 재정의할 함수, 코드)
+# hloc 내부에서는 모듈 실행이 끝난 뒤 함수를 가져가므로 재정의가 그대로 적용됨
+HLOC_HOOKS = [
+    ("triangulation.py", "COLMAP_BULK_MATCH_IMPORT_PATCH", "import_matches", '''
+# COLMAP_BULK_MATCH_IMPORT_PATCH - colmap_binary.match_import로 matches 대량 적재
+try:
+    from colmap_binary.match_import import import_matches as _bulk_import_matches
+except ImportError:
+    _bulk_import_matches = None
+
+if _bulk_import_matches is not None:
+    def import_matches(*args, **kwargs):
+        return _bulk_import_matches(*args, **kwargs)
+'''),
+    ("extract_features.py", "HLOC_FEATURE_CACHE_PATCH", "main", '''
+# HLOC_FEATURE_CACHE_PATCH - HLOC_CACHE의 content-addressed 특징점 캐시를 먼저 조회
+try:
+    from colmap_binary.feature_cache import cached_extract as _cached_extract
+except ImportError:
+    _cached_extract = None
+
+if _cached_extract is not None:
+    _uncached_main = main
+
+    def main(conf, image_dir, export_dir=None, as_half=True, image_list=None,
+             feature_path=None, overwrite=False):
+        return _cached_extract(_uncached_main, ImageDataset, conf, image_dir, export_dir,
+                               as_half, image_list, feature_path, overwrite)
+'''),
+]
+
+
+def patch_hloc_hooks():
+    """hloc 함수를 colmap_binary 구현(bulk match import, feature cache)으로 교체"""
+    print("Patching hloc hooks (bulk match import, feature cache)...")
+    
+    hloc_dir = package_root("hloc")
+    if hloc_dir is None:
+        print("⚠ hloc not installed, skipping hloc hooks")
+        return True  # hloc 없이도 binary mode 자체는 동작
+    
+    success = True
+    for filename, marker, function, code in HLOC_HOOKS:
+        target = hloc_dir / filename
+        try:
+            content = target.read_text()
+            if marker in content:
+                print(f"✓ hloc {filename} already patched")
+                continue
+            if f"def {function}(" not in content:
+                print(f"⚠ {function} not found in hloc {filename}, skipping")
+                continue
+            
+            target.write_text(content.rstrip("\n") + "\n\n" + code)
+            print(f"✅ Patched hloc {filename} ({function})")
+            
+        except Exception as e:
+            print(f"❌ Failed to patch hloc {filename}: {e}")
+            success = False
+    
+    return success
+
+
 def configure_environment():
     """COLMAP 바이너리 모드를 위한 환경 설정"""
     print("Configuring environment for COLMAP binary mode...")
@@ -250,7 +566,9 @@ def main():
     print("=" * 40)
     
     success = True
+    success &= install_colmap_binary_package()
     success &= create_pycolmap_stub()
+    success &= patch_hloc_hooks()
     success &= configure_environment()
     success &= test_colmap_binary()
     
@@ -1,79 +1,116 @@
 #!/usr/bin/env python3
 """
 모델 파일 검증 스크립트
-사전 다운로드된 모델들이 올바른 위치에 있는지 확인
+사전 다운로드된 모델들이 올바른 위치에 있고 고정된 크기/sha256과 일치하는지 확인
+(고정 값이 없으면 파일명의 hash prefix, 그것도 없으면 빌드 시 manifest 값과 대조하고 그렇게 출력)
+(sha256은 스레드 풀에서 병렬로 계산하고 (inode, size, mtime) 키 캐시로 바뀐 파일만 다시 해시)
+
+Usage:
+    python verify-models.py [--fast | --full] [--json [PATH]]
+      (기본)  캐시된 해시를 재사용하는 증분 sha256 검증
+      --fast  존재 여부와 크기만 확인
+      --full  캐시를 무시하고 모든 파일을 다시 해시
+    python verify-models.py --benchmark [NAME ...] [--runs N] [--cold-runs N] [--json [PATH]]
+      모델별 체크포인트 로드 / 모듈 생성 / 첫 CPU forward 시간 (cold: 새 프로세스 + page cache 비움)
 """
 
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
 import sys
+import time
 from pathlib import Path
 
+# 모델 목록/위치는 patches/model_registry.py의 manifest 인덱스를 사용
+sys.path.insert(0, str(Path(__file__).parent.parent / 'patches'))
+from model_registry import HashCache, ModelRegistry, check_model, reference_digest
+from patch_engine import module_file, package_file
 
-def verify_torch_models():
-    """PyTorch hub 모델 파일들 검증 (LightGlue, AlexNet 등)"""
-    print("=== Verifying PyTorch hub models ===")
+
+def _verify_registry_models(registry, kind, mode="incremental", hash_cache=None, results=None):
+    """registry에 등록된 kind 종류의 모델을 고정 값(없으면 manifest)과 대조 - 실패한 파일 목록 반환"""
+    failed_models = []
+    entries = [(entry, registry.find(entry["file"])) for entry in registry.models(kind)]
     
-    cache_dir = Path("/home/user/.cache/torch/hub/checkpoints")
-    required_models = [
-        "superpoint_lightglue.pth",
-        "disk_lightglue.pth", 
-        "aliked_lightglue.pth",
-        "sift_lightglue.pth",
-        "superpoint_v1.pth",
-        "alexnet-owt-7be5be79.pth"  # ns-train에서 사용
-    ]
+    digests = {}
+    if mode != "fast":
+        hash_cache = hash_cache or HashCache()
+        digests = hash_cache.hash_files([path for _, path in entries if path is not None],
+                                        use_cache=(mode != "full"))
     
-    if not cache_dir.exists():
-        print(f"❌ Cache directory not found: {cache_dir}")
-        return False
+    for entry, model_path in entries:
+        result = {"name": entry["name"], "file": entry["file"], "kind": kind,
+                  "path": str(model_path) if model_path else None}
+        if model_path is None:
+            result["status"] = "missing"
+            print(f"  ❌ {entry['file']}: NOT FOUND")
+        else:
+            size = model_path.stat().st_size
+            result["size"] = size
+            size_mb = size / (1024 * 1024)
+            digest = digests.get(model_path.resolve())
+            if digest is not None:
+                result["sha256"] = digest
+            
+            status, detail = check_model(entry, size, digest)
+            if mode == "fast" and status == "unverified":
+                status = "ok"  # --fast는 크기만 확인
+            result["status"] = status
+            result["reference"] = reference_digest(entry)[2]
+            if status in ("size_mismatch", "checksum_mismatch"):
+                print(f"  ❌ {entry['file']}: {size_mb:.1f} MB, {detail}")
+            elif status == "unverified":
+                print(f"  ⚠ {entry['file']}: {size_mb:.1f} MB ({detail})")
+            else:
+                if digest is None:
+                    check = "size ok"
+                elif detail == "manifest":
+                    # 빌드 시 manifest 값은 빌드 이후의 변경만 잡으므로 결과에 명시
+                    check = "sha256 ok vs build-time manifest only (no download record)"
+                else:
+                    check = f"sha256 ok vs {detail}"
+                print(f"  ✓ {entry['file']}: {size_mb:.1f} MB, {check} ({model_path.parent})")
+        
+        if result["status"] not in ("ok", "unverified"):
+            failed_models.append(entry["file"])
+        if results is not None:
+            results.append(result)
+    
+    return failed_models
+
+def verify_torch_models(registry=None, mode="incremental", hash_cache=None, results=None):
+    """PyTorch hub 모델 파일들 검증 (LightGlue, AlexNet 등)"""
+    print("=== Verifying PyTorch hub models ===")
     
-    print(f"Cache directory: {cache_dir}")
-    missing_models = []
+    registry = registry or ModelRegistry()
+    if registry.manifest_path.exists():
+        print(f"Manifest: {registry.manifest_path}")
+    else:
+        print(f"⚠ Manifest not found: {registry.manifest_path} (searching roots directly)")
     
-    for model in required_models:
-        model_path = cache_dir / model
-        if model_path.exists():
-            size_mb = model_path.stat().st_size / (1024 * 1024)
-            print(f"  ✓ {model}: {size_mb:.1f} MB")
-        else:
-            print(f"  ❌ {model}: NOT FOUND")
-            missing_models.append(model)
+    failed_models = _verify_registry_models(registry, "torch", mode, hash_cache, results)
     
-    if missing_models:
-        print(f"\n⚠ WARNING: Missing models: {missing_models}")
+    if failed_models:
+        print(f"\n⚠ WARNING: Missing or corrupt models: {failed_models}")
         return False
     
     print("✅ All PyTorch hub models verified")
     return True
 
 
-def verify_netvlad_models():
+def verify_netvlad_models(registry=None, mode="incremental", hash_cache=None, results=None):
     """NetVLAD 모델 파일들 검증"""
     print("\n=== Verifying NetVLAD models ===")
     
-    netvlad_dir = Path("/home/user/.cache/torch/hub/netvlad")
-    required_models = [
-        "VGG16-NetVLAD-Pitts30K.mat",
-        "VGG16-NetVLAD-TokyoTM.mat"
-    ]
+    registry = registry or ModelRegistry()
+    failed_models = _verify_registry_models(registry, "netvlad", mode, hash_cache, results)
     
-    if not netvlad_dir.exists():
-        print(f"❌ NetVLAD directory not found: {netvlad_dir}")
-        return False
-    
-    print(f"NetVLAD directory: {netvlad_dir}")
-    missing_models = []
-    
-    for model in required_models:
-        model_path = netvlad_dir / model
-        if model_path.exists():
-            size_mb = model_path.stat().st_size / (1024 * 1024)
-            print(f"  ✓ {model}: {size_mb:.1f} MB")
-        else:
-            print(f"  ❌ {model}: NOT FOUND")
-            missing_models.append(model)
-    
-    if missing_models:
-        print(f"\n⚠ WARNING: Missing NetVLAD models: {missing_models}")
+    if failed_models:
+        print(f"\n⚠ WARNING: Missing or corrupt NetVLAD models: {failed_models}")
         return False
     
     print("✅ All NetVLAD models verified")
@@ -86,10 +123,11 @@ def verify_patches():
     
     patch_checks = []
     
-    # LightGlue 패치 확인
+    # LightGlue 패치 확인 (패치 마커만 보므로 import 없이 파일 위치만 찾음)
     try:
-        import lightglue
-        lg_file = Path(lightglue.__file__).parent / 'lightglue.py'
+        lg_file = package_file('lightglue', 'lightglue.py')
+        if lg_file is None:
+            raise FileNotFoundError("lightglue/lightglue.py not found")
         with open(lg_file, 'r') as f:
             content = f.read()
         if 'LIGHTGLUE_OFFLINE_PATCH' in content:
@@ -104,8 +142,9 @@ def verify_patches():
     
     # hloc LightGlue 패치 확인
     try:
-        import hloc.matchers.lightglue as hloc_lg
-        hloc_file = Path(hloc_lg.__file__)
+        hloc_file = module_file('hloc.matchers.lightglue')
+        if hloc_file is None:
+            raise FileNotFoundError("hloc/matchers/lightglue.py not found")
         with open(hloc_file, 'r') as f:
             hloc_content = f.read()
         if 'HLOC_LIGHTGLUE_OFFLINE_PATCH' in hloc_content:
@@ -120,10 +159,12 @@ def verify_patches():
     
     # pycolmap 패치 확인 (문법 오류 허용)
     try:
-        import hloc.reconstruction as hloc_recon
-        recon_file = Path(hloc_recon.__file__)
+        recon_file = module_file('hloc.reconstruction')
+        if recon_file is None:
+            raise FileNotFoundError("hloc/reconstruction.py not found")
         with open(recon_file, 'r') as f:
             content = f.read()
+        compile(content, str(recon_file), 'exec')
         if 'PYCOLMAP_COMPATIBILITY_PATCH' in content or 'COLMAP_BINARY_FALLBACK_PATCH' in content:
             print("  ✓ pycolmap compatibility patch is active")
             patch_checks.append(True)
@@ -149,15 +190,22 @@ def verify_patches():
         return False
 
 
-def main():
-    """메인 검증 함수"""
-    print("=== Model and Patch Verification ===")
+def run_verification(mode="incremental"):
+    """모든 검증 실행 - (통과 여부, JSON 보고서) 반환"""
+    print(f"=== Model and Patch Verification ({mode}) ===")
     
+    start = time.perf_counter()
+    registry = ModelRegistry()
+    hash_cache = HashCache() if mode != "fast" else None
+    model_results = []
     results = [
-        verify_torch_models(),
-        verify_netvlad_models(), 
+        verify_torch_models(registry, mode, hash_cache, model_results),
+        verify_netvlad_models(registry, mode, hash_cache, model_results), 
         verify_patches()
     ]
+    if hash_cache is not None:
+        hash_cache.save()
+        print(f"\nsha256: {hash_cache.hashed} hashed, {hash_cache.cached} from cache ({hash_cache.path})")
     
     success_count = sum(results)
     total_count = len(results)
@@ -165,12 +213,232 @@ def main():
     print(f"\n=== Verification Summary ===")
     print(f"Passed: {success_count}/{total_count} checks")
     
+    report = {
+        "mode": mode,
+        "passed": all(results),
+        "checks": {"torch_models": results[0], "netvlad_models": results[1], "patches": results[2]},
+        "models": model_results,
+        "hashed": hash_cache.hashed if hash_cache else 0,
+        "cached": hash_cache.cached if hash_cache else 0,
+        "manifest": str(registry.manifest_path),
+        "elapsed_sec": round(time.perf_counter() - start, 3),
+    }
+    
     if all(results):
         print("✅ All verifications passed!")
-        return True
+        return True, report
     else:
         print("❌ Some verifications failed!")
-        return False
+        return False, report
+
+
+def _lightglue_builder(features, descriptor_dim):
+    def build():
+        import torch
+        from lightglue import LightGlue
+        
+        model = LightGlue(features=features).eval()
+        
+        def synthetic_features(num_keypoints=1024):
+            data = {
+                "keypoints": torch.rand(1, num_keypoints, 2) * torch.tensor([640.0, 480.0]),
+                "descriptors": torch.nn.functional.normalize(torch.randn(1, num_keypoints, descriptor_dim), dim=-1),
+                "image_size": torch.tensor([[640.0, 480.0]]),
+            }
+            if features == "sift":
+                data["scales"] = torch.rand(1, num_keypoints) * 10
+                data["oris"] = torch.rand(1, num_keypoints) * 6.28
+            return data
+        
+        inputs = {"image0": synthetic_features(), "image1": synthetic_features()}
+        return lambda: model(inputs)
+    return build
+
+
+def _build_superpoint():
+    import torch
+    from lightglue import SuperPoint
+    
+    model = SuperPoint(max_num_keypoints=2048).eval()
+    image = torch.rand(1, 1, 480, 640)
+    return lambda: model({"image": image})
+
+
+def _netvlad_builder(model_name):
+    def build():
+        import torch
+        from hloc.extractors.netvlad import NetVLAD
+        
+        model = NetVLAD({"model_name": model_name, "whiten": True}).eval()
+        image = torch.rand(1, 3, 480, 640)
+        return lambda: model({"image": image})
+    return build
+
+
+def _build_alexnet():
+    import torch
+    from torchvision.models import AlexNet_Weights, alexnet
+    
+    model = alexnet(weights=AlexNet_Weights.IMAGENET1K_V1).eval()
+    image = torch.rand(1, 3, 224, 224)
+    return lambda: model(image)
+
+
+# registry 이름 -> 모듈 생성 함수 (생성 후 합성 입력으로 forward하는 callable 반환)
+BENCHMARK_BUILDERS = {
+    "superpoint": _build_superpoint,
+    "superpoint_lightglue": _lightglue_builder("superpoint", 256),
+    "disk_lightglue": _lightglue_builder("disk", 128),
+    "aliked_lightglue": _lightglue_builder("aliked", 128),
+    "sift_lightglue": _lightglue_builder("sift", 128),
+    "netvlad_pitts30k": _netvlad_builder("VGG16-NetVLAD-Pitts30K"),
+    "netvlad_tokyotm": _netvlad_builder("VGG16-NetVLAD-TokyoTM"),
+    "alexnet": _build_alexnet,
+}
+
+
+def _drop_page_cache(paths):
+    """cold run을 위해 모델 파일의 page cache를 비움 (root가 아니어도 되는 posix_fadvise 사용)"""
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+        except (OSError, AttributeError):
+            pass
+
+
+def _benchmark_child(name, runs):
+    """단일 프로세스에서 한 모델을 runs번 측정 - 첫 run이 cold, 나머지는 warm"""
+    start = time.perf_counter()
+    import torch
+    torch.set_grad_enabled(False)
+    import_sec = time.perf_counter() - start
+    
+    import offline_model_loader
+    registry = ModelRegistry()
+    entry = registry.get(name)
+    path = registry.resolve(name)
+    _drop_page_cache([path, path.with_suffix(".safetensors")])
+    
+    timings = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        if entry["kind"] == "netvlad":
+            from scipy.io import loadmat
+            offline_model_loader.load_netvlad_mat(path, loadmat, struct_as_record=False, squeeze_me=True)
+        else:
+            offline_model_loader.load_state_dict_from_url(entry["url"], map_location="cpu")
+        t1 = time.perf_counter()
+        forward = BENCHMARK_BUILDERS[name]()
+        t2 = time.perf_counter()
+        forward()
+        t3 = time.perf_counter()
+        timings.append({"load_sec": t1 - t0, "construct_sec": t2 - t1, "forward_sec": t3 - t2,
+                        "total_sec": t3 - t0})
+    return {"import_sec": import_sec, "runs": timings, "torch": torch.__version__}
+
+
+def _median_phases(runs):
+    if not runs:
+        return None
+    return {key: round(statistics.median(run[key] for run in runs), 4) for key in runs[0]}
+
+
+def run_benchmark(names=None, runs=3, cold_runs=1):
+    """모델별 time-to-first-inference 측정 - (성공 여부, JSON 보고서) 반환"""
+    print("=== Time-to-first-inference benchmark (CPU) ===")
+    
+    names = names or list(BENCHMARK_BUILDERS)
+    env = dict(os.environ, CUDA_VISIBLE_DEVICES="")
+    report = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+              "machine": platform.machine(), "warm_runs": runs, "cold_runs": cold_runs, "models": {}}
+    success = True
+    
+    for name in names:
+        if name not in BENCHMARK_BUILDERS:
+            print(f"  ❌ {name}: no benchmark defined")
+            report["models"][name] = {"error": "no benchmark defined"}
+            success = False
+            continue
+        
+        cold, warm, import_secs = [], [], []
+        error = None
+        for _ in range(cold_runs):
+            # 새 인터프리터에서 실행하여 import / 체크포인트 캐시 / page cache가 모두 비어 있는 상태로 시작
+            proc = subprocess.run(
+                [sys.executable, __file__, "--benchmark-child", name, "--runs", str(1 + runs)],
+                capture_output=True, text=True, env=env)
+            lines = [l for l in proc.stdout.splitlines() if l.startswith("BENCHMARK_RESULT ")]
+            if proc.returncode != 0 or not lines:
+                error = (proc.stderr.strip().splitlines() or ["unknown error"])[-1]
+                break
+            result = json.loads(lines[-1][len("BENCHMARK_RESULT "):])
+            report["torch"] = result["torch"]
+            import_secs.append(result["import_sec"])
+            cold.append(result["runs"][0])
+            warm.extend(result["runs"][1:])
+        
+        if error is not None:
+            print(f"  ❌ {name}: {error}")
+            report["models"][name] = {"error": error}
+            success = False
+            continue
+        
+        summary = {"import_sec": round(statistics.median(import_secs), 4),
+                   "cold": _median_phases(cold), "warm": _median_phases(warm),
+                   "cold_runs": cold, "warm_runs": warm}
+        report["models"][name] = summary
+        c, w = summary["cold"], summary["warm"] or summary["cold"]
+        print(f"  ✓ {name}: cold {c['total_sec']:.3f}s (load {c['load_sec']:.3f}, construct "
+              f"{c['construct_sec']:.3f}, forward {c['forward_sec']:.3f}), warm {w['total_sec']:.3f}s")
+    
+    if success:
+        print("✅ Benchmark complete")
+    else:
+        print("❌ Some models could not be benchmarked")
+    return success, report
+
+
+def _write_report(report, path):
+    if path == "-":
+        print(json.dumps(report, indent=2))
+    elif path:
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def main():
+    """메인 검증 함수"""
+    parser = argparse.ArgumentParser(description="Verify pre-downloaded models and patches")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--fast", action="store_true", help="check existence and size only")
+    group.add_argument("--full", action="store_true", help="re-hash every file, ignoring the cache")
+    group.add_argument("--benchmark", nargs="*", default=None, metavar="NAME",
+                       help="time-to-first-inference benchmark (all models if no NAME)")
+    group.add_argument("--benchmark-child", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--runs", type=int, default=3, help="warm runs per benchmark process")
+    parser.add_argument("--cold-runs", type=int, default=1, help="fresh processes per model")
+    parser.add_argument("--json", nargs="?", const="-", default=None, metavar="PATH",
+                        help="write a JSON report to PATH (or stdout)")
+    args = parser.parse_args()
+    mode = "fast" if args.fast else "full" if args.full else "incremental"
+    
+    if args.benchmark_child:
+        print("BENCHMARK_RESULT " + json.dumps(_benchmark_child(args.benchmark_child, args.runs)))
+        return True
+    
+    # --json만 지정하면 stdout에는 JSON만 출력하고 진행 메시지는 stderr로
+    with contextlib.redirect_stdout(sys.stderr) if args.json == "-" else contextlib.nullcontext():
+        if args.benchmark is not None:
+            success, report = run_benchmark(args.benchmark, args.runs, args.cold_runs)
+        else:
+            success, report = run_verification(mode)
+    _write_report(report, args.json)
+    
+    return success
 
 
 if __name__ == "__main__":
@@ -0,0 +1,525 @@
+#!/usr/bin/env python3
+"""
+viewer 부하 테스트 (headless)
+N개의 가상 클라이언트가 viewer websocket에 CameraMessage(패치된 스키마: aspect, render_height,
+render_width, fov, matrix, camera_type, is_moving, timestamp)로 카메라 경로를 재생하고
+프레임 왕복 지연 p50/p95/p99, 버려진 프레임 수, 초당 송수신 바이트를 보고
+(timestamp가 없는 프레임은 가장 오래된 미응답 카메라에 FIFO로 대응 - 지연의 상한값)
+
+--stub이면 같은 메시지 스키마를 쓰는 로컬 stub 서버를 띄움 - 패치와 같은 카메라 병합(viewer_coalescer),
+해상도 스케줄러(viewer_resolution), 렌더 캐시(viewer_render_cache)를 CPU stub 렌더러 앞에 두므로
+GPU 없이 viewer 패치의 회귀 벤치마크로 사용 가능 (websocket은 표준 라이브러리로 구현)
+
+Usage:
+    python viewer-loadtest.py --stub [--clients 8] [--duration 10] [--cost-ms-per-mpix 40] [--json PATH]
+    python viewer-loadtest.py --url ws://localhost:7007 [--path camera_path.json] [--clients 4]
+      --path            nerfstudio camera_path.json (없으면 원형 궤도 경로)
+      --max-p95-ms      p95 왕복 지연이 이 값을 넘으면 실패 (회귀 검사용)
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import os
+import struct
+import sys
+import threading
+import time
+import urllib.parse
+from pathlib import Path
+
+# 병합/스케줄러/캐시는 patches/의 런타임 모듈을 그대로 사용
+sys.path.insert(0, str(Path(__file__).parent.parent / 'patches'))
+from viewer_coalescer import CameraCoalescer
+from viewer_render_cache import RenderCache, pose_key
+from viewer_resolution import ResolutionScheduler, StubRenderer
+
+try:
+    import msgpack  # viser의 메시지 직렬화 형식
+except ImportError:
+    msgpack = None
+
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+FRAME_TYPES = ("BackgroundImageMessage",)  # nerfstudio가 렌더 결과를 보내는 viser 메시지
+
+
+def _mask(payload, key):
+    if not payload:
+        return payload
+    length = len(payload)
+    mask = (key * (length // 4 + 1))[:length]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(mask, "big")).to_bytes(length, "big")
+
+
+class WebSocket:
+    """Minimal RFC 6455 connection (data frames, ping/pong, close) counting wire bytes"""
+
+    def __init__(self, reader, writer, is_client):
+        self.reader = reader
+        self.writer = writer
+        self.is_client = is_client  # 클라이언트 -> 서버 프레임은 마스킹 필수
+        self.codec = None  # stub 서버: 상대가 보낸 형식(json/msgpack)으로 응답
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    async def _send_frame(self, opcode, payload):
+        length = len(payload)
+        mask_bit = 0x80 if self.is_client else 0
+        header = bytes([0x80 | opcode])
+        if length < 126:
+            header += bytes([mask_bit | length])
+        elif length < 65536:
+            header += bytes([mask_bit | 126]) + struct.pack("!H", length)
+        else:
+            header += bytes([mask_bit | 127]) + struct.pack("!Q", length)
+        if self.is_client:
+            key = os.urandom(4)
+            header += key
+            payload = _mask(payload, key)
+        self.writer.write(header + payload)
+        self.bytes_out += len(header) + length
+        await self.writer.drain()
+
+    async def send(self, payload):
+        binary = isinstance(payload, (bytes, bytearray))
+        await self._send_frame(0x2 if binary else 0x1, payload if binary else payload.encode())
+
+    async def recv(self):
+        """Next data message (bytes for binary, str for text); None once the peer closes"""
+        chunks = []
+        opcode = None
+        while True:
+            try:
+                b1, b2 = await self.reader.readexactly(2)
+                header = 2
+                length = b2 & 0x7F
+                if length == 126:
+                    length = struct.unpack("!H", await self.reader.readexactly(2))[0]
+                    header += 2
+                elif length == 127:
+                    length = struct.unpack("!Q", await self.reader.readexactly(8))[0]
+                    header += 8
+                key = await self.reader.readexactly(4) if b2 & 0x80 else None
+                payload = await self.reader.readexactly(length)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return None
+            self.bytes_in += header + (4 if key else 0) + length
+            if key:
+                payload = _mask(payload, key)
+
+            frame_opcode = b1 & 0x0F
+            if frame_opcode == 0x8:
+                return None
+            if frame_opcode == 0x9:
+                await self._send_frame(0xA, payload)  # ping에 응답하지 않으면 서버가 연결을 끊음
+                continue
+            if frame_opcode == 0xA:
+                continue
+            if frame_opcode != 0x0:
+                opcode = frame_opcode
+            chunks.append(payload)
+            if b1 & 0x80:
+                data = b"".join(chunks)
+                return data if opcode == 0x2 else data.decode()
+
+    async def close(self):
+        try:
+            await self._send_frame(0x8, struct.pack("!H", 1000))
+            self.writer.close()
+            await self.writer.wait_closed()
+        except (ConnectionError, RuntimeError):
+            pass
+
+
+async def connect(url, subprotocol=None):
+    """Open a client WebSocket to ws://host:port/path"""
+    parsed = urllib.parse.urlsplit(url)
+    host, port = parsed.hostname, parsed.port or 80
+    reader, writer = await asyncio.open_connection(host, port)
+    key = base64.b64encode(os.urandom(16)).decode()
+    request = (f"GET {parsed.path or '/'} HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\n"
+               f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n")
+    if subprotocol:
+        request += f"Sec-WebSocket-Protocol: {subprotocol}\r\n"
+    writer.write((request + "\r\n").encode())
+    response = await reader.readuntil(b"\r\n\r\n")
+    status = response.split(b"\r\n", 1)[0].decode(errors="replace")
+    if " 101 " not in status + " ":
+        writer.close()
+        raise ConnectionError(f"WebSocket upgrade refused: {status}")
+    return WebSocket(reader, writer, is_client=True)
+
+
+async def accept(reader, writer):
+    """Server side of the WebSocket upgrade (None if the request is not an upgrade)"""
+    request = await reader.readuntil(b"\r\n\r\n")
+    headers = {}
+    for line in request.decode(errors="replace").split("\r\n")[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    key = headers.get("sec-websocket-key")
+    if key is None:
+        writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+        writer.close()
+        return None
+    accept_key = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+    response = ("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                f"Sec-WebSocket-Accept: {accept_key}\r\n")
+    if "sec-websocket-protocol" in headers:
+        response += f"Sec-WebSocket-Protocol: {headers['sec-websocket-protocol'].split(',')[0].strip()}\r\n"
+    writer.write((response + "\r\n").encode())
+    await writer.drain()
+    return WebSocket(reader, writer, is_client=False)
+
+
+def encode(message, codec):
+    if codec == "msgpack":
+        return msgpack.packb(message, use_bin_type=True)
+    return json.dumps(message)
+
+
+def decode(payload):
+    """Message dict from a text (JSON) or binary (msgpack) frame; {} if it cannot be decoded"""
+    try:
+        if isinstance(payload, str):
+            return json.loads(payload)
+        if msgpack is not None:
+            return msgpack.unpackb(payload, raw=False)
+    except ValueError:
+        pass
+    return {}
+
+
+def camera_message(matrix, fov, aspect, width, height, is_moving, timestamp):
+    return {"type": "CameraMessage", "aspect": aspect, "render_height": height, "render_width": width,
+            "fov": fov, "matrix": list(matrix), "camera_type": "perspective", "is_moving": is_moving,
+            "timestamp": timestamp}
+
+
+def _look_at(eye, target=(0.0, 0.0, 0.0), up=(0.0, 0.0, 1.0)):
+    """Row-major 4x4 camera-to-world (OpenGL convention, camera looks down -z)"""
+    def normalize(v):
+        n = math.sqrt(sum(x * x for x in v)) or 1.0
+        return [x / n for x in v]
+
+    def cross(a, b):
+        return [a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0]]
+
+    back = normalize([e - t for e, t in zip(eye, target)])
+    right = normalize(cross(up, back))
+    true_up = cross(back, right)
+    return [right[0], true_up[0], back[0], eye[0],
+            right[1], true_up[1], back[1], eye[1],
+            right[2], true_up[2], back[2], eye[2],
+            0.0, 0.0, 0.0, 1.0]
+
+
+def orbit_path(frames=120, radius=3.0, height=1.0, fov_deg=50.0, aspect=16 / 9):
+    """Synthetic camera path circling the origin: [(matrix16, fov_rad, aspect)]"""
+    return [(_look_at((radius * math.cos(2 * math.pi * i / frames),
+                       radius * math.sin(2 * math.pi * i / frames), height)),
+             math.radians(fov_deg), aspect) for i in range(frames)]
+
+
+def load_camera_path(path):
+    """[(matrix16, fov_rad, aspect)] from a nerfstudio camera_path.json"""
+    with open(path) as f:
+        data = json.load(f)
+    default_aspect = data.get("render_width", 16) / data.get("render_height", 9)
+    poses = []
+    for keyframe in data["camera_path"]:
+        matrix = keyframe["camera_to_world"]
+        if isinstance(matrix[0], list):
+            matrix = [x for row in matrix for x in row]
+        poses.append((matrix, math.radians(keyframe.get("fov", 50.0)), keyframe.get("aspect", default_aspect)))
+    return poses
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of values (None if empty)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+class StubViewerServer:
+    """Local viewer stand-in: CameraMessage in, BackgroundImageMessage out, patched pipeline in between
+
+    렌더는 한 GPU처럼 직렬화하고, 카메라 병합 -> 해상도 결정 -> 렌더 캐시 -> stub 렌더러 순으로 처리
+    """
+
+    def __init__(self, renderer, target_fps=24.0, cache_mb=512, bytes_per_pixel=0.2):
+        self.renderer = renderer
+        self.coalescer = CameraCoalescer()
+        self.scheduler = ResolutionScheduler(target_fps)
+        self.cache = RenderCache(int(cache_mb * 1024**2))
+        self.bytes_per_pixel = bytes_per_pixel  # JPEG 인코딩 후 대략적인 크기
+        self.gpu = threading.Lock()
+        self.server = None
+
+    def _render(self, client, message, is_moving):
+        width, height = message["render_width"], message["render_height"]
+        # 캐시 적중 시에는 렌더하지 않으므로 스케줄러 상태는 실제로 렌더할 때만 반영
+        decision = self.scheduler.next_resolution(client, width, height, is_moving, commit=False)
+        key = pose_key(message["matrix"], message["fov"], message["aspect"], decision.width, decision.height,
+                       message.get("camera_type"), message.get("time"))
+
+        def render():
+            self.scheduler.commit(client, decision)
+            with self.gpu:
+                start = time.perf_counter()
+                self.renderer.render(decision.width, decision.height)
+                self.scheduler.record(client, time.perf_counter() - start)
+            return memoryview(bytes(max(1, int(decision.width * decision.height * self.bytes_per_pixel))))
+
+        try:
+            return decision, self.cache.get_or_render(key, render)
+        finally:
+            self.coalescer.finish(client)
+
+    async def _render_loop(self, client, ws, wake):
+        loop = asyncio.get_running_loop()
+        refining = None  # 정지한 카메라의 refine 대상 메시지
+        while True:
+            if refining is None:
+                await wake.wait()
+            wake.clear()
+            message = self.coalescer.take(client)
+            if message is None and refining is None:
+                continue
+            if message is None:
+                self.coalescer.begin(client)
+                message = refining
+            else:
+                refining = None if message.get("is_moving") else message
+            decision, data = await loop.run_in_executor(None, self._render, client, message,
+                                                        bool(message.get("is_moving")))
+            if decision.scale >= 1.0 or message.get("is_moving"):
+                refining = None
+            frame = {"type": "BackgroundImageMessage", "media_type": "image/jpeg",
+                     "timestamp": message.get("timestamp"), "width": decision.width,
+                     "height": decision.height, "data": bytes(data)}
+            if ws.codec != "msgpack":
+                frame["data"] = base64.b64encode(frame["data"]).decode()
+            try:
+                await ws.send(encode(frame, ws.codec))
+            except ConnectionError:
+                return
+
+    async def _handle(self, reader, writer):
+        ws = await accept(reader, writer)
+        if ws is None:
+            return
+        ws.codec = "json"
+        client = id(ws)
+        wake = asyncio.Event()
+        render_task = asyncio.create_task(self._render_loop(client, ws, wake))
+        try:
+            while True:
+                payload = await ws.recv()
+                if payload is None:
+                    break
+                ws.codec = "json" if isinstance(payload, str) else "msgpack"  # 요청과 같은 형식으로 응답
+                message = decode(payload)
+                if message.get("type") != "CameraMessage":
+                    continue
+                self.coalescer.offer(client, message, message.get("timestamp"), bool(message.get("is_moving")))
+                wake.set()
+        finally:
+            render_task.cancel()
+            self.coalescer.forget(client)
+            self.scheduler.forget(client)
+            await ws.close()
+
+    async def start(self, host="127.0.0.1", port=0):
+        self.server = await asyncio.start_server(self._handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def stats(self):
+        return {"coalescer": self.coalescer.stats(), "resolution": self.scheduler.metrics(),
+                "cache": self.cache.stats()}
+
+
+async def run_client(url, poses, args, offset):
+    """Replay poses as CameraMessages at args.rate for args.duration; returns this client's stats"""
+    ws = await connect(url, args.subprotocol)
+    pending = {}  # timestamp -> 보낸 시각 (아직 프레임이 오지 않은 카메라)
+    stats = {"sent": 0, "frames": 0, "rtt": [], "dropped": 0, "untimed": 0}
+
+    async def receiver():
+        while True:
+            payload = await ws.recv()
+            if payload is None:
+                return
+            message = decode(payload)
+            if message.get("type") not in args.frame_types:
+                continue
+            now = time.monotonic()
+            stats["frames"] += 1
+            timestamp = message.get("timestamp")
+            if timestamp is None:
+                # 실제 viser 프레임에는 timestamp가 없으므로 가장 오래된 카메라에 FIFO로 대응
+                # (병합으로 건너뛴 카메라가 있으면 실제보다 길게 잡히는 상한값 - 최신 것에 맞추면 지연을 숨김)
+                stats["untimed"] += 1
+                timestamp = min(pending) if pending else None
+            sent_at = pending.pop(timestamp, None)
+            if sent_at is not None:
+                stats["rtt"].append(now - sent_at)
+                # 이 프레임보다 먼저 보낸 카메라는 더 이상 렌더되지 않음
+                for older in [t for t in pending if t < timestamp]:
+                    del pending[older]
+                    stats["dropped"] += 1
+
+    receive_task = asyncio.create_task(receiver())
+    start = time.monotonic()
+    interval = 1.0 / args.rate
+    i = offset
+    while time.monotonic() - start < args.duration:
+        matrix, fov, aspect = poses[i % len(poses)]
+        is_moving = time.monotonic() - start + interval < args.duration
+        timestamp = time.monotonic()
+        pending[timestamp] = timestamp
+        await ws.send(encode(camera_message(matrix, fov, aspect, args.size[0], args.size[1], is_moving,
+                                            timestamp), args.codec))
+        stats["sent"] += 1
+        i += 1
+        await asyncio.sleep(max(0.0, start + (i - offset) * interval - time.monotonic()))
+
+    await asyncio.sleep(args.drain)  # 마지막 정지 카메라의 프레임까지 기다림
+    elapsed = time.monotonic() - start
+    receive_task.cancel()
+    await ws.close()
+    stats["dropped"] += len(pending)
+    stats["bytes_in_per_sec"] = ws.bytes_in / elapsed
+    stats["bytes_out_per_sec"] = ws.bytes_out / elapsed
+    return stats
+
+
+def summarize(client_stats):
+    rtt_ms = [rtt * 1000 for stats in client_stats for rtt in stats["rtt"]]
+    sent = sum(stats["sent"] for stats in client_stats)
+    summary = {
+        "clients": len(client_stats),
+        "sent": sent,
+        "frames": sum(stats["frames"] for stats in client_stats),
+        "dropped": sum(stats["dropped"] for stats in client_stats),
+        "untimed_frames": sum(stats["untimed"] for stats in client_stats),
+        "rtt_ms": {f"p{q}": round(percentile(rtt_ms, q), 2) if rtt_ms else None for q in (50, 95, 99)},
+        "bytes_in_per_sec": round(sum(stats["bytes_in_per_sec"] for stats in client_stats)),
+        "bytes_out_per_sec": round(sum(stats["bytes_out_per_sec"] for stats in client_stats)),
+    }
+    summary["dropped_ratio"] = round(summary["dropped"] / sent, 4) if sent else None
+    return summary
+
+
+async def run_load_test(args, poses):
+    server = None
+    url = args.url
+    if args.stub:
+        server = StubViewerServer(StubRenderer(args.cost_ms_per_mpix, args.overhead_ms),
+                                  args.target_fps, args.cache_mb)
+        url = f"ws://127.0.0.1:{await server.start()}/"
+    try:
+        # 클라이언트마다 경로 시작점을 어긋나게 하되 --same-view면 모두 같은 시점을 봄
+        offsets = [0 if args.same_view else i * len(poses) // args.clients for i in range(args.clients)]
+        client_stats = await asyncio.gather(*(run_client(url, poses, args, offset) for offset in offsets))
+    finally:
+        if server is not None:
+            await server.stop()
+    report = {"url": url, "stub": bool(args.stub), "summary": summarize(client_stats),
+              "per_client": [{k: v for k, v in stats.items() if k != "rtt"} for stats in client_stats]}
+    if server is not None:
+        report["server"] = server.stats()
+    return report
+
+
+def _default_subprotocol():
+    try:
+        from importlib.metadata import version
+        return f"viser-v{version('viser')}"
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless load test for the nerfstudio viewer websocket")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="viewer websocket URL, e.g. ws://localhost:7007")
+    target.add_argument("--stub", action="store_true", help="start a local stub server with a CPU renderer")
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of camera updates per client")
+    parser.add_argument("--rate", type=float, default=30.0, help="camera updates per second per client")
+    parser.add_argument("--drain", type=float, default=2.0, help="seconds to wait for trailing frames")
+    parser.add_argument("--path", type=Path, default=None, help="nerfstudio camera_path.json to replay")
+    parser.add_argument("--same-view", action="store_true", help="all clients replay the path in lockstep")
+    parser.add_argument("--size", type=int, nargs=2, default=(1920, 1080), metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--codec", choices=("json", "msgpack"), default=None,
+                        help="message encoding (default: msgpack for --url, json for --stub)")
+    parser.add_argument("--subprotocol", default=None, help="Sec-WebSocket-Protocol (default: viser-v<version>)")
+    parser.add_argument("--frame-type", dest="frame_types", action="append", default=None,
+                        help=f"message type counted as a rendered frame (default: {', '.join(FRAME_TYPES)})")
+    parser.add_argument("--cost-ms-per-mpix", type=float, default=40.0, help="stub renderer cost")
+    parser.add_argument("--overhead-ms", type=float, default=2.0, help="stub renderer fixed cost per frame")
+    parser.add_argument("--target-fps", type=float, default=24.0, help="stub resolution scheduler target")
+    parser.add_argument("--cache-mb", type=float, default=512, help="stub render cache budget (0 disables)")
+    parser.add_argument("--max-p95-ms", type=float, default=None, help="fail if p95 round trip exceeds this")
+    parser.add_argument("--json", default=None, metavar="PATH", help="write the report as JSON")
+    args = parser.parse_args()
+
+    args.frame_types = tuple(args.frame_types or FRAME_TYPES)
+    args.codec = args.codec or ("json" if args.stub else "msgpack")
+    if args.codec == "msgpack" and msgpack is None:
+        print("❌ msgpack is required for --codec msgpack (viser's wire format)")
+        return False
+    if args.subprotocol is None and not args.stub:
+        args.subprotocol = _default_subprotocol()
+    poses = load_camera_path(args.path) if args.path else orbit_path()
+
+    print(f"=== Viewer load test: {args.clients} clients x {args.duration:.0f}s at {args.rate:.0f} Hz "
+          f"({'stub server' if args.stub else args.url}) ===")
+    try:
+        report = asyncio.run(run_load_test(args, poses))
+    except (OSError, ConnectionError) as e:
+        print(f"❌ Could not connect: {e}")
+        return False
+
+    summary = report["summary"]
+    rtt = summary["rtt_ms"]
+    print(f"  ✓ sent {summary['sent']} camera updates, received {summary['frames']} frames")
+    if rtt["p50"] is not None:
+        print(f"  ✓ round trip p50 {rtt['p50']:.1f} ms / p95 {rtt['p95']:.1f} ms / p99 {rtt['p99']:.1f} ms")
+    if summary["untimed_frames"]:
+        print(f"  ⚠ {summary['untimed_frames']} frames carried no timestamp: round trip matched FIFO to the "
+              f"oldest pending camera (upper bound)")
+    print(f"  ✓ dropped {summary['dropped']} ({(summary['dropped_ratio'] or 0) * 100:.1f}% coalesced or stale)")
+    print(f"  ✓ {summary['bytes_in_per_sec'] / 1024:.1f} KiB/s in, {summary['bytes_out_per_sec'] / 1024:.1f} KiB/s out")
+    if "server" in report:
+        cache = report["server"]["cache"]
+        print(f"  ✓ stub server: {report['server']['resolution']['decisions']}, cache hits {cache['hits']}, "
+              f"shared {cache['shared']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if rtt["p95"] is None:
+        print("❌ No frames received")
+        return False
+    if args.max_p95_ms is not None and rtt["p95"] > args.max_p95_ms:
+        print(f"❌ p95 round trip {rtt['p95']:.1f} ms exceeds {args.max_p95_ms:.1f} ms")
+        return False
+    print("✅ Load test complete")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)